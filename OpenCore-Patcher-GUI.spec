@@ -9,7 +9,7 @@ block_cipher = None
 a = Analysis(['OpenCore-Patcher-GUI.command'],
              pathex=[],
              binaries=[],
-             datas=[('payloads.dmg', '.')],
+             datas=[('payloads.dmg', '.'), ('data/smbios_data.table', 'data')],
              hiddenimports=[],
              hookspath=[],
              hooksconfig={},
@@ -17,10 +17,13 @@
 # Reference:
 #   https://github.com/acidanthera/OpenCorePkg/blob/master/Library/OcMacInfoLib/AutoGenerated.c
 
-from resources import device_probe
+from resources import device_probe, lazy_table
 from data import cpu_data, os_data, bluetooth_data
 
-smbios_dictionary = {
+
+def _smbios_dictionary() -> dict:
+    # Only evaluated when data/smbios_data.table is absent or stale, see lazy_table.py
+    return {
     "MacBook1,1": {
         "Board ID": "Mac-F4208CC8",
         "FirmwareFeatures": None,
@@ -3013,4 +3016,7 @@ smbios_dictionary = {
         "Stock GPUs": [],
         "Stock Storage": [],
     },
-}
\ No newline at end of file
+}
+
+
+smbios_dictionary = lazy_table.LazyTable(__file__, _smbios_dictionary)
@@ -182,6 +182,14 @@ If you plan to create the USB for another machine, please select the "Change Mod
             else:
                 logging.info(f"- Unknown SMBIOS arg passed: {self.args.smbios_spoof}")
 
+        if self.args.config_only:
+            logging.info("- Set config-only build")
+            self.constants.build_config_only = True
+
+        if self.args.efi_archive:
+            logging.info("- Set EFI archive output")
+            self.constants.build_output_archive = True
+
         if self.args.support_all:
             logging.info("- Building for natively supported model")
             self.constants.allow_oc_everywhere = True
@@ -1,8 +1,7 @@
 # Class for generating OpenCore Configurations tailored for Macs
 # Copyright (C) 2020-2022, Dhinak G, Mykola Grymalyuk
 
-import copy
-import pickle
+import hashlib
 import plistlib
 import shutil
 import zipfile
@@ -10,8 +9,8 @@ from pathlib import Path
 from datetime import date
 import logging
 
-from resources import constants, utilities
-from resources.build import bluetooth, firmware, graphics_audio, support, storage, smbios, security, misc
+from resources import constants, utilities, probe_record
+from resources.build import bluetooth, firmware, graphics_audio, support, storage, smbios, security, misc, cache, materialize, profiler
 from resources.build.networking import wired, wireless
 
 
@@ -22,10 +21,25 @@ def rmtree_handler(func, path, exc_info):
 
 
 class build_opencore:
+
+    # Constants only affecting the running patcher, excluded from build fingerprints
+    RUNTIME_SETTINGS = [
+        "current_path", "payload_path", "gui_mode", "cli_mode", "disk", "patch_disk", "launcher_binary", "launcher_script",
+        "ignore_updates", "unpack_thread", "should_nuke_kdks", "has_checked_updates", "skip_unchanged_build", "profile_build",
+        "root_patcher_succeeded", "booted_oc_disk", "start_build_install", "host_is_non_metal", "needs_to_open_preferences",
+        "walkthrough", "commit_info",
+    ]
+
+    # Payload folders EFI builds draw from
+    FINGERPRINT_PAYLOADS = ["ACPI", "Config", "Drivers", "Icon", "Kexts", "OpenCore", "Tools"]
+
     def __init__(self, model, versions):
         self.model = model
         self.config = None
+        self.plan: materialize.MaterializationPlan = None
+        self.fingerprint: str = None
         self.constants: constants.Constants = versions
+        self.profiler: profiler.BuildProfiler = profiler.BuildProfiler(self.constants)
 
 
     def build_efi(self):
@@ -35,23 +49,29 @@ class build_opencore:
         else:
             logging.info(f"Building Configuration for external model: {self.model}")
 
-        self.generate_base()
-        self.set_revision()
+        with self.profiler.stage("Base"):
+            self.generate_base()
+            self.set_revision()
 
         # Set Lilu and co.
-        support.build_support(self.model, self.constants, self.config).enable_kext("Lilu.kext", self.constants.lilu_version, self.constants.lilu_path)
-        self.config["Kernel"]["Quirks"]["DisableLinkeditJettison"] = True
+        with self.profiler.stage("Lilu", self.config):
+            support.build_support(self.model, self.constants, self.config).enable_kext("Lilu.kext", self.constants.lilu_version, self.constants.lilu_path)
+            self.config["Kernel"]["Quirks"]["DisableLinkeditJettison"] = True
 
         # Call support functions
-        firmware.build_firmware(self.model, self.constants, self.config).build()
-        wired.build_wired(self.model, self.constants, self.config).build()
-        wireless.build_wireless(self.model, self.constants, self.config).build()
-        graphics_audio.build_graphics_audio(self.model, self.constants, self.config).build()
-        bluetooth.build_bluetooth(self.model, self.constants, self.config).build()
-        storage.build_storage(self.model, self.constants, self.config).build()
-        smbios.build_smbios(self.model, self.constants, self.config).build()
-        security.build_security(self.model, self.constants, self.config).build()
-        misc.build_misc(self.model, self.constants, self.config).build()
+        for name, stage in [
+            ("Firmware",       firmware.build_firmware),
+            ("Wired",          wired.build_wired),
+            ("Wireless",       wireless.build_wireless),
+            ("Graphics Audio", graphics_audio.build_graphics_audio),
+            ("Bluetooth",      bluetooth.build_bluetooth),
+            ("Storage",        storage.build_storage),
+            ("SMBIOS",         smbios.build_smbios),
+            ("Security",       security.build_security),
+            ("Misc",           misc.build_misc),
+        ]:
+            with self.profiler.stage(name, self.config):
+                stage(self.model, self.constants, self.config).build()
 
         # Work-around ocvalidate
         if self.constants.validate is False:
@@ -73,16 +93,21 @@ class build_opencore:
         if Path(self.constants.opencore_release_folder).exists():
             logging.info("Deleting old copy of OpenCore folder")
             shutil.rmtree(self.constants.opencore_release_folder, onerror=rmtree_handler, ignore_errors=True)
-
-        logging.info("")
-        logging.info(f"- Adding OpenCore v{self.constants.opencore_version} {self.constants.opencore_build}")
-        shutil.copy(self.constants.opencore_zip_source, self.constants.build_path)
-        zipfile.ZipFile(self.constants.opencore_zip_copied).extractall(self.constants.build_path)
+        if Path(self.constants.opencore_release_archive).exists():
+            logging.info("Deleting old copy of OpenCore archive")
+            Path(self.constants.opencore_release_archive).unlink()
+        # Archive builds (see archive_output()) keep their report next to the zip
+        if Path(self.constants.build_path / Path("Build-Report.json")).exists():
+            Path(self.constants.build_path / Path("Build-Report.json")).unlink()
 
         # Setup config.plist for editing
         logging.info("- Adding config.plist for OpenCore")
-        shutil.copy(self.constants.plist_template, self.constants.oc_folder)
-        self.config = plistlib.load(Path(self.constants.plist_path).open("rb"))
+        self.config = cache.ConfigTemplate.load(self.constants.plist_template).copy()
+        self.plan = materialize.MaterializationPlan.for_config(self.config, self.constants)
+
+        logging.info("")
+        logging.info(f"- Adding OpenCore v{self.constants.opencore_version} {self.constants.opencore_build}")
+        self.plan.add_tree(cache.OpenCoreCache(self.constants).fetch())
 
 
     def set_revision(self):
@@ -90,36 +115,146 @@ class build_opencore:
         self.config["#Revision"]["Build-Version"] = f"{self.constants.patcher_version} - {date.today()}"
         if not self.constants.custom_model:
             self.config["#Revision"]["Build-Type"] = "OpenCore Built on Target Machine"
-            computer_copy = copy.copy(self.constants.computer)
-            computer_copy.ioregistry = None
-            self.config["#Revision"]["Hardware-Probe"] = pickle.dumps(computer_copy)
+            self.config["#Revision"]["Hardware-Probe"] = self._hardware_probe()
         else:
             self.config["#Revision"]["Build-Type"] = "OpenCore Built for External Machine"
+        if self.fingerprint:
+            self.config["#Revision"]["Build-Fingerprint"] = self.fingerprint
         self.config["#Revision"]["OpenCore-Version"] = f"{self.constants.opencore_version} - {self.constants.opencore_build} - {self.constants.opencore_commit}"
         self.config["#Revision"]["Original-Model"] = self.model
         self.config["NVRAM"]["Add"]["4D1FDA02-38C7-4A6A-9CC6-4BCCA8B30102"]["OCLP-Version"] = f"{self.constants.patcher_version}"
         self.config["NVRAM"]["Add"]["4D1FDA02-38C7-4A6A-9CC6-4BCCA8B30102"]["OCLP-Model"] = self.model
 
 
+    def _hardware_probe(self):
+        return probe_record.encode(self.constants.computer)
+
+
+    def generate_fingerprint(self):
+        """
+        Deterministic digest of the build's inputs
+
+        Covers the model, build settings (including the patcher version),
+        the probed hardware and every payload the EFI is built from
+        """
+
+        fingerprint = hashlib.sha256()
+        fingerprint.update(f"Model={self.model}\n".encode())
+
+        for key, value in sorted(vars(self.constants).items()):
+            if key in self.RUNTIME_SETTINGS or not isinstance(value, (bool, int, float, str, list, tuple, dict, type(None))):
+                continue
+            fingerprint.update(f"{key}={value!r}\n".encode())
+
+        fingerprint.update(b"Hardware-Probe=" + plistlib.dumps(self._hardware_probe(), sort_keys=True) + b"\n")
+
+        for folder in self.FINGERPRINT_PAYLOADS:
+            fingerprint.update(f"{folder}={cache.tree_hash(self.constants.payload_path / Path(folder))}\n".encode())
+
+        return fingerprint.hexdigest()
+
+
+    def existing_build_matches(self):
+        """
+        Check whether the EFI from a previous run was built from identical inputs
+        """
+
+        paths = None
+        try:
+            if self.archive_output():
+                with zipfile.ZipFile(self.constants.opencore_release_archive) as archive:
+                    config = plistlib.loads(archive.read("EFI/OC/config.plist"))
+                    paths = [name.rstrip("/")[len("EFI/OC/"):] for name in archive.namelist() if name.startswith("EFI/OC/")]
+            else:
+                config = plistlib.load(Path(self.constants.plist_path).open("rb"))
+        except Exception:
+            # No usable build present
+            return False
+
+        if config.get("#Revision", {}).get("Build-Fingerprint") != self.fingerprint:
+            return False
+
+        if support.PathingReport.generate(config, self.constants.oc_folder, paths).failed:
+            return False
+
+        self.config = config
+        return True
+
+
+    def archive_output(self):
+        """
+        Whether the EFI is written straight into a zip, rather than a folder
+        """
+
+        # Vault signs OpenCore.efi in place, thus requires a folder
+        return self.constants.build_output_archive is True and self.constants.vault is False
+
+
+    def template_diff(self):
+        """
+        List every change made to config.plist relative to the template, reported in Build-Report.json
+        """
+
+        return cache.ConfigTemplate.load(self.constants.plist_template).diff(self.config)
+
+
     def save_config(self):
+        Path(self.constants.oc_folder).mkdir(parents=True, exist_ok=True)
         plistlib.dump(self.config, Path(self.constants.plist_path).open("wb"), sort_keys=True)
 
 
-    def build_opencore(self):
-        # Generate OpenCore Configuration
+    def generate_config(self):
+        """
+        Generate the final config.plist in memory, EFI files are only planned (see self.plan)
+        """
+
         self.build_efi()
         if self.constants.allow_oc_everywhere is False or self.constants.allow_native_spoofs is True or (self.constants.custom_serial_number != "" and self.constants.custom_board_serial_number != ""):
-            smbios.build_smbios(self.model, self.constants, self.config).set_smbios()
-        support.build_support(self.model, self.constants, self.config).cleanup()
-        self.save_config()
+            with self.profiler.stage("SMBIOS Spoofing", self.config):
+                smbios.build_smbios(self.model, self.constants, self.config).set_smbios()
+        with self.profiler.stage("Cleanup", self.config):
+            support.build_support(self.model, self.constants, self.config).cleanup()
+        return self.config
+
+
+    def build_opencore(self):
+        # Generate OpenCore Configuration
+        with self.profiler.stage("Fingerprint"):
+            self.fingerprint = self.generate_fingerprint()
+        if self.constants.skip_unchanged_build is True and self.existing_build_matches():
+            utilities.cls()
+            logging.info(f"- Build inputs unchanged for {self.model}, reusing existing EFI")
+        else:
+            self.generate_config()
+
+            if self.constants.build_config_only is True:
+                logging.info("- Config-only build, skipping EFI files")
+                with self.profiler.stage("Save"):
+                    self.save_config()
+            elif self.archive_output():
+                with self.profiler.stage("Write EFI"):
+                    self.plan.write_plist(self.constants.plist_path, self.config)
+                    self.plan.commit_archive(self.constants.opencore_release_archive)
+                with self.profiler.stage("Validate"):
+                    paths = [path[len("EFI/OC/"):] for path in self.plan.paths() if path.startswith("EFI/OC/")]
+                    support.build_support(self.model, self.constants, self.config).validate_pathing(paths)
+            else:
+                with self.profiler.stage("Write EFI"):
+                    self.plan.commit()
+                with self.profiler.stage("Save"):
+                    self.save_config()
+
+                # Post-build handling
+                with self.profiler.stage("Sign"):
+                    support.build_support(self.model, self.constants, self.config).sign_files()
+                with self.profiler.stage("Validate"):
+                    support.build_support(self.model, self.constants, self.config).validate_pathing()
 
-        # Post-build handling
-        support.build_support(self.model, self.constants, self.config).sign_files()
-        support.build_support(self.model, self.constants, self.config).validate_pathing()
+            self.profiler.write_report(self.model, self.constants.build_path if self.archive_output() else None, self.template_diff())
 
         logging.info("")
         logging.info(f"Your OpenCore EFI for {self.model} has been built at:")
-        logging.info(f"    {self.constants.opencore_release_folder}")
+        logging.info(f"    {self.constants.opencore_release_archive if self.archive_output() else self.constants.opencore_release_folder}")
         logging.info("")
         if self.constants.gui_mode is False:
             input("Press [Enter] to continue\n")
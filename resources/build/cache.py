@@ -0,0 +1,216 @@
+# Caches for build inputs shared between EFI builds
+
+import pickle
+import shutil
+import hashlib
+import logging
+import plistlib
+import tempfile
+import zipfile
+from pathlib import Path
+
+from resources import constants
+
+
+_file_hashes = {}
+_config_templates = {}
+
+
+def file_hash(path: Path) -> str:
+    """
+    SHA-256 of a file, memoized per process on (path, size, mtime)
+    """
+
+    stat = Path(path).stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with Path(path).open("rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def tree_hash(path: Path) -> str:
+    """
+    SHA-256 over the relative paths and contents of every file within a folder
+    """
+
+    digest = hashlib.sha256()
+    for file in sorted(Path(path).rglob("*")):
+        if file.is_file():
+            digest.update(f"{file.relative_to(path).as_posix()}={file_hash(file)}\n".encode())
+    return digest.hexdigest()
+
+
+class OpenCoreCache:
+    """
+    Content-addressed cache of extracted OpenCorePkg trees
+
+    Trees are keyed by the build variant and the hash of the source zip,
+    thus payload updates invalidate the cache automatically
+
+    Usage:
+    >>> from resources.build.cache import OpenCoreCache
+    >>> tree = OpenCoreCache(self.constants).fetch()
+    """
+
+    def __init__(self, global_constants: constants.Constants):
+        self.constants: constants.Constants = global_constants
+
+        self.source:  Path = Path(self.constants.opencore_zip_source)
+        self.variant: str  = self.constants.opencore_build
+
+
+    @property
+    def tree_path(self) -> Path:
+        return self.constants.opencore_cache_path / Path(f"{self.variant}-{file_hash(self.source)[:16]}")
+
+
+    def fetch(self) -> Path:
+        """
+        Return the cached OpenCore-Build tree, extracting the payload on a miss
+        """
+
+        tree = self.tree_path
+        if tree.exists():
+            return tree / Path("OpenCore-Build")
+
+        logging.info(f"- Caching OpenCore v{self.constants.opencore_version} {self.variant}")
+        self._evict_stale()
+
+        # Extract into a scratch folder and rename into place
+        # Parallel builds may race on a miss, first rename wins
+        self.constants.opencore_cache_path.mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(dir=self.constants.opencore_cache_path, prefix=".extract-"))
+        with zipfile.ZipFile(self.source) as zip_file:
+            zip_file.extractall(scratch, members=[member for member in zip_file.namelist() if not member.startswith("__MACOSX")])
+
+        try:
+            scratch.rename(tree)
+        except OSError:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+        return tree / Path("OpenCore-Build")
+
+
+    def _evict_stale(self):
+        """
+        Remove trees of the same variant built from older payloads
+        """
+
+        if not self.constants.opencore_cache_path.exists():
+            return
+
+        for tree in self.constants.opencore_cache_path.glob(f"{self.variant}-*"):
+            if tree != self.tree_path:
+                shutil.rmtree(tree, ignore_errors=True)
+
+
+class ConfigTemplate:
+    """
+    Parsed config.plist template, shared by every build in the process
+
+    Builds receive their own deep copy, restored from a pickled snapshot
+    as that's considerably cheaper than re-parsing the XML
+
+    Usage:
+    >>> from resources.build.cache import ConfigTemplate
+    >>> config = ConfigTemplate.load(self.constants.plist_template).copy()
+    """
+
+    # Keys used to identify array entries in diffs, in order of preference
+    ENTRY_KEYS = ["BundlePath", "Path", "Comment", "Identifier", "Name"]
+
+    def __init__(self, path: Path):
+        self.path: Path = Path(path)
+        self.template: dict = plistlib.load(self.path.open("rb"))
+        self._snapshot: bytes = pickle.dumps(self.template, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+    @classmethod
+    def load(cls, path: Path) -> "ConfigTemplate":
+        """
+        Return the cached template, parsing it on first use or if the file changed
+        """
+
+        stat = Path(path).stat()
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        if key not in _config_templates:
+            _config_templates[key] = cls(path)
+        return _config_templates[key]
+
+
+    def copy(self) -> dict:
+        return pickle.loads(self._snapshot)
+
+
+    def diff(self, config: dict) -> list[str]:
+        """
+        Report every key of config that differs from the template
+
+        Returns:
+            list: Entries formatted as '<change>: <key path>', ie. 'Changed: Kernel/Add[Lilu.kext]/Enabled'
+        """
+
+        return self.compare(self.template, config)
+
+
+    @classmethod
+    def compare(cls, original: dict, modified: dict) -> list[str]:
+        """
+        Report every key that differs between two configs, in the same format as diff()
+        """
+
+        changes = []
+        cls._diff(original, modified, "", changes)
+        return changes
+
+
+    @classmethod
+    def _diff(cls, original, modified, path: str, changes: list):
+        if isinstance(original, dict) and isinstance(modified, dict):
+            for key in original:
+                if key not in modified:
+                    changes.append(f"Removed: {path}{key}")
+                else:
+                    cls._diff(original[key], modified[key], f"{path}{key}/", changes)
+            for key in modified:
+                if key not in original:
+                    changes.append(f"Added: {path}{key}")
+            return
+
+        if isinstance(original, list) and isinstance(modified, list):
+            original_entries = cls._index_entries(original)
+            modified_entries = cls._index_entries(modified)
+            for key in original_entries:
+                if key not in modified_entries:
+                    changes.append(f"Removed: {path.rstrip('/')}[{key}]")
+                else:
+                    cls._diff(original_entries[key], modified_entries[key], f"{path.rstrip('/')}[{key}]/", changes)
+            for key in modified_entries:
+                if key not in original_entries:
+                    changes.append(f"Added: {path.rstrip('/')}[{key}]")
+            return
+
+        if original != modified or type(original) is not type(modified):
+            changes.append(f"Changed: {path.rstrip('/')}")
+
+
+    @classmethod
+    def _index_entries(cls, entries: list) -> dict:
+        """
+        Key array entries by their identifying value, falling back to the index
+        """
+
+        indexed = {}
+        for index, entry in enumerate(entries):
+            key = index
+            if isinstance(entry, dict):
+                for entry_key in cls.ENTRY_KEYS:
+                    if isinstance(entry.get(entry_key), str) and entry[entry_key] and entry[entry_key] not in indexed:
+                        key = entry[entry_key]
+                        break
+            indexed[key] = entry
+        return indexed
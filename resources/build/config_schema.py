@@ -0,0 +1,438 @@
+# In-process validation of config.plist against OpenCore's schema
+
+import re
+
+from resources import constants
+from resources.build import cache
+
+
+class ConfigValidator:
+    """
+    Validates a config dict against the rules of the bundled OpenCore's ocvalidate
+
+    Dictionary keys and their types are derived from our config.plist template,
+    while array entries and value rules mirror ocvalidate's per-section checks.
+    Works directly on the in-memory config, thus needs neither the ocvalidate
+    binary nor a macOS host.
+
+    Usage:
+    >>> from resources.build.config_schema import ConfigValidator
+    >>> errors = ConfigValidator(self.constants).validate(self.config)
+    """
+
+    # OpenCore release these rules were written against
+    OPENCORE_VERSION = "0.8.8"
+
+    # Dictionaries whose keys are user defined, with the type of each value
+    MAP_SCHEMAS = {
+        "DeviceProperties->Add":    dict,
+        "DeviceProperties->Delete": list,
+        "NVRAM->Add":               dict,
+        "NVRAM->Delete":            list,
+        "NVRAM->LegacySchema":      list,
+    }
+
+    ENTRY_SCHEMAS = {
+        "ACPI->Add": {
+            "Comment": str, "Enabled": bool, "Path": str,
+        },
+        "ACPI->Delete": {
+            "All": bool, "Comment": str, "Enabled": bool, "OemTableId": bytes, "TableLength": int, "TableSignature": bytes,
+        },
+        "ACPI->Patch": {
+            "Base": str, "BaseSkip": int, "Comment": str, "Count": int, "Enabled": bool, "Find": bytes, "Limit": int, "Mask": bytes,
+            "OemTableId": bytes, "Replace": bytes, "ReplaceMask": bytes, "Skip": int, "TableLength": int, "TableSignature": bytes,
+        },
+        "Booter->MmioWhitelist": {
+            "Address": int, "Comment": str, "Enabled": bool,
+        },
+        "Booter->Patch": {
+            "Arch": str, "Comment": str, "Count": int, "Enabled": bool, "Find": bytes, "Identifier": str, "Limit": int,
+            "Mask": bytes, "Replace": bytes, "ReplaceMask": bytes, "Skip": int,
+        },
+        "Kernel->Add": {
+            "Arch": str, "BundlePath": str, "Comment": str, "Enabled": bool, "ExecutablePath": str, "MaxKernel": str,
+            "MinKernel": str, "PlistPath": str,
+        },
+        "Kernel->Block": {
+            "Arch": str, "Comment": str, "Enabled": bool, "Identifier": str, "MaxKernel": str, "MinKernel": str, "Strategy": str,
+        },
+        "Kernel->Force": {
+            "Arch": str, "BundlePath": str, "Comment": str, "Enabled": bool, "ExecutablePath": str, "Identifier": str,
+            "MaxKernel": str, "MinKernel": str, "PlistPath": str,
+        },
+        "Kernel->Patch": {
+            "Arch": str, "Base": str, "Comment": str, "Count": int, "Enabled": bool, "Find": bytes, "Identifier": str, "Limit": int,
+            "Mask": bytes, "MaxKernel": str, "MinKernel": str, "Replace": bytes, "ReplaceMask": bytes, "Skip": int,
+        },
+        "Misc->BlessOverride": str,
+        "Misc->Entries": {
+            "Arguments": str, "Auxiliary": bool, "Comment": str, "Enabled": bool, "Flavour": str, "Name": str, "Path": str, "TextMode": bool,
+        },
+        "Misc->Tools": {
+            "Arguments": str, "Auxiliary": bool, "Comment": str, "Enabled": bool, "Flavour": str, "FullNvramAccess": bool, "Name": str,
+            "Path": str, "RealPath": bool, "TextMode": bool,
+        },
+        "UEFI->Drivers": {
+            "Arguments": str, "Comment": str, "Enabled": bool, "LoadEarly": bool, "Path": str,
+        },
+        "UEFI->ReservedMemory": {
+            "Address": int, "Comment": str, "Enabled": bool, "Size": int, "Type": str,
+        },
+    }
+
+    # Values accepted by string options, per ocvalidate
+    ALLOWED_VALUES = {
+        "Kernel->Scheme->KernelArch":          ["Auto", "i386", "i386-user32", "x86_64"],
+        "Kernel->Scheme->KernelCache":         ["Auto", "Cacheless", "Mkext", "Prelinked"],
+        "Misc->Boot->HibernateMode":           ["None", "Auto", "RTC", "NVRAM"],
+        "Misc->Boot->LauncherOption":          ["Disabled", "Full", "Short", "System"],
+        "Misc->Boot->PickerMode":              ["Builtin", "External", "Apple"],
+        "Misc->Security->DmgLoading":          ["Disabled", "Signed", "Any"],
+        "Misc->Security->Vault":               ["Optional", "Basic", "Secure"],
+        "Misc->Security->SecureBootModel": [
+            "Default", "Disabled", "j137", "j680", "j132", "j174", "j140k", "j780", "j213", "j140a",
+            "j152f", "j160", "j230k", "j214k", "j223", "j215", "j185", "j185f", "x86legacy",
+        ],
+        "PlatformInfo->Generic->SystemMemoryStatus": ["Auto", "Upgradable", "Soldered"],
+        "PlatformInfo->UpdateSMBIOSMode":      ["TryOverwrite", "Create", "Overwrite", "Custom"],
+        "UEFI->AppleInput->AppleEvent":        ["Auto", "Builtin", "OEM"],
+        "UEFI->Audio->PlayChime":              ["Auto", "Enabled", "Disabled"],
+        "UEFI->Input->KeySupportMode":         ["Auto", "V1", "V2", "AMI"],
+        "UEFI->Input->PointerSupportMode":     ["", "ASUS"],
+        "UEFI->Output->GopPassThrough":        ["Enabled", "Disabled", "Apple"],
+        "UEFI->Output->TextRenderer":          ["BuiltinGraphics", "BuiltinText", "SystemGraphics", "SystemText", "SystemGeneric"],
+    }
+
+    ARCHITECTURES = ["Any", "i386", "x86_64"]
+    RESERVED_MEMORY_TYPES = [
+        "Reserved", "LoaderCode", "LoaderData", "BootServiceCode", "BootServiceData", "RuntimeCode", "RuntimeData",
+        "Available", "Persistent", "UnusableMemory", "ACPIReclaimMemory", "ACPIMemoryNVS", "MemoryMappedIO",
+        "MemoryMappedIOPortSpace", "PalCode",
+    ]
+
+    KERNEL_VERSION = re.compile(r"^(\d+(\.\d+){0,2})?$")
+    GUID = re.compile(r"^[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}$")
+    DEVICE_PATH = re.compile(r"^PciRoot\(0x[0-9A-Fa-f]+\)(/Pci\(0x[0-9A-Fa-f]+,0x[0-9A-Fa-f]+\))+$")
+    ILLEGAL_PATH_CHARACTERS = set(':*?"<>|')
+
+
+    def __init__(self, global_constants: constants.Constants):
+        self.constants: constants.Constants = global_constants
+
+        self.template: dict = cache.ConfigTemplate.load(self.constants.plist_template).template
+        self.errors: list = []
+
+
+    def validate(self, config: dict) -> list:
+        """
+        Validate config, returning a list of errors in ocvalidate's notation
+
+        Value rules are only checked once the structure is valid, as they rely on it
+        """
+
+        self.errors = []
+
+        # Rules for another release would pass configs the bundled OpenCore rejects
+        if self.constants.opencore_version != self.OPENCORE_VERSION:
+            self._error(f"Config schema targets OpenCore {self.OPENCORE_VERSION}, update it for OpenCore {self.constants.opencore_version}")
+            return self.errors
+
+        self._check_dict(self.template, config, "")
+        if self.errors:
+            return self.errors
+
+        self._check_acpi(config["ACPI"])
+        self._check_booter(config["Booter"])
+        self._check_device_properties(config["DeviceProperties"])
+        self._check_kernel(config["Kernel"])
+        self._check_misc(config["Misc"])
+        self._check_nvram(config["NVRAM"])
+        self._check_platform_info(config["PlatformInfo"])
+        self._check_uefi(config["UEFI"])
+        self._check_allowed_values(config)
+
+        return self.errors
+
+
+    def _error(self, message: str):
+        self.errors.append(message)
+
+
+    def _type_name(self, value) -> str:
+        return {bool: "boolean", int: "integer", str: "string", bytes: "data", dict: "dictionary", list: "array"}.get(type(value), type(value).__name__)
+
+
+    def _check_type(self, value, expected: type, path: str) -> bool:
+        # bool subclasses int, thus compare exact types
+        if type(value) is not expected:
+            self._error(f"{path} has invalid type {self._type_name(value)}, expected {self._type_name(expected())}")
+            return False
+        return True
+
+
+    def _check_dict(self, template: dict, config, path: str):
+        if not self._check_type(config, dict, path or "Root"):
+            return
+
+        for key in template:
+            if key.startswith("#"):
+                continue
+            key_path = f"{path}->{key}" if path else key
+            if key not in config:
+                self._error(f"{key_path} is missing")
+                continue
+            self._check_value(template[key], config[key], key_path)
+
+        for key in config:
+            if key.startswith("#"):
+                continue
+            if key not in template:
+                self._error(f"{path}->{key} is not a known key" if path else f"{key} is not a known key")
+
+
+    def _check_value(self, template, value, path: str):
+        if path in self.MAP_SCHEMAS:
+            self._check_map(value, self.MAP_SCHEMAS[path], path)
+        elif path in self.ENTRY_SCHEMAS:
+            self._check_array(value, self.ENTRY_SCHEMAS[path], path)
+        elif isinstance(template, dict):
+            self._check_dict(template, value, path)
+        else:
+            self._check_type(value, type(template), path)
+
+
+    def _check_map(self, value, schema: type, path: str):
+        if not self._check_type(value, dict, path):
+            return
+        for key, entry in value.items():
+            if key.startswith("#"):
+                continue
+            if not self._check_type(entry, schema, f"{path}->{key}"):
+                continue
+            if schema is list:
+                for index, item in enumerate(entry):
+                    self._check_type(item, str, f"{path}->{key}[{index}]")
+
+
+    def _check_array(self, value, schema, path: str):
+        if not self._check_type(value, list, path):
+            return
+        for index, entry in enumerate(value):
+            entry_path = f"{path}[{index}]"
+            if not isinstance(schema, dict):
+                self._check_type(entry, schema, entry_path)
+                continue
+            if not self._check_type(entry, dict, entry_path):
+                continue
+            for key, expected in schema.items():
+                if key not in entry:
+                    self._error(f"{entry_path}->{key} is missing")
+                else:
+                    self._check_type(entry[key], expected, f"{entry_path}->{key}")
+            for key in entry:
+                if key not in schema and not key.startswith("#"):
+                    self._error(f"{entry_path}->{key} is not a known key")
+
+
+    def _check_path(self, value: str, path: str, suffixes: tuple = None):
+        if value == "":
+            self._error(f"{path} is empty")
+            return
+        if not value.isascii() or not value.isprintable() or self.ILLEGAL_PATH_CHARACTERS & set(value):
+            self._error(f"{path} contains illegal character")
+        if suffixes and not value.lower().endswith(suffixes):
+            self._error(f"{path} does not end with {' or '.join(suffixes)}")
+
+
+    def _check_duplicates(self, entries: list, key: str, path: str):
+        seen = set()
+        for index, entry in enumerate(entries):
+            if entry[key] in seen:
+                self._error(f"{path}[{index}]->{key} is duplicated ({entry[key]})")
+            seen.add(entry[key])
+
+
+    def _check_comments(self, entries: list, path: str):
+        for index, entry in enumerate(entries):
+            if not entry["Comment"].isascii() or not entry["Comment"].isprintable():
+                self._error(f"{path}[{index}]->Comment contains illegal character")
+
+
+    def _check_patch(self, entry: dict, path: str):
+        """
+        Find/Replace and mask sizing, shared by ACPI, Booter and Kernel patches
+
+        Empty Find is allowed, patching at Base instead
+        """
+
+        if entry["Find"] and len(entry["Find"]) != len(entry["Replace"]):
+            self._error(f"{path}->Find and Replace have different sizes")
+        if entry["Find"] and entry["Mask"] and len(entry["Mask"]) != len(entry["Find"]):
+            self._error(f"{path}->Mask and Find have different sizes")
+        if entry["ReplaceMask"] and len(entry["ReplaceMask"]) != len(entry["Replace"]):
+            self._error(f"{path}->ReplaceMask and Replace have different sizes")
+
+
+    def _check_kernel_range(self, entry: dict, path: str):
+        for key in ["MinKernel", "MaxKernel"]:
+            if not self.KERNEL_VERSION.match(entry[key]):
+                self._error(f"{path}->{key} has invalid format ({entry[key]})")
+
+
+    def _check_arch(self, entry: dict, path: str):
+        if entry["Arch"] not in self.ARCHITECTURES:
+            self._error(f"{path}->Arch is invalid ({entry['Arch']})")
+
+
+    def _check_acpi(self, acpi: dict):
+        for index, entry in enumerate(acpi["Add"]):
+            self._check_path(entry["Path"], f"ACPI->Add[{index}]->Path", (".aml", ".bin"))
+        self._check_duplicates(acpi["Add"], "Path", "ACPI->Add")
+
+        for section in ["Delete", "Patch"]:
+            for index, entry in enumerate(acpi[section]):
+                if len(entry["TableSignature"]) not in [0, 4]:
+                    self._error(f"ACPI->{section}[{index}]->TableSignature has illegal length")
+                if len(entry["OemTableId"]) not in [0, 8]:
+                    self._error(f"ACPI->{section}[{index}]->OemTableId has illegal length")
+
+        for index, entry in enumerate(acpi["Patch"]):
+            self._check_patch(entry, f"ACPI->Patch[{index}]")
+
+        for section in ["Add", "Delete", "Patch"]:
+            self._check_comments(acpi[section], f"ACPI->{section}")
+
+
+    def _check_booter(self, booter: dict):
+        for index, entry in enumerate(booter["Patch"]):
+            path = f"Booter->Patch[{index}]"
+            self._check_arch(entry, path)
+            self._check_patch(entry, path)
+            if entry["Identifier"] == "":
+                self._error(f"{path}->Identifier is empty")
+
+        for section in ["MmioWhitelist", "Patch"]:
+            self._check_comments(booter[section], f"Booter->{section}")
+
+
+    def _check_device_properties(self, device_properties: dict):
+        for section in ["Add", "Delete"]:
+            for device_path in device_properties[section]:
+                if not device_path.startswith("#") and not self.DEVICE_PATH.match(device_path):
+                    self._error(f"DeviceProperties->{section}->{device_path} is not a valid device path")
+
+
+    def _check_kernel(self, kernel: dict):
+        for section in ["Add", "Force"]:
+            bundles = []
+            all_bundles = {entry["BundlePath"] for entry in kernel[section]}
+            for index, entry in enumerate(kernel[section]):
+                path = f"Kernel->{section}[{index}]"
+                self._check_arch(entry, path)
+                self._check_kernel_range(entry, path)
+                self._check_path(entry["BundlePath"], f"{path}->BundlePath", (".kext",))
+                self._check_path(entry["PlistPath"], f"{path}->PlistPath", (".plist",))
+                if entry["ExecutablePath"]:
+                    self._check_path(entry["ExecutablePath"], f"{path}->ExecutablePath")
+
+                # Plugins of an injected kext must come after it, standalone plugins are fine
+                if entry["Enabled"] is True and ".kext/" in entry["BundlePath"]:
+                    parent = entry["BundlePath"].split(".kext/")[0] + ".kext"
+                    if parent in all_bundles and parent not in bundles:
+                        self._error(f"{path}->BundlePath requires {parent} to be enabled before it")
+                if entry["Enabled"] is True:
+                    bundles.append(entry["BundlePath"])
+            self._check_duplicates(kernel[section], "BundlePath", f"Kernel->{section}")
+
+        for index, entry in enumerate(kernel["Block"]):
+            path = f"Kernel->Block[{index}]"
+            self._check_arch(entry, path)
+            self._check_kernel_range(entry, path)
+            if entry["Identifier"] == "":
+                self._error(f"{path}->Identifier is empty")
+            if entry["Strategy"] not in ["Disable", "Exclude"]:
+                self._error(f"{path}->Strategy is invalid ({entry['Strategy']})")
+
+        for index, entry in enumerate(kernel["Patch"]):
+            path = f"Kernel->Patch[{index}]"
+            self._check_arch(entry, path)
+            self._check_kernel_range(entry, path)
+            self._check_patch(entry, path)
+            if entry["Identifier"] == "":
+                self._error(f"{path}->Identifier is empty")
+            if entry["Base"] == "" and entry["Find"] == b"":
+                self._error(f"{path}->Base and Find are both empty")
+
+        for key in ["Cpuid1Data", "Cpuid1Mask"]:
+            if len(kernel["Emulate"][key]) not in [0, 16]:
+                self._error(f"Kernel->Emulate->{key} has illegal length")
+        self._check_kernel_range(kernel["Emulate"], "Kernel->Emulate")
+
+        for section in ["Add", "Block", "Force", "Patch"]:
+            self._check_comments(kernel[section], f"Kernel->{section}")
+
+
+    def _check_misc(self, misc: dict):
+        if misc["Boot"]["LauncherPath"] == "":
+            self._error("Misc->Boot->LauncherPath is empty")
+
+        for section in ["Entries", "Tools"]:
+            for index, entry in enumerate(misc[section]):
+                path = f"Misc->{section}[{index}]"
+                if section == "Tools":
+                    self._check_path(entry["Path"], f"{path}->Path")
+                elif entry["Path"] == "":
+                    self._error(f"{path}->Path is empty")
+                if entry["Flavour"] == "" or not entry["Flavour"].isascii():
+                    self._error(f"{path}->Flavour is invalid")
+            self._check_comments(misc[section], f"Misc->{section}")
+        self._check_duplicates(misc["Tools"], "Path", "Misc->Tools")
+
+        security = misc["Security"]
+        if security["SecureBootModel"] != "Disabled" and security["DmgLoading"] == "Any":
+            self._error("Misc->Security->DmgLoading cannot be Any with SecureBootModel enabled")
+        if security["EnablePassword"] is True and (len(security["PasswordHash"]) != 64 or not security["PasswordSalt"]):
+            self._error("Misc->Security->PasswordHash or PasswordSalt is invalid")
+
+
+    def _check_nvram(self, nvram: dict):
+        for section in ["Add", "Delete", "LegacySchema"]:
+            for guid in nvram[section]:
+                if not guid.startswith("#") and not self.GUID.match(guid):
+                    self._error(f"NVRAM->{section}->{guid} is not a valid GUID")
+
+
+    def _check_platform_info(self, platform_info: dict):
+        for section in ["DataHub", "Generic", "PlatformNVRAM", "SMBIOS"]:
+            uuid = platform_info[section]["SystemUUID"]
+            if uuid not in ["", "OEM"] and not self.GUID.match(uuid):
+                self._error(f"PlatformInfo->{section}->SystemUUID is not a valid UUID")
+
+        for section in ["Generic", "PlatformNVRAM"]:
+            if len(platform_info[section]["ROM"]) not in [0, 6]:
+                self._error(f"PlatformInfo->{section}->ROM has illegal length")
+
+
+    def _check_uefi(self, uefi: dict):
+        for index, entry in enumerate(uefi["Drivers"]):
+            self._check_path(entry["Path"], f"UEFI->Drivers[{index}]->Path", (".efi",))
+        self._check_duplicates(uefi["Drivers"], "Path", "UEFI->Drivers")
+
+        for index, entry in enumerate(uefi["ReservedMemory"]):
+            if entry["Type"] not in self.RESERVED_MEMORY_TYPES:
+                self._error(f"UEFI->ReservedMemory[{index}]->Type is invalid ({entry['Type']})")
+            if entry["Address"] % 0x1000 or entry["Size"] == 0 or entry["Size"] % 0x1000:
+                self._error(f"UEFI->ReservedMemory[{index}] is not page aligned")
+
+        for section in ["Drivers", "ReservedMemory"]:
+            self._check_comments(uefi[section], f"UEFI->{section}")
+
+
+    def _check_allowed_values(self, config: dict):
+        for path, allowed in self.ALLOWED_VALUES.items():
+            value = config
+            for key in path.split("->"):
+                value = value[key]
+            if value not in allowed:
+                self._error(f"{path} is invalid ({value})")
@@ -0,0 +1,253 @@
+# Parallel build engine for generating multiple OpenCore configurations
+
+import os
+import sys
+import copy
+import time
+import shutil
+import logging
+import plistlib
+import tempfile
+import traceback
+import subprocess
+import concurrent.futures
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+
+from resources import constants, device_probe, utilities
+from resources.build import build, config_schema
+
+
+@dataclass
+class BuildJob:
+    """
+    Single EFI build request
+
+    Parameters:
+        model (str):        Model to build for
+        computer (Computer): Hardware to build against, None to reuse the host's probe
+        external (bool):    Whether the build targets an external machine (ie. 'custom_model')
+    """
+
+    model: str
+    computer: Optional[device_probe.Computer] = None
+    external: bool = True
+
+
+@dataclass
+class BuildResult:
+    job: BuildJob
+    success: bool = False
+    error: Optional[str] = None
+    output: str = ""
+    build_root: Optional[Path] = None
+    duration: float = 0.0
+
+
+@dataclass
+class BuildReport:
+    results: list[BuildResult] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def failures(self) -> list[BuildResult]:
+        return [result for result in self.results if result.success is False]
+
+
+class _BuildLogCollector(logging.Handler):
+    """
+    Logging handler capturing a worker's output for the parent's report
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.INFO)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _initialize_worker():
+    """
+    Worker setup, invoked once per process in the pool
+
+    Replaces inherited handlers so workers don't interleave writes into the parent's log file
+    """
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+    utilities.disable_cls()
+
+
+def _build_worker(job: BuildJob, global_constants: constants.Constants, build_root: Path, validator=None) -> BuildResult:
+    """
+    Build a single job inside an isolated build root
+
+    Runs inside the process pool, thus all arguments must be picklable
+    """
+
+    result = BuildResult(job=job, build_root=build_root)
+    collector = _BuildLogCollector()
+    logging.getLogger().addHandler(collector)
+
+    start = time.perf_counter()
+    try:
+        global_constants.current_path = build_root
+        global_constants.gui_mode = True
+        if job.computer is not None:
+            global_constants.computer = job.computer
+        global_constants.custom_model = job.model if job.external else ""
+
+        builder = build.build_opencore(job.model, global_constants)
+        builder.build_opencore()
+
+        if validator:
+            validator(global_constants, builder.config)
+        result.success = True
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        logging.info(traceback.format_exc())
+    finally:
+        result.duration = time.perf_counter() - start
+        logging.getLogger().removeHandler(collector)
+        result.output = "\n".join(collector.lines)
+
+    return result
+
+
+def schema_validate_build(global_constants: constants.Constants, config: dict):
+    """
+    Validate a finished build's config against OpenCore's schema
+    """
+
+    errors = config_schema.ConfigValidator(global_constants).validate(config)
+    if errors:
+        for error in errors:
+            logging.info(f"- {error}")
+        raise Exception(f"Config schema reported {len(errors)} errors")
+
+
+def ocvalidate_build(global_constants: constants.Constants, config: dict):
+    """
+    Validate a finished build's config against the bundled ocvalidate, where the host can run it
+
+    The config is written out on its own, as archive builds have no config.plist on disk
+    """
+
+    if sys.platform != "darwin" or not os.access(global_constants.ocvalidate_path, os.X_OK):
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        config_plist = Path(folder) / "config.plist"
+        with config_plist.open("wb") as file:
+            plistlib.dump(config, file, sort_keys=True)
+        result = subprocess.run([global_constants.ocvalidate_path, config_plist], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        logging.info(result.stdout.decode())
+        raise Exception("ocvalidate reported errors")
+
+
+def validate_build(global_constants: constants.Constants, config: dict):
+    """
+    Validate a finished build's config against OpenCore's schema, cross-checked with ocvalidate
+    """
+
+    schema_validate_build(global_constants, config)
+    ocvalidate_build(global_constants, config)
+
+
+class BuildEngine:
+    """
+    Build engine for generating multiple EFIs in parallel
+
+    Each job is handed its own copy of Constants and an isolated build root,
+    thus builds cannot step on each other's OpenCore-Build folder
+
+    Usage:
+    >>> from resources.build.engine import BuildEngine, BuildJob
+    >>> report = BuildEngine(self.constants).build([BuildJob("iMac12,2")])
+    """
+
+    def __init__(self, global_constants: constants.Constants, max_workers: int = None, validator=None, keep_output: bool = False):
+        self.constants: constants.Constants = global_constants
+
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.validator = validator
+        self.keep_output: bool = keep_output
+
+        self.engine_path: Path = self.constants.build_path / Path("Engine")
+
+
+    def build(self, jobs: list[BuildJob]) -> BuildReport:
+        """
+        Build all jobs in a process pool
+
+        Parameters:
+            jobs (list): List of BuildJob
+
+        Returns:
+            BuildReport: Results of each job, in the same order as requested
+        """
+
+        report = BuildReport()
+        if not jobs:
+            return report
+
+        start = time.perf_counter()
+        worker_constants = self._generate_worker_constants()
+
+        logging.info(f"- Building {len(jobs)} configurations with {min(self.max_workers, len(jobs))} workers")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs)), initializer=_initialize_worker) as executor:
+            futures = [
+                executor.submit(_build_worker, job, worker_constants, self._generate_build_root(index, job), self.validator)
+                for index, job in enumerate(jobs)
+            ]
+            for job, future in zip(jobs, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Worker died before it could report back (ie. pickling error, crashed process)
+                    result = BuildResult(job=job, error=f"{type(e).__name__}: {e}")
+                report.results.append(result)
+                self._log_result(result)
+
+        report.duration = time.perf_counter() - start
+        logging.info(f"- Finished {len(jobs)} builds in {report.duration:.2f}s, {len(report.failures)} failed")
+
+        if self.keep_output is False:
+            shutil.rmtree(self.engine_path, ignore_errors=True)
+
+        return report
+
+
+    def _generate_worker_constants(self) -> constants.Constants:
+        """
+        Snapshot of Constants safe to hand to other processes
+        """
+
+        worker_constants = copy.copy(self.constants)
+        # Threads are not picklable, and workers have no use for the payload unpacker
+        worker_constants.unpack_thread = None
+        return worker_constants
+
+
+    def _generate_build_root(self, index: int, job: BuildJob) -> Path:
+        build_root = self.engine_path / Path(f"{index:03d}-{job.model.replace(',', '_')}")
+        if build_root.exists():
+            shutil.rmtree(build_root, ignore_errors=True)
+        build_root.mkdir(parents=True)
+        return build_root
+
+
+    def _log_result(self, result: BuildResult):
+        if result.success is True:
+            logging.info(f"- Build succeeded for {result.job.model} ({result.duration:.2f}s)")
+            return
+
+        logging.info(f"- Build failed for {result.job.model}: {result.error}")
+        if result.output:
+            logging.info(result.output)
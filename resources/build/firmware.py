@@ -5,7 +5,7 @@ from resources import constants, generate_smbios
 from resources.build import support
 from data import smbios_data, cpu_data
 
-import binascii, shutil, logging
+import binascii, logging
 from pathlib import Path
 
 class build_firmware:
@@ -84,7 +84,7 @@ class build_firmware:
         if smbios_data.smbios_dictionary[self.model]["CPU Generation"] == cpu_data.cpu_data.nehalem.value and not (self.model.startswith("MacPro") or self.model.startswith("Xserve")):
             logging.info("- Adding SSDT-CPBG.aml")
             support.build_support(self.model, self.constants, self.config).get_item_by_kv(self.config["ACPI"]["Add"], "Path", "SSDT-CPBG.aml")["Enabled"] = True
-            shutil.copy(self.constants.pci_ssdt_path, self.constants.acpi_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.pci_ssdt_path, self.constants.acpi_path)
 
         if cpu_data.cpu_data.sandy_bridge <= smbios_data.smbios_dictionary[self.model]["CPU Generation"] <= cpu_data.cpu_data.ivy_bridge.value and self.model != "MacPro6,1":
             # Based on: https://egpu.io/forums/pc-setup/fix-dsdt-override-to-correct-error-12/
@@ -92,7 +92,7 @@ class build_firmware:
             logging.info("- Enabling Windows 10 UEFI Audio support")
             support.build_support(self.model, self.constants, self.config).get_item_by_kv(self.config["ACPI"]["Add"], "Path", "SSDT-PCI.aml")["Enabled"] = True
             support.build_support(self.model, self.constants, self.config).get_item_by_kv(self.config["ACPI"]["Patch"], "Comment", "BUF0 to BUF1")["Enabled"] = True
-            shutil.copy(self.constants.windows_ssdt_path, self.constants.acpi_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.windows_ssdt_path, self.constants.acpi_path)
 
 
     def cpu_compatibility_handling(self):
@@ -158,28 +158,28 @@ class build_firmware:
         if smbios_data.smbios_dictionary[self.model]["CPU Generation"] < cpu_data.cpu_data.sandy_bridge.value:
             # Sandy Bridge and newer Macs natively support ExFat
             logging.info("- Adding ExFatDxeLegacy.efi")
-            shutil.copy(self.constants.exfat_legacy_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.exfat_legacy_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("ExFatDxeLegacy.efi", "UEFI", "Drivers")["Enabled"] = True
 
         # NVMe check
         if self.constants.nvme_boot is True:
             logging.info("- Enabling NVMe boot support")
-            shutil.copy(self.constants.nvme_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.nvme_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("NvmExpressDxe.efi", "UEFI", "Drivers")["Enabled"] = True
 
         # USB check
         if self.constants.xhci_boot is True:
             logging.info("- Adding USB 3.0 Controller Patch")
             logging.info("- Adding XhciDxe.efi and UsbBusDxe.efi")
-            shutil.copy(self.constants.xhci_driver_path, self.constants.drivers_path)
-            shutil.copy(self.constants.usb_bus_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.xhci_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.usb_bus_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("XhciDxe.efi", "UEFI", "Drivers")["Enabled"] = True
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("UsbBusDxe.efi", "UEFI", "Drivers")["Enabled"] = True
 
         # PCIe Link Rate check
         if self.model == "MacPro3,1":
             logging.info("- Adding PCIe Link Rate Patch")
-            shutil.copy(self.constants.link_rate_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.link_rate_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("FixPCIeLinkRate.efi", "UEFI", "Drivers")["Enabled"] = True
 
 
@@ -254,11 +254,9 @@ class build_firmware:
         self.config["Misc"]["Boot"]["LauncherPath"] = "\\boot.efi"
 
         # Setup diags.efi chainloading
-        Path(self.constants.opencore_release_folder / Path("System/Library/CoreServices/.diagnostics/Drivers/HardwareDrivers")).mkdir(parents=True, exist_ok=True)
         if self.constants.boot_efi is True:
             path_oc_loader = self.constants.opencore_release_folder / Path("EFI/BOOT/BOOTx64.efi")
         else:
             path_oc_loader = self.constants.opencore_release_folder / Path("System/Library/CoreServices/boot.efi")
-        shutil.move(path_oc_loader, self.constants.opencore_release_folder / Path("System/Library/CoreServices/.diagnostics/Drivers/HardwareDrivers/Product.efi"))
-        shutil.copy(self.constants.diags_launcher_path, self.constants.opencore_release_folder)
-        shutil.move(self.constants.opencore_release_folder / Path("diags.efi"), self.constants.opencore_release_folder / Path("boot.efi"))
\ No newline at end of file
+        support.build_support(self.model, self.constants, self.config).plan.move(path_oc_loader, self.constants.opencore_release_folder / Path("System/Library/CoreServices/.diagnostics/Drivers/HardwareDrivers/Product.efi"))
+        support.build_support(self.model, self.constants, self.config).plan.add(self.constants.diags_launcher_path, self.constants.opencore_release_folder, "boot.efi")
\ No newline at end of file
@@ -7,7 +7,7 @@ from data import smbios_data, model_array, os_data, cpu_data
 
 from pathlib import Path
 
-import shutil, binascii, logging
+import binascii, logging
 
 class build_graphics_audio:
 
@@ -158,7 +158,7 @@ class build_graphics_audio:
                 "IOName": "#display",
                 "class-code": binascii.unhexlify("FFFFFFFF"),
             }
-        shutil.copy(self.constants.backlight_injector_path, self.constants.kexts_path)
+        support.build_support(self.model, self.constants, self.config).plan.add(self.constants.backlight_injector_path, self.constants.kexts_path)
         support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("BacklightInjector.kext")["Enabled"] = True
         self.config["UEFI"]["Quirks"]["ForgeUefiSupport"] = True
         self.config["UEFI"]["Quirks"]["ReloadOptionRoms"] = True
@@ -258,7 +258,7 @@ class build_graphics_audio:
             # Add ACPI patches
             support.build_support(self.model, self.constants, self.config).get_item_by_kv(self.config["ACPI"]["Add"], "Path", "SSDT-DGPU.aml")["Enabled"] = True
             support.build_support(self.model, self.constants, self.config).get_item_by_kv(self.config["ACPI"]["Patch"], "Comment", "_INI to XINI")["Enabled"] = True
-            shutil.copy(self.constants.demux_ssdt_path, self.constants.acpi_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.demux_ssdt_path, self.constants.acpi_path)
             # Disable dGPU
             # IOACPIPlane:/_SB/PCI0@0/P0P2@10000/GFX0@0
             self.config["DeviceProperties"]["Add"]["PciRoot(0x0)/Pci(0x1,0x0)/Pci(0x0,0x0)"] = {
@@ -284,13 +284,13 @@ class build_graphics_audio:
         # AMD GOP VBIOS injection for AMD GCN 1-4 GPUs
         if self.constants.amd_gop_injection is True:
             logging.info("- Adding AMDGOP.efi")
-            shutil.copy(self.constants.amd_gop_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.amd_gop_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("AMDGOP.efi", "UEFI", "Drivers")["Enabled"] = True
 
         # Nvidia Kepler GOP VBIOS injection
         if self.constants.nvidia_kepler_gop_injection is True:
             logging.info("- Adding NVGOP_GK.efi")
-            shutil.copy(self.constants.nvidia_kepler_gop_driver_path, self.constants.drivers_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.nvidia_kepler_gop_driver_path, self.constants.drivers_path)
             support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("NVGOP_GK.efi", "UEFI", "Drivers")["Enabled"] = True
 
 
@@ -303,25 +303,19 @@ class build_graphics_audio:
             logging.info("- Adding AppleMuxControl Override")
             amc_map_path = Path(self.constants.plist_folder_path) / Path("AppleMuxControl/Info.plist")
             self.config["DeviceProperties"]["Add"]["PciRoot(0x0)/Pci(0x1,0x0)/Pci(0x0,0x0)"] = {"agdpmod": "vit9696"}
-            Path(self.constants.amc_kext_folder).mkdir()
-            Path(self.constants.amc_contents_folder).mkdir()
-            shutil.copy(amc_map_path, self.constants.amc_contents_folder)
+            support.build_support(self.model, self.constants, self.config).plan.add(amc_map_path, self.constants.amc_contents_folder)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("AMC-Override.kext")["Enabled"] = True
 
         if self.model not in model_array.NoAGPMSupport:
             logging.info("- Adding AppleGraphicsPowerManagement Override")
             agpm_map_path = Path(self.constants.plist_folder_path) / Path("AppleGraphicsPowerManagement/Info.plist")
-            Path(self.constants.agpm_kext_folder).mkdir()
-            Path(self.constants.agpm_contents_folder).mkdir()
-            shutil.copy(agpm_map_path, self.constants.agpm_contents_folder)
+            support.build_support(self.model, self.constants, self.config).plan.add(agpm_map_path, self.constants.agpm_contents_folder)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("AGPM-Override.kext")["Enabled"] = True
 
         if self.model in model_array.AGDPSupport:
             logging.info("- Adding AppleGraphicsDevicePolicy Override")
             agdp_map_path = Path(self.constants.plist_folder_path) / Path("AppleGraphicsDevicePolicy/Info.plist")
-            Path(self.constants.agdp_kext_folder).mkdir()
-            Path(self.constants.agdp_contents_folder).mkdir()
-            shutil.copy(agdp_map_path, self.constants.agdp_contents_folder)
+            support.build_support(self.model, self.constants, self.config).plan.add(agdp_map_path, self.constants.agdp_contents_folder)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("AGDP-Override.kext")["Enabled"] = True
 
         # AGPM Patch
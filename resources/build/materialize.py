@@ -0,0 +1,295 @@
+# Plan-then-commit file handling for EFI builds
+
+import os
+import shutil
+import logging
+import plistlib
+import zipfile
+import concurrent.futures
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+
+from resources import constants
+
+
+@dataclass
+class PlanEntry:
+    """
+    Single file or folder of the planned EFI
+
+    Folders have neither source nor data set
+    """
+
+    source: Optional[Path] = None  # File on disk, or zip holding 'member'
+    member: Optional[str]  = None  # Member name within source zip
+    data:   Optional[bytes] = None # Generated file contents
+
+    @property
+    def is_folder(self):
+        return self.source is None and self.data is None
+
+
+class MaterializationPlan:
+    """
+    Records which files make up the EFI, without touching the disk
+
+    Build stages only describe what goes where, paths being relative to the
+    OpenCore-Build folder. Zips are planned by member, thus kexts are written
+    straight out of their payloads without intermediate copies.
+    'commit()' then writes the whole tree in one parallel pass, or
+    'commit_archive()' streams it straight into a zip.
+
+    Usage:
+    >>> from resources.build.materialize import MaterializationPlan
+    >>> plan = MaterializationPlan.for_config(self.config, self.constants)
+    >>> plan.add(self.constants.lilu_path, self.constants.kexts_path)
+    >>> plan.commit()
+    """
+
+    _active = None
+
+    def __init__(self, global_constants: constants.Constants, config: dict = None):
+        self.constants: constants.Constants = global_constants
+        self.config = config
+
+        self.root: Path = Path(self.constants.opencore_release_folder)
+        self.entries: dict[str, PlanEntry] = {}
+
+        self.files_written: int = 0
+        self.bytes_written: int = 0
+
+
+    @classmethod
+    def for_config(cls, config: dict, global_constants: constants.Constants):
+        """
+        Return the plan for the config currently being built
+        """
+
+        if cls._active is None or cls._active.config is not config:
+            cls._active = cls(global_constants, config)
+        return cls._active
+
+
+    def add(self, source: Path, destination: Path, name: str = None):
+        """
+        Plan a payload for the destination folder
+
+        Zips are planned as their extracted contents, mirroring how
+        kexts and resources have always been expanded into the EFI
+        """
+
+        source = Path(source)
+        if source.suffix == ".zip" and name is None:
+            self.add_archive(source, destination)
+        else:
+            self.add_file(source, destination, name)
+
+
+    def add_file(self, source: Path, destination: Path, name: str = None):
+        folder = self._relative(destination)
+        self._add_parents(folder)
+        self.entries[self._join(folder, name or Path(source).name)] = PlanEntry(source=Path(source))
+
+
+    def add_archive(self, source: Path, destination: Path):
+        folder = self._relative(destination)
+        self._add_parents(folder)
+        with zipfile.ZipFile(source) as zip_file:
+            for member in zip_file.infolist():
+                if member.filename.startswith("__MACOSX"):
+                    continue
+                path = self._join(folder, member.filename.rstrip("/"))
+                self._add_parents(path.rpartition("/")[0])
+                if member.is_dir():
+                    self.entries.setdefault(path, PlanEntry())
+                else:
+                    self.entries[path] = PlanEntry(source=Path(source), member=member.filename)
+
+
+    def add_tree(self, source: Path, destination: Path = None):
+        """
+        Plan an on-disk folder, ie. the cached OpenCore base tree
+        """
+
+        folder = self._relative(destination or self.root)
+        self._add_parents(folder)
+        for path, folders, files in os.walk(source):
+            relative = Path(path).relative_to(source).as_posix()
+            base = folder if relative == "." else self._join(folder, relative)
+            for entry in folders:
+                self.entries.setdefault(self._join(base, entry), PlanEntry())
+            for entry in files:
+                self.entries[self._join(base, entry)] = PlanEntry(source=Path(path) / entry)
+
+
+    def remove(self, path: Path):
+        """
+        Drop a file or folder, including everything planned within it
+        """
+
+        path = self._relative(path)
+        for entry in [entry for entry in self.entries if entry == path or entry.startswith(f"{path}/")]:
+            del self.entries[entry]
+
+
+    def move(self, source: Path, destination: Path):
+        """
+        Relocate a planned file or folder
+        """
+
+        source = self._relative(source)
+        destination = self._relative(destination)
+        if source not in self.entries:
+            raise FileNotFoundError(f"{source} is not part of the build")
+
+        self._add_parents(destination.rpartition("/")[0])
+        for entry in [entry for entry in self.entries if entry == source or entry.startswith(f"{source}/")]:
+            self.entries[destination + entry[len(source):]] = self.entries.pop(entry)
+
+
+    def exists(self, path: Path):
+        return self._relative(path) in self.entries
+
+
+    def children(self, path: Path):
+        """
+        Return names of all entries directly within the folder
+        """
+
+        prefix = f"{self._relative(path)}/"
+        return [entry[len(prefix):] for entry in self.entries if entry.startswith(prefix) and "/" not in entry[len(prefix):]]
+
+
+    def paths(self):
+        return set(self.entries)
+
+
+    def load_plist(self, path: Path):
+        """
+        Parse a planned plist, regardless of whether it comes from disk, a zip or a prior edit
+        """
+
+        return plistlib.loads(self._read(self.entries[self._relative(path)]))
+
+
+    def write_plist(self, path: Path, data: dict):
+        path = self._relative(path)
+        self._add_parents(path.rpartition("/")[0])
+        self.entries[path] = PlanEntry(data=plistlib.dumps(data, sort_keys=True))
+
+
+    def commit(self, max_workers: int = 8):
+        """
+        Write the planned tree into the OpenCore-Build folder
+        """
+
+        logging.info(f"- Writing {len(self.entries)} files and folders")
+
+        folders = []
+        tasks = {}
+        for path, entry in self.entries.items():
+            if entry.is_folder:
+                folders.append(path)
+            elif entry.member:
+                # Group members by zip, so each is opened only once
+                tasks.setdefault(entry.source, []).append((path, entry))
+            else:
+                tasks[(path,)] = [(path, entry)]
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        for folder in sorted(folders):
+            (self.root / folder).mkdir(parents=True, exist_ok=True)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for files, size in executor.map(self._write_entries, tasks.values()):
+                self.files_written += files
+                self.bytes_written += size
+
+
+    def commit_archive(self, archive_path: Path):
+        """
+        Write the planned tree straight into a zip, without a loose copy on disk
+
+        Zip members are recompressed on the fly, thus payloads are read once
+        and nothing but the archive itself is written
+        """
+
+        archive_path = Path(archive_path)
+        logging.info(f"- Writing {len(self.entries)} files and folders to {archive_path.name}")
+
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        scratch = archive_path.with_name(f".{archive_path.name}.partial")
+        source_zips = {}
+        try:
+            with zipfile.ZipFile(scratch, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for path in sorted(self.entries):
+                    entry = self.entries[path]
+                    if entry.is_folder:
+                        archive.writestr(f"{path}/", b"")
+                        continue
+                    if entry.member:
+                        if entry.source not in source_zips:
+                            source_zips[entry.source] = zipfile.ZipFile(entry.source)
+                        with source_zips[entry.source].open(entry.member) as source, archive.open(path, "w") as target:
+                            shutil.copyfileobj(source, target, 1024 * 1024)
+                    elif entry.data is not None:
+                        archive.writestr(path, entry.data)
+                    else:
+                        archive.write(entry.source, path)
+                    self.files_written += 1
+            scratch.replace(archive_path)
+        finally:
+            for source_zip in source_zips.values():
+                source_zip.close()
+            scratch.unlink(missing_ok=True)
+
+        self.bytes_written += archive_path.stat().st_size
+
+
+    def _write_entries(self, entries: list):
+        files = 0
+        size = 0
+        zip_file = zipfile.ZipFile(entries[0][1].source) if entries[0][1].member else None
+        try:
+            for path, entry in entries:
+                destination = self.root / path
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                if zip_file:
+                    with zip_file.open(entry.member) as source, destination.open("wb") as target:
+                        shutil.copyfileobj(source, target, 1024 * 1024)
+                elif entry.data is not None:
+                    destination.write_bytes(entry.data)
+                else:
+                    shutil.copy(entry.source, destination)
+                files += 1
+                size += destination.stat().st_size
+        finally:
+            if zip_file:
+                zip_file.close()
+        return files, size
+
+
+    def _read(self, entry: PlanEntry) -> bytes:
+        if entry.data is not None:
+            return entry.data
+        if entry.member:
+            with zipfile.ZipFile(entry.source) as zip_file:
+                return zip_file.read(entry.member)
+        return Path(entry.source).read_bytes()
+
+
+    def _relative(self, path: Path) -> str:
+        relative = Path(path).relative_to(self.root).as_posix()
+        return "" if relative == "." else relative
+
+
+    def _join(self, folder: str, name: str) -> str:
+        return f"{folder}/{name}" if folder else name
+
+
+    def _add_parents(self, path: str):
+        while path and path not in self.entries:
+            self.entries[path] = PlanEntry()
+            path = path.rpartition("/")[0]
@@ -5,7 +5,7 @@ from resources import constants, device_probe, generate_smbios, utilities
 from resources.build import support
 from data import model_array, smbios_data, cpu_data
 
-import binascii, shutil, logging
+import binascii, logging
 from pathlib import Path
 
 
@@ -17,11 +17,6 @@ class build_misc:
         self.config = config
         self.computer = self.constants.computer
 
-    def rmtree_handler(func, path, exc_info):
-        if exc_info[0] == FileNotFoundError:
-            return
-        raise  # pylint: disable=misplaced-bare-raise
-
     def build(self):
         self.feature_unlock_handling()
         self.restrict_events_handling()
@@ -116,9 +111,7 @@ class build_misc:
             pp_map_path = Path(self.constants.platform_plugin_plist_path) / Path(f"{self.model}/Info.plist")
             if not pp_map_path.exists():
                 raise Exception(f"{pp_map_path} does not exist!!! Please file an issue stating file is missing for {self.model}.")
-            Path(self.constants.pp_kext_folder).mkdir()
-            Path(self.constants.pp_contents_folder).mkdir()
-            shutil.copy(pp_map_path, self.constants.pp_contents_folder)
+            support.build_support(self.model, self.constants, self.config).plan.add(pp_map_path, self.constants.pp_contents_folder)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("CPUFriendDataProvider.kext")["Enabled"] = True
 
     def firewire_handling(self):
@@ -176,9 +169,7 @@ class build_misc:
                 or self.constants.serial_settings in ["Moderate", "Advanced"])
         ):
             logging.info("- Adding USB-Map.kext")
-            Path(self.constants.map_kext_folder).mkdir()
-            Path(self.constants.map_contents_folder).mkdir()
-            shutil.copy(usb_map_path, self.constants.map_contents_folder)
+            support.build_support(self.model, self.constants, self.config).plan.add(usb_map_path, self.constants.map_contents_folder)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("USB-Map.kext")["Enabled"] = True
             if self.model in model_array.Missing_USB_Map_Ventura and self.constants.serial_settings not in ["Moderate", "Advanced"]:
                 support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("USB-Map.kext")["MinKernel"] = "22.0.0"
@@ -197,7 +188,7 @@ class build_misc:
             self.model in ["MacPro4,1", "MacPro5,1"]
         ):
             logging.info("- Adding UHCI/OHCI USB support")
-            shutil.copy(self.constants.apple_usb_11_injector_path, self.constants.kexts_path)
+            support.build_support(self.model, self.constants, self.config).plan.add(self.constants.apple_usb_11_injector_path, self.constants.kexts_path)
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("USB1.1-Injector.kext/Contents/PlugIns/AppleUSBOHCI.kext")["Enabled"] = True
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("USB1.1-Injector.kext/Contents/PlugIns/AppleUSBOHCIPCI.kext")["Enabled"] = True
             support.build_support(self.model, self.constants, self.config).get_kext_by_bundle_path("USB1.1-Injector.kext/Contents/PlugIns/AppleUSBUHCI.kext")["Enabled"] = True
@@ -228,8 +219,8 @@ class build_misc:
 
         # OpenCanopy Settings (GUI)
         logging.info("- Adding OpenCanopy GUI")
-        shutil.rmtree(self.constants.resources_path, onerror=self.rmtree_handler)
-        shutil.copy(self.constants.gui_path, self.constants.oc_folder)
+        support.build_support(self.model, self.constants, self.config).plan.remove(self.constants.resources_path)
+        support.build_support(self.model, self.constants, self.config).plan.add(self.constants.gui_path, self.constants.oc_folder)
         support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("OpenCanopy.efi", "UEFI", "Drivers")["Enabled"] = True
         support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("OpenRuntime.efi", "UEFI", "Drivers")["Enabled"] = True
         support.build_support(self.model, self.constants, self.config).get_efi_binary_by_path("OpenLinuxBoot.efi", "UEFI", "Drivers")["Enabled"] = True
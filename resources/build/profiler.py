@@ -0,0 +1,197 @@
+# Per-stage instrumentation of EFI builds
+
+import os
+import sys
+import json
+import time
+import pickle
+import pstats
+import cProfile
+import logging
+import threading
+import contextlib
+
+from stat import S_ISREG
+from pathlib import Path
+from dataclasses import dataclass, field
+
+from resources import constants
+from resources.build import cache
+
+
+# Stage currently being recorded, shared with the process-wide audit hook
+_active_stage = None
+_audit_hook_installed = False
+
+
+def _audit_hook(event: str, args: tuple):
+    stage = _active_stage
+    if stage is None:
+        return
+
+    if event == "open":
+        path, mode, flags = args
+        if not isinstance(path, (str, bytes, os.PathLike)):
+            return
+        if mode is None:
+            writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+        else:
+            writing = any(character in mode for character in "wax+")
+        with stage.lock:
+            (stage.files_written if writing else stage.files_read).add(os.fsdecode(path))
+    elif event == "subprocess.Popen":
+        with stage.lock:
+            stage.subprocesses += 1
+
+
+@dataclass
+class StageRecord:
+    name: str
+    duration: float = 0.0
+    subprocesses: int = 0
+    files_read: set = field(default_factory=set)
+    files_written: set = field(default_factory=set)
+    config_changes: list = field(default_factory=list)
+    profile: list = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+    def to_dict(self) -> dict:
+        files_read = self._file_sizes(self.files_read)
+        files_written = self._file_sizes(self.files_written)
+        return {
+            "Name":                     self.name,
+            "Duration":                 round(self.duration, 6),
+            "Files Read":               len(files_read),
+            "Bytes Opened For Reading": sum(files_read),
+            "Files Written":            len(files_written),
+            "Bytes Opened For Writing": sum(files_written),
+            "Subprocesses":             self.subprocesses,
+            "Config Changes":           self.config_changes,
+            **({"Profile": self.profile} if self.profile else {}),
+        }
+
+
+    def _file_sizes(self, paths: set) -> list:
+        # Sizes of the regular files opened, as audit events don't expose the bytes transferred,
+        # thus files opened yet only partly read are counted in full
+        sizes = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if S_ISREG(stat.st_mode):
+                sizes.append(stat.st_size)
+        return sizes
+
+
+class BuildProfiler:
+    """
+    Records wall time, file I/O, subprocesses and config changes per build stage
+
+    File I/O and subprocesses are observed through an audit hook, thus cover
+    everything the stage does, including helpers and worker threads.
+    Stage output can additionally be profiled with cProfile ('profile_build').
+
+    Usage:
+    >>> from resources.build.profiler import BuildProfiler
+    >>> profiler = BuildProfiler(self.constants)
+    >>> with profiler.stage("Firmware", self.config):
+    ...     firmware.build_firmware(self.model, self.constants, self.config).build()
+    >>> profiler.write_report(self.model)
+    """
+
+    # Number of functions listed per stage profile
+    PROFILE_ENTRIES = 15
+
+    def __init__(self, global_constants: constants.Constants):
+        self.constants: constants.Constants = global_constants
+
+        self.stages: list[StageRecord] = []
+        self.start: float = time.perf_counter()
+
+        global _audit_hook_installed
+        if _audit_hook_installed is False:
+            # Audit hooks cannot be removed, thus install once and toggle via '_active_stage'
+            sys.addaudithook(_audit_hook)
+            _audit_hook_installed = True
+
+
+    @contextlib.contextmanager
+    def stage(self, name: str, config: dict = None):
+        """
+        Record everything done within the context as a single stage
+
+        Parameters:
+            name (str):    Stage name in the report
+            config (dict): Config the stage edits, to report the keys it touched
+        """
+
+        global _active_stage
+
+        record = StageRecord(name=name)
+        snapshot = pickle.dumps(config, protocol=pickle.HIGHEST_PROTOCOL) if config is not None else None
+        profile = cProfile.Profile() if self.constants.profile_build is True else None
+
+        previous_stage = _active_stage
+        _active_stage = record
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record.duration = time.perf_counter() - start
+            _active_stage = previous_stage
+
+            if snapshot is not None:
+                record.config_changes = cache.ConfigTemplate.compare(pickle.loads(snapshot), config)
+            if profile:
+                record.profile = self._summarize_profile(profile)
+            self.stages.append(record)
+
+
+    def report(self, model: str, template_diff: list = None) -> dict:
+        return {
+            "Model":            model,
+            "Patcher Version":  self.constants.patcher_version,
+            "OpenCore Version": f"{self.constants.opencore_version} - {self.constants.opencore_build}",
+            "Duration":         round(time.perf_counter() - self.start, 6),
+            "Stages":           [stage.to_dict() for stage in self.stages],
+            **({"Template Diff": template_diff} if template_diff is not None else {}),
+        }
+
+
+    def write_report(self, model: str, folder: Path = None, template_diff: list = None):
+        """
+        Write the report next to the EFI folder of the build, or into folder if provided
+
+        Parameters:
+            template_diff (list): Changes made to config.plist relative to the template, see build_opencore.template_diff()
+        """
+
+        report_path = Path(folder or self.constants.opencore_release_folder) / Path("Build-Report.json")
+        report = self.report(model, template_diff)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=4))
+
+        slowest = sorted(report["Stages"], key=lambda stage: stage["Duration"], reverse=True)[:3]
+        slowest = ", ".join(f"{stage['Name']} ({stage['Duration']:.2f}s)" for stage in slowest)
+        logging.info(f"- Build took {report['Duration']:.2f}s, slowest stages: {slowest}")
+
+
+    def _summarize_profile(self, profile: cProfile.Profile) -> list:
+        stats = pstats.Stats(profile)
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.PROFILE_ENTRIES]
+        return [
+            {
+                "Function":        f"{Path(file).name}:{line}({function})",
+                "Calls":           calls,
+                "Total Time":      round(total_time, 6),
+                "Cumulative Time": round(cumulative_time, 6),
+            }
+            for (file, line, function), (_, calls, total_time, cumulative_time, _) in entries
+        ]
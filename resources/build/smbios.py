@@ -1,11 +1,11 @@
 # Class for handling SMBIOS Patches, invocation from build.py
 # Copyright (C) 2020-2022, Dhinak G, Mykola Grymalyuk
 
-from resources import constants, utilities, generate_smbios
+from resources import constants, utilities, generate_smbios, smbios_index
 from resources.build import support
 from data import smbios_data, cpu_data, model_array
 
-import subprocess, plistlib, binascii, uuid, ast, logging
+import subprocess, binascii, uuid, ast, logging
 from pathlib import Path
 
 class build_smbios:
@@ -58,8 +58,7 @@ class build_smbios:
 
         spoofed_board = ""
         if spoofed_model in smbios_data.smbios_dictionary:
-            if "Board ID" in smbios_data.smbios_dictionary[spoofed_model]:
-                spoofed_board = smbios_data.smbios_dictionary[spoofed_model]["Board ID"]
+            spoofed_board = smbios_index.SMBIOSIndex.shared().board_for_model(spoofed_model)
         logging.info(f"- Using Board ID: {spoofed_board}")
 
         self.spoofed_model = spoofed_model
@@ -112,7 +111,7 @@ class build_smbios:
             and ((self.model in model_array.Missing_USB_Map or self.model in model_array.Missing_USB_Map_Ventura) or self.constants.serial_settings in ["Moderate", "Advanced"])
         ):
             new_map_ls = Path(self.constants.map_contents_folder) / Path("Info.plist")
-            map_config = plistlib.load(Path(new_map_ls).open("rb"))
+            map_config = support.build_support(self.model, self.constants, self.config).plan.load_plist(new_map_ls)
             # Strip unused USB maps
             for entry in list(map_config["IOKitPersonalities_x86_64"]):
                 if not entry.startswith(self.model):
@@ -129,29 +128,29 @@ class build_smbios:
                                 map_config["IOKitPersonalities_x86_64"][entry]["IONameMatch"] = "XHC1"
                     except KeyError:
                         continue
-            plistlib.dump(map_config, Path(new_map_ls).open("wb"), sort_keys=True)
+            support.build_support(self.model, self.constants, self.config).plan.write_plist(new_map_ls, map_config)
         if self.constants.allow_oc_everywhere is False and self.model not in ["iMac7,1", "Xserve2,1", "sumingyd1,1"] and self.constants.disallow_cpufriend is False and self.constants.serial_settings != "None":
             # Adjust CPU Friend Data to correct SMBIOS
             new_cpu_ls = Path(self.constants.pp_contents_folder) / Path("Info.plist")
-            cpu_config = plistlib.load(Path(new_cpu_ls).open("rb"))
+            cpu_config = support.build_support(self.model, self.constants, self.config).plan.load_plist(new_cpu_ls)
             string_stuff = str(cpu_config["IOKitPersonalities"]["CPUFriendDataProvider"]["cf-frequency-data"])
             string_stuff = string_stuff.replace(self.model, self.spoofed_model)
             string_stuff = ast.literal_eval(string_stuff)
             cpu_config["IOKitPersonalities"]["CPUFriendDataProvider"]["cf-frequency-data"] = string_stuff
-            plistlib.dump(cpu_config, Path(new_cpu_ls).open("wb"), sort_keys=True)
+            support.build_support(self.model, self.constants, self.config).plan.write_plist(new_cpu_ls, cpu_config)
 
         if self.constants.allow_oc_everywhere is False and self.constants.serial_settings != "None":
             if self.model == "MacBookPro9,1":
                 new_amc_ls = Path(self.constants.amc_contents_folder) / Path("Info.plist")
-                amc_config = plistlib.load(Path(new_amc_ls).open("rb"))
+                amc_config = support.build_support(self.model, self.constants, self.config).plan.load_plist(new_amc_ls)
                 amc_config["IOKitPersonalities"]["AppleMuxControl"]["ConfigMap"][self.spoofed_board] = amc_config["IOKitPersonalities"]["AppleMuxControl"]["ConfigMap"].pop(self.model)
                 for entry in list(amc_config["IOKitPersonalities"]["AppleMuxControl"]["ConfigMap"]):
                     if not entry.startswith(self.spoofed_board):
                         amc_config["IOKitPersonalities"]["AppleMuxControl"]["ConfigMap"].pop(entry)
-                plistlib.dump(amc_config, Path(new_amc_ls).open("wb"), sort_keys=True)
+                support.build_support(self.model, self.constants, self.config).plan.write_plist(new_amc_ls, amc_config)
             if self.model not in model_array.NoAGPMSupport:
                 new_agpm_ls = Path(self.constants.agpm_contents_folder) / Path("Info.plist")
-                agpm_config = plistlib.load(Path(new_agpm_ls).open("rb"))
+                agpm_config = support.build_support(self.model, self.constants, self.config).plan.load_plist(new_agpm_ls)
                 agpm_config["IOKitPersonalities"]["AGPM"]["Machines"][self.spoofed_board] = agpm_config["IOKitPersonalities"]["AGPM"]["Machines"].pop(self.model)
                 if self.model == "MacBookPro6,2":
                     # Force G State to not exceed moderate state
@@ -165,17 +164,17 @@ class build_smbios:
                     if not entry.startswith(self.spoofed_board):
                         agpm_config["IOKitPersonalities"]["AGPM"]["Machines"].pop(entry)
 
-                plistlib.dump(agpm_config, Path(new_agpm_ls).open("wb"), sort_keys=True)
+                support.build_support(self.model, self.constants, self.config).plan.write_plist(new_agpm_ls, agpm_config)
             if self.model in model_array.AGDPSupport:
                 new_agdp_ls = Path(self.constants.agdp_contents_folder) / Path("Info.plist")
-                agdp_config = plistlib.load(Path(new_agdp_ls).open("rb"))
+                agdp_config = support.build_support(self.model, self.constants, self.config).plan.load_plist(new_agdp_ls)
                 agdp_config["IOKitPersonalities"]["AppleGraphicsDevicePolicy"]["ConfigMap"][self.spoofed_board] = agdp_config["IOKitPersonalities"]["AppleGraphicsDevicePolicy"]["ConfigMap"].pop(
                     self.model
                 )
                 for entry in list(agdp_config["IOKitPersonalities"]["AppleGraphicsDevicePolicy"]["ConfigMap"]):
                     if not entry.startswith(self.spoofed_board):
                         agdp_config["IOKitPersonalities"]["AppleGraphicsDevicePolicy"]["ConfigMap"].pop(entry)
-                plistlib.dump(agdp_config, Path(new_agdp_ls).open("wb"), sort_keys=True)
+                support.build_support(self.model, self.constants, self.config).plan.write_plist(new_agdp_ls, agdp_config)
 
 
     def minimal_serial_patch(self):
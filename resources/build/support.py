@@ -2,27 +2,172 @@
 # Copyright (C) 2020-2022, Dhinak G, Mykola Grymalyuk
 
 from resources import constants, utilities
+from resources.build import materialize
 
 from pathlib import Path
-import shutil, plistlib, subprocess, zipfile
+from dataclasses import dataclass, field
+import os, subprocess
 import logging
 
+class ConfigIndex:
+    """
+    Lookup tables for config.plist arrays (ie. Kernel->Add by BundlePath)
+
+    Built once per config and shared by every build_support instance, tables
+    are created lazily per (array, key) and revalidated against the array on
+    use, thus stages are free to toggle, append or remove entries
+    """
+
+    _active = None
+
+    def __init__(self, config):
+        self.config = config
+        self._tables = {}
+
+
+    @classmethod
+    def for_config(cls, config):
+        """
+        Return the index for the config currently being built
+        """
+
+        if cls._active is None or cls._active.config is not config:
+            cls._active = cls(config)
+        return cls._active
+
+
+    def get(self, iterable, key, value):
+        """
+        Return the first entry in iterable whose key matches value, None if missing
+        """
+
+        table = self._table(iterable, key)
+        position = table.get(value)
+        if position is not None and position < len(iterable) and iterable[position].get(key) == value:
+            return iterable[position]
+
+        # Entry moved, was renamed or added since the table was built
+        table = self._table(iterable, key, rebuild=True)
+        position = table.get(value)
+        return iterable[position] if position is not None else None
+
+
+    def values(self, iterable, key):
+        """
+        Return all values of key within iterable
+        """
+
+        return self._table(iterable, key, rebuild=True).keys()
+
+
+    def bundle_names(self):
+        """
+        Return the file names of all kexts in Kernel->Add, including plugins
+        """
+
+        return {Path(bundle_path).name for bundle_path in self.values(self.config["Kernel"]["Add"], "BundlePath")}
+
+
+    def _table(self, iterable, key, rebuild=False):
+        cache_key = (id(iterable), key)
+        cached = self._tables.get(cache_key)
+        if cached and cached[0] is iterable and cached[1] == len(iterable) and rebuild is False:
+            return cached[2]
+
+        table = {}
+        for position, entry in enumerate(iterable):
+            if key in entry and entry[key] not in table:
+                table[entry[key]] = position
+        self._tables[cache_key] = (iterable, len(iterable), table)
+        return table
+
+
+@dataclass
+class PathingReport:
+    """
+    Differences between config.plist and the files on disk
+
+    Entries are (category, path) tuples, paths being relative to EFI/OC
+    """
+
+    missing: list = field(default_factory=list)  # Referenced by config.plist, but absent on disk
+    extra:   list = field(default_factory=list)  # Present on disk, but unused by config.plist
+
+
+    @property
+    def failed(self):
+        return bool(self.missing or self.extra)
+
+
+    @classmethod
+    def generate(cls, config, oc_folder, paths=None):
+        """
+        Compare config against a single walk of the OC folder
+
+        Alternatively compare against 'paths', relative to EFI/OC (ie. for archived builds)
+        """
+
+        on_disk = cls._snapshot(oc_folder) if paths is None else set(paths)
+
+        expected = {"config.plist": "config file"}
+        for acpi in config["ACPI"]["Add"]:
+            expected[f"ACPI/{acpi['Path']}"] = "ACPI Table"
+        for kext in config["Kernel"]["Add"]:
+            expected[f"Kexts/{kext['BundlePath']}"] = "kext"
+            expected[Path("Kexts", kext["BundlePath"], kext["ExecutablePath"]).as_posix()] = f"{kext['BundlePath']}'s binary"
+            expected[Path("Kexts", kext["BundlePath"], kext["PlistPath"]).as_posix()] = f"{kext['BundlePath']}'s plist"
+        for tool in config["Misc"]["Tools"]:
+            expected[f"Tools/{tool['Path']}"] = "tool"
+        for driver in config["UEFI"]["Drivers"]:
+            expected[f"Drivers/{driver['Path']}"] = "driver"
+
+        report = cls()
+        report.missing = sorted((category, path) for path, category in expected.items() if path not in on_disk)
+
+        # Tools and drivers without an entry are never loaded, thus likely a build error
+        for folder, category in [("Tools", "tool"), ("Drivers", "driver")]:
+            for path in sorted(on_disk):
+                if path.startswith(f"{folder}/") and "/" not in path[len(folder) + 1:] and path not in expected:
+                    report.extra.append((category, path))
+
+        return report
+
+
+    @staticmethod
+    def _snapshot(folder):
+        """
+        Relative paths of every file and folder within, from one os.scandir walk
+        """
+
+        paths = set()
+        pending = [(Path(folder), "")]
+        while pending:
+            current, prefix = pending.pop()
+            try:
+                entries = os.scandir(current)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    path = f"{prefix}{entry.name}"
+                    paths.add(path)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, f"{path}/"))
+        return paths
+
+
 class build_support:
 
     def __init__(self, model, versions, config):
         self.model = model
         self.constants: constants.Constants = versions
         self.config = config
+        self.index = ConfigIndex.for_config(config)
+        self.plan = materialize.MaterializationPlan.for_config(config, versions)
 
 
-    @staticmethod
-    def get_item_by_kv(iterable, key, value):
-        item = None
-        for i in iterable:
-            if i[key] == value:
-                item = i
-                break
-        return item
+    def get_item_by_kv(self, iterable, key, value):
+        return self.index.get(iterable, key, value)
 
 
     def get_kext_by_bundle_path(self, bundle_path):
@@ -52,7 +197,7 @@ class build_support:
             return
 
         logging.info(f"- Adding {kext_name} {kext_version}")
-        shutil.copy(kext_path, self.constants.kexts_path)
+        self.plan.add(kext_path, self.constants.kexts_path)
         kext["Enabled"] = True
 
 
@@ -72,56 +217,22 @@ class build_support:
         subprocess.run([str(self.constants.vault_path), f"{self.constants.oc_folder}/"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
 
-    def validate_pathing(self):
+    def validate_pathing(self, paths=None):
         # Verify whether all files are accounted for on-disk
         # This ensures that OpenCore won't hit a critical error and fail to boot
         logging.info("- Validating generated config")
-        if not Path(self.constants.opencore_release_folder / Path("EFI/OC/config.plist")):
-            logging.info("- OpenCore config file missing!!!")
-            raise Exception("OpenCore config file missing")
-
-        config_plist = plistlib.load(Path(self.constants.opencore_release_folder / Path("EFI/OC/config.plist")).open("rb"))
-
-        for acpi in config_plist["ACPI"]["Add"]:
-            if not Path(self.constants.opencore_release_folder / Path("EFI/OC/ACPI") / Path(acpi["Path"])).exists():
-                logging.info(f"  - Missing ACPI Table: {acpi['Path']}")
-                raise Exception(f"Missing ACPI Table: {acpi['Path']}")
-
-        for kext in config_plist["Kernel"]["Add"]:
-            kext_path = Path(self.constants.opencore_release_folder / Path("EFI/OC/Kexts") / Path(kext["BundlePath"]))
-            kext_binary_path = Path(kext_path / Path(kext["ExecutablePath"]))
-            kext_plist_path = Path(kext_path / Path(kext["PlistPath"]))
-            if not kext_path.exists():
-                logging.info(f"- Missing kext: {kext_path}")
-                raise Exception(f"Missing {kext_path}")
-            if not kext_binary_path.exists():
-                logging.info(f"- Missing {kext['BundlePath']}'s binary: {kext_binary_path}")
-                raise Exception(f"Missing {kext_binary_path}")
-            if not kext_plist_path.exists():
-                logging.info(f"- Missing {kext['BundlePath']}'s plist: {kext_plist_path}")
-                raise Exception(f"Missing {kext_plist_path}")
-
-        for tool in config_plist["Misc"]["Tools"]:
-            if not Path(self.constants.opencore_release_folder / Path("EFI/OC/Tools") / Path(tool["Path"])).exists():
-                logging.info(f"  - Missing tool: {tool['Path']}")
-                raise Exception(f"Missing tool: {tool['Path']}")
-
-        for driver in config_plist["UEFI"]["Drivers"]:
-            if not Path(self.constants.opencore_release_folder / Path("EFI/OC/Drivers") / Path(driver["Path"])).exists():
-                logging.info(f"  - Missing driver: {driver['Path']}")
-                raise Exception(f"Missing driver: {driver['Path']}")
-
-        # Validating local files
-        # Report if they have no associated config.plist entry (i.e. they're not being used)
-        for tool_files in Path(self.constants.opencore_release_folder / Path("EFI/OC/Tools")).glob("*"):
-            if tool_files.name not in [x["Path"] for x in config_plist["Misc"]["Tools"]]:
-                logging.info(f"  - Missing tool from config: {tool_files.name}")
-                raise Exception(f"Missing tool from config: {tool_files.name}")
-
-        for driver_file in Path(self.constants.opencore_release_folder / Path("EFI/OC/Drivers")).glob("*"):
-            if driver_file.name not in [x["Path"] for x in config_plist["UEFI"]["Drivers"]]:
-                logging.info(f"- Found extra driver: {driver_file.name}")
-                raise Exception(f"Found extra driver: {driver_file.name}")
+        oc_folder = Path(self.constants.opencore_release_folder / Path("EFI/OC"))
+        report = PathingReport.generate(self.config, oc_folder, paths)
+
+        for category, path in report.missing:
+            logging.info(f"  - Missing {category}: {path}")
+        for category, path in report.extra:
+            logging.info(f"  - Found extra {category}: {path}")
+
+        if report.failed:
+            raise Exception(f"Build pathing invalid: {len(report.missing)} missing, {len(report.extra)} extra files")
+
+        return report
 
 
     def cleanup(self):
@@ -141,21 +252,6 @@ class build_support:
                     if item["Enabled"] is False:
                         self.config[entry][sub_entry].remove(item)
 
-        for kext in self.constants.kexts_path.rglob("*.zip"):
-            with zipfile.ZipFile(kext) as zip_file:
-                zip_file.extractall(self.constants.kexts_path)
-            kext.unlink()
-
-        for item in self.constants.oc_folder.rglob("*.zip"):
-            with zipfile.ZipFile(item) as zip_file:
-                zip_file.extractall(self.constants.oc_folder)
-            item.unlink()
-
-        if not self.constants.recovery_status:
-            # Crashes in RecoveryOS for unknown reason
-            for i in self.constants.build_path.rglob("__MACOSX"):
-                shutil.rmtree(i)
-
         # Remove unused plugins inside of kexts
         # Following plugins are sometimes unused as there's different variants machines need
         known_unused_plugins = [
@@ -165,16 +261,16 @@ class build_support:
             "AirPortBrcm4360_Injector.kext",
             "AirPortBrcmNIC_Injector.kext"
         ]
-        for kext in Path(self.constants.opencore_release_folder / Path("EFI/OC/Kexts")).glob("*.kext"):
-            for plugin in Path(kext / "Contents/PlugIns/").glob("*.kext"):
-                should_remove = True
-                for enabled_kexts in self.config["Kernel"]["Add"]:
-                    if enabled_kexts["BundlePath"].endswith(plugin.name):
-                        should_remove = False
-                        break
+        enabled_kexts = self.index.bundle_names()
+        for kext in self.plan.children(self.constants.kexts_path):
+            if not kext.endswith(".kext"):
+                continue
+            plugins_path = self.constants.kexts_path / Path(kext) / Path("Contents/PlugIns")
+            for plugin in self.plan.children(plugins_path):
+                if not plugin.endswith(".kext"):
+                    continue
+                should_remove = plugin not in enabled_kexts
                 if should_remove:
-                    if plugin.name not in known_unused_plugins:
-                        raise Exception(f" - Unknown plugin found: {plugin.name}")
-                    shutil.rmtree(plugin)
-
-        Path(self.constants.opencore_zip_copied).unlink()
\ No newline at end of file
+                    if plugin not in known_unused_plugins:
+                        raise Exception(f" - Unknown plugin found: {plugin}")
+                    self.plan.remove(plugins_path / Path(plugin))
\ No newline at end of file
@@ -122,6 +122,10 @@ class Constants:
         self.cli_mode = False  #            Determine if running in CLI mode
         self.should_nuke_kdks = True  #     Determine if KDKs should be nuked if unused in /L*/D*/KDKs
         self.has_checked_updates = False  # Determine if check for updates has been run
+        self.build_config_only = False  #   Only generate config.plist, skipping EFI file writes
+        self.skip_unchanged_build = True  # Reuse the existing EFI if its build inputs are unchanged
+        self.profile_build = False  #       Capture cProfile stats per build stage in Build-Report.json
+        self.build_output_archive = False  # Write the EFI straight into a zip instead of a folder
 
         ## Hardware
         self.computer: device_probe.Computer = None  # type: ignore
@@ -213,6 +217,7 @@ class Constants:
         self.set_vmm_cpuid = False  #          Set VMM bit inside CPUID
         self.oc_timeout = 5  #                 Set OpenCore timeout
         self.apfs_trim_timeout = True  #       Set APFS Trim timeout
+        self.differential_root_patching = True  # Skip reinstalling root patch files unchanged since the last patch
 
         self.legacy_accel_support = [
             os_data.os_data.big_sur,
@@ -511,6 +516,15 @@ class Constants:
     def opencore_release_folder(self):
         return self.build_path / Path(f"OpenCore-Build")
 
+    @property
+    def opencore_release_archive(self):
+        return self.build_path / Path("OpenCore-Build.zip")
+
+    @property
+    def opencore_cache_path(self):
+        # Kept alongside payloads, as parallel builds relocate 'current_path'
+        return self.payload_path.parent / Path("Build-Cache/OpenCore")
+
     @property
     def opencore_zip_copied(self):
         return self.build_path / Path(f"OpenCore-{self.opencore_build}.zip")
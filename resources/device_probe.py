@@ -3,14 +3,17 @@
 
 import binascii
 import enum
+import time
+import logging
 import itertools
 import subprocess
 import plistlib
+import concurrent.futures
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Any, ClassVar, Optional, Type, Union
 
-from resources import utilities, ioreg
+from resources import utilities, ioreg, pci_index
 from data import pci_data
 
 
@@ -25,6 +28,9 @@ class CPU:
 class PCIDevice:
     VENDOR_ID: ClassVar[int]  # Default vendor id, for subclasses.
 
+    _vendor_registry: ClassVar[dict] = {}  # Candidate vendor classes per (vendor_id, class_code), see vendor_candidates()
+    _pci_path_cache: ClassVar[Optional[dict]] = None  # Resolved path components per registry entry ID, only set during Computer.run_probes()
+
     vendor_id: int  # The vendor ID of this PCI device
     device_id: int  # The device ID of this PCI device
     class_code: int  # The class code of this PCI device - https://pci-ids.ucw.cz/read/PD
@@ -59,43 +65,76 @@ class PCIDevice:
         device.populate_pci_path(entry)
         return device
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # New vendor classes may match devices already looked up
+        PCIDevice._vendor_registry.clear()
+
     def vendor_detect(self, *, inherits: ClassVar[Any] = None, classes: list = None):
-        for i in classes or itertools.chain.from_iterable([subclass.__subclasses__() for subclass in PCIDevice.__subclasses__()]):
+        for i in classes or self.vendor_candidates():
             if issubclass(i, inherits or object) and i.detect(self):
                 return i
         return None
 
+    def vendor_candidates(self):
+        # Vendor classes able to match this device, in the order vendor_detect checks them
+        # Cached per (vendor_id, class_code), as that's all the default 'detect' checks
+        key = (self.vendor_id, self.class_code)
+        if key not in PCIDevice._vendor_registry:
+            PCIDevice._vendor_registry[key] = [
+                i for i in itertools.chain.from_iterable([subclass.__subclasses__() for subclass in PCIDevice.__subclasses__()])
+                if i.detect.__func__ is not PCIDevice.detect.__func__ or i.detect(self)
+            ]
+        return PCIDevice._vendor_registry[key]
+
     @classmethod
     def detect(cls, device):
         return device.vendor_id == cls.VENDOR_ID and ((device.class_code == cls.CLASS_CODE) if getattr(cls, "CLASS_CODE", None) else True)  # type: ignore  # pylint: disable=no-member
 
     def populate_pci_path(self, original_entry: ioreg.io_registry_entry_t):
         # Based off gfxutil logic, seems to work.
-        paths = []
+        # While probing, stops at the first entry already resolved by a sibling device (see _pci_path_cache)
+        cache = PCIDevice._pci_path_cache
+        hops = []  # (registry entry ID, path component or None for bridges), bottom-up
+        resolved = ()  # Path components above the hops, top-down, None if not a PCI path
         entry = original_entry
         while entry:
+            entry_id = ioreg.IORegistryEntryGetRegistryEntryID(entry, None)[1] if cache is not None else None
+            if cache is not None and entry_id in cache:
+                resolved = cache[entry_id]
+                break
             if ioreg.IOObjectConformsTo(entry, "IOPCIDevice".encode()):
                 # Virtual PCI devices provide a botched IOService path (us.electronic.kext.vusb)
                 # We only care about physical devices, so skip them
                 try:
                     location = [hex(int(i, 16)) for i in ioreg.io_name_t_to_str(ioreg.IORegistryEntryGetLocationInPlane(entry, "IOService".encode(), None)[1]).split(",") + ["0"]]
-                    paths.append(f"Pci({location[0]},{location[1]})")
+                    hops.append((entry_id, f"Pci({location[0]},{location[1]})"))
                 except ValueError:
+                    resolved = self._cache_pci_path(entry_id, ())
                     break
             elif ioreg.IOObjectConformsTo(entry, "IOACPIPlatformDevice".encode()):
-                paths.append(f"PciRoot({hex(int(ioreg.corefoundation_to_native(ioreg.IORegistryEntryCreateCFProperty(entry, '_UID', ioreg.kCFAllocatorDefault, ioreg.kNilOptions)) or 0))})")  # type: ignore
+                resolved = self._cache_pci_path(entry_id, (f"PciRoot({hex(int(ioreg.corefoundation_to_native(ioreg.IORegistryEntryCreateCFProperty(entry, '_UID', ioreg.kCFAllocatorDefault, ioreg.kNilOptions)) or 0))})",))  # type: ignore
                 break
             elif ioreg.IOObjectConformsTo(entry, "IOPCIBridge".encode()):
-                pass
+                hops.append((entry_id, None))
             else:
                 # There's something in between that's not PCI! Abort
-                paths = []
+                resolved = self._cache_pci_path(entry_id, None)
                 break
             parent = ioreg.IORegistryEntryGetParentEntry(entry, "IOService".encode(), None)[1]
             if entry != original_entry:
                 ioreg.IOObjectRelease(entry)
             entry = parent
-        self.pci_path = "/".join(reversed(paths))
+
+        # Resolve top-down, so later devices behind the same bridges stop early
+        for entry_id, component in reversed(hops):
+            resolved = self._cache_pci_path(entry_id, None if resolved is None else resolved + ((component,) if component else ()))
+        self.pci_path = "/".join(resolved) if resolved is not None else ""
+
+    def _cache_pci_path(self, entry_id: Optional[int], resolved: Optional[tuple]) -> Optional[tuple]:
+        if PCIDevice._pci_path_cache is not None and entry_id is not None:
+            PCIDevice._pci_path_cache[entry_id] = resolved
+        return resolved
 
 
 @dataclass
@@ -199,22 +238,17 @@ class NVIDIA(GPU):
 
     arch: Archs = field(init=False)
 
+    ARCH_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("NVIDIA", [
+        (pci_data.nvidia_ids.curie_ids, Archs.Curie),
+        (pci_data.nvidia_ids.tesla_ids, Archs.Tesla),
+        (pci_data.nvidia_ids.fermi_ids, Archs.Fermi),
+        (pci_data.nvidia_ids.kepler_ids, Archs.Kepler),
+        (pci_data.nvidia_ids.maxwell_ids, Archs.Maxwell),
+        (pci_data.nvidia_ids.pascal_ids, Archs.Pascal),
+    ])
+
     def detect_arch(self):
-        # G80/G80GL
-        if self.device_id in pci_data.nvidia_ids.curie_ids:
-            self.arch = NVIDIA.Archs.Curie
-        elif self.device_id in pci_data.nvidia_ids.tesla_ids:
-            self.arch = NVIDIA.Archs.Tesla
-        elif self.device_id in pci_data.nvidia_ids.fermi_ids:
-            self.arch = NVIDIA.Archs.Fermi
-        elif self.device_id in pci_data.nvidia_ids.kepler_ids:
-            self.arch = NVIDIA.Archs.Kepler
-        elif self.device_id in pci_data.nvidia_ids.maxwell_ids:
-            self.arch = NVIDIA.Archs.Maxwell
-        elif self.device_id in pci_data.nvidia_ids.pascal_ids:
-            self.arch = NVIDIA.Archs.Pascal
-        else:
-            self.arch = NVIDIA.Archs.Unknown
+        self.arch = self.ARCH_INDEX.lookup(self.device_id, NVIDIA.Archs.Unknown)
 
 @dataclass
 class NVIDIAEthernet(EthernetController):
@@ -248,27 +282,20 @@ class AMD(GPU):
 
     arch: Archs = field(init=False)
 
+    ARCH_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("AMD", [
+        (pci_data.amd_ids.r500_ids, Archs.R500),
+        (pci_data.amd_ids.gcn_7000_ids, Archs.Legacy_GCN_7000),
+        (pci_data.amd_ids.gcn_8000_ids, Archs.Legacy_GCN_8000),
+        (pci_data.amd_ids.gcn_9000_ids, Archs.Legacy_GCN_9000),
+        (pci_data.amd_ids.terascale_1_ids, Archs.TeraScale_1),
+        (pci_data.amd_ids.terascale_2_ids, Archs.TeraScale_2),
+        (pci_data.amd_ids.polaris_ids, Archs.Polaris),
+        (pci_data.amd_ids.vega_ids, Archs.Vega),
+        (pci_data.amd_ids.navi_ids, Archs.Navi),
+    ])
+
     def detect_arch(self):
-        if self.device_id in pci_data.amd_ids.r500_ids:
-            self.arch = AMD.Archs.R500
-        elif self.device_id in pci_data.amd_ids.gcn_7000_ids:
-            self.arch = AMD.Archs.Legacy_GCN_7000
-        elif self.device_id in pci_data.amd_ids.gcn_8000_ids:
-            self.arch = AMD.Archs.Legacy_GCN_8000
-        elif self.device_id in pci_data.amd_ids.gcn_9000_ids:
-            self.arch = AMD.Archs.Legacy_GCN_9000
-        elif self.device_id in pci_data.amd_ids.terascale_1_ids:
-            self.arch = AMD.Archs.TeraScale_1
-        elif self.device_id in pci_data.amd_ids.terascale_2_ids:
-            self.arch = AMD.Archs.TeraScale_2
-        elif self.device_id in pci_data.amd_ids.polaris_ids:
-            self.arch = AMD.Archs.Polaris
-        elif self.device_id in pci_data.amd_ids.vega_ids:
-            self.arch = AMD.Archs.Vega
-        elif self.device_id in pci_data.amd_ids.navi_ids:
-            self.arch = AMD.Archs.Navi
-        else:
-            self.arch = AMD.Archs.Unknown
+        self.arch = self.ARCH_INDEX.lookup(self.device_id, AMD.Archs.Unknown)
 
 
 @dataclass
@@ -293,33 +320,23 @@ class Intel(GPU):
 
     arch: Archs = field(init=False)
 
+    ARCH_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Intel", [
+        (pci_data.intel_ids.gma_950_ids, Archs.GMA_950),
+        (pci_data.intel_ids.gma_x3100_ids, Archs.GMA_X3100),
+        (pci_data.intel_ids.iron_ids, Archs.Iron_Lake),
+        (pci_data.intel_ids.sandy_ids, Archs.Sandy_Bridge),
+        (pci_data.intel_ids.ivy_ids, Archs.Ivy_Bridge),
+        (pci_data.intel_ids.haswell_ids, Archs.Haswell),
+        (pci_data.intel_ids.broadwell_ids, Archs.Broadwell),
+        (pci_data.intel_ids.skylake_ids, Archs.Skylake),
+        (pci_data.intel_ids.kaby_lake_ids, Archs.Kaby_Lake),
+        (pci_data.intel_ids.coffee_lake_ids, Archs.Coffee_Lake),
+        (pci_data.intel_ids.comet_lake_ids, Archs.Comet_Lake),
+        (pci_data.intel_ids.ice_lake_ids, Archs.Ice_Lake),
+    ])
+
     def detect_arch(self):
-        if self.device_id in pci_data.intel_ids.gma_950_ids:
-            self.arch = Intel.Archs.GMA_950
-        elif self.device_id in pci_data.intel_ids.gma_x3100_ids:
-            self.arch = Intel.Archs.GMA_X3100
-        elif self.device_id in pci_data.intel_ids.iron_ids:
-            self.arch = Intel.Archs.Iron_Lake
-        elif self.device_id in pci_data.intel_ids.sandy_ids:
-            self.arch = Intel.Archs.Sandy_Bridge
-        elif self.device_id in pci_data.intel_ids.ivy_ids:
-            self.arch = Intel.Archs.Ivy_Bridge
-        elif self.device_id in pci_data.intel_ids.haswell_ids:
-            self.arch = Intel.Archs.Haswell
-        elif self.device_id in pci_data.intel_ids.broadwell_ids:
-            self.arch = Intel.Archs.Broadwell
-        elif self.device_id in pci_data.intel_ids.skylake_ids:
-            self.arch = Intel.Archs.Skylake
-        elif self.device_id in pci_data.intel_ids.kaby_lake_ids:
-            self.arch = Intel.Archs.Kaby_Lake
-        elif self.device_id in pci_data.intel_ids.coffee_lake_ids:
-            self.arch = Intel.Archs.Coffee_Lake
-        elif self.device_id in pci_data.intel_ids.comet_lake_ids:
-            self.arch = Intel.Archs.Comet_Lake
-        elif self.device_id in pci_data.intel_ids.ice_lake_ids:
-            self.arch = Intel.Archs.Ice_Lake
-        else:
-            self.arch = Intel.Archs.Unknown
+        self.arch = self.ARCH_INDEX.lookup(self.device_id, Intel.Archs.Unknown)
 
 @dataclass
 class IntelEthernet(EthernetController):
@@ -333,15 +350,14 @@ class IntelEthernet(EthernetController):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Intel Ethernet", [
+        (pci_data.intel_ids.AppleIntel8254XEthernet, Chipsets.AppleIntel8254XEthernet),
+        (pci_data.intel_ids.AppleIntelI210Ethernet, Chipsets.AppleIntelI210Ethernet),
+        (pci_data.intel_ids.Intel82574L, Chipsets.Intel82574L),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.intel_ids.AppleIntel8254XEthernet:
-            self.chipset = IntelEthernet.Chipsets.AppleIntel8254XEthernet
-        elif self.device_id in pci_data.intel_ids.AppleIntelI210Ethernet:
-            self.chipset = IntelEthernet.Chipsets.AppleIntelI210Ethernet
-        elif self.device_id in pci_data.intel_ids.Intel82574L:
-            self.chipset = IntelEthernet.Chipsets.Intel82574L
-        else:
-            self.chipset = IntelEthernet.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, IntelEthernet.Chipsets.Unknown)
 
 @dataclass
 class Broadcom(WirelessCard):
@@ -358,19 +374,16 @@ class Broadcom(WirelessCard):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Broadcom", [
+        (pci_data.broadcom_ids.AppleBCMWLANBusInterfacePCIe, Chipsets.AppleBCMWLANBusInterfacePCIe),
+        (pci_data.broadcom_ids.AirPortBrcmNIC, Chipsets.AirportBrcmNIC),
+        (pci_data.broadcom_ids.AirPortBrcm4360, Chipsets.AirPortBrcm4360),
+        (pci_data.broadcom_ids.AirPortBrcm4331, Chipsets.AirPortBrcm4331),
+        (pci_data.broadcom_ids.AppleAirPortBrcm43224, Chipsets.AirPortBrcm43224),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.broadcom_ids.AppleBCMWLANBusInterfacePCIe:
-            self.chipset = Broadcom.Chipsets.AppleBCMWLANBusInterfacePCIe
-        elif self.device_id in pci_data.broadcom_ids.AirPortBrcmNIC:
-            self.chipset = Broadcom.Chipsets.AirportBrcmNIC
-        elif self.device_id in pci_data.broadcom_ids.AirPortBrcm4360:
-            self.chipset = Broadcom.Chipsets.AirPortBrcm4360
-        elif self.device_id in pci_data.broadcom_ids.AirPortBrcm4331:
-            self.chipset = Broadcom.Chipsets.AirPortBrcm4331
-        elif self.device_id in pci_data.broadcom_ids.AppleAirPortBrcm43224:
-            self.chipset = Broadcom.Chipsets.AirPortBrcm43224
-        else:
-            self.chipset = Broadcom.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, Broadcom.Chipsets.Unknown)
 
 @dataclass
 class BroadcomEthernet(EthernetController):
@@ -382,11 +395,12 @@ class BroadcomEthernet(EthernetController):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Broadcom Ethernet", [
+        (pci_data.broadcom_ids.AppleBCM5701Ethernet, Chipsets.AppleBCM5701Ethernet),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.broadcom_ids.AppleBCM5701Ethernet:
-            self.chipset = BroadcomEthernet.Chipsets.AppleBCM5701Ethernet
-        else:
-            self.chipset = BroadcomEthernet.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, BroadcomEthernet.Chipsets.Unknown)
 
 @dataclass
 class Atheros(WirelessCard):
@@ -400,11 +414,12 @@ class Atheros(WirelessCard):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Atheros", [
+        (pci_data.atheros_ids.AtherosWifi, Chipsets.AirPortAtheros40),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.atheros_ids.AtherosWifi:
-            self.chipset = Atheros.Chipsets.AirPortAtheros40
-        else:
-            self.chipset = Atheros.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, Atheros.Chipsets.Unknown)
 
 
 @dataclass
@@ -418,11 +433,12 @@ class Aquantia(EthernetController):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Aquantia", [
+        (pci_data.aquantia_ids.AppleEthernetAquantiaAqtion, Chipsets.AppleEthernetAquantiaAqtion),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.aquantia_ids.AppleEthernetAquantiaAqtion:
-            self.chipset = Aquantia.Chipsets.AppleEthernetAquantiaAqtion
-        else:
-            self.chipset = Aquantia.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, Aquantia.Chipsets.Unknown)
 
 @dataclass
 class Marvell(EthernetController):
@@ -434,11 +450,12 @@ class Marvell(EthernetController):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("Marvell", [
+        (pci_data.marvell_ids.MarvelYukonEthernet, Chipsets.MarvelYukonEthernet),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.marvell_ids.MarvelYukonEthernet:
-            self.chipset = Marvell.Chipsets.MarvelYukonEthernet
-        else:
-            self.chipset = Marvell.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, Marvell.Chipsets.Unknown)
 
 @dataclass
 class SysKonnect(EthernetController):
@@ -450,11 +467,12 @@ class SysKonnect(EthernetController):
 
     chipset: Chipsets = field(init=False)
 
+    CHIPSET_INDEX: ClassVar[pci_index.PCIIndex] = pci_index.PCIIndex("SysKonnect", [
+        (pci_data.syskonnect_ids.MarvelYukonEthernet, Chipsets.MarvelYukonEthernet),
+    ])
+
     def detect_chipset(self):
-        if self.device_id in pci_data.syskonnect_ids.MarvelYukonEthernet:
-            self.chipset = SysKonnect.Chipsets.MarvelYukonEthernet
-        else:
-            self.chipset = SysKonnect.Chipsets.Unknown
+        self.chipset = self.CHIPSET_INDEX.lookup(self.device_id, SysKonnect.Chipsets.Unknown)
 
 
 @dataclass
@@ -487,26 +505,95 @@ class Computer:
     firmware_vendor: Optional[str] = None
     rosetta_active: Optional[bool] = False
 
+    # Probe methods and the probes they depend on, see run_probes()
+    PROBES: ClassVar[dict] = {
+        "gpu_probe":                  [],
+        "dgpu_probe":                 ["gpu_probe"],
+        "igpu_probe":                 ["gpu_probe"],
+        "wifi_probe":                 [],
+        "storage_probe":              [],
+        "usb_controller_probe":       [],
+        "sdxc_controller_probe":      [],
+        "ethernet_probe":             [],
+        "smbios_probe":               [],
+        "cpu_probe":                  [],
+        "bluetooth_probe":            [],
+        "ambient_light_sensor_probe": [],
+        "sata_disk_probe":            [],
+        "oclp_sys_patch_probe":       [],
+        "check_rosetta":              [],
+    }
+
     @staticmethod
     def probe():
         computer = Computer()
-        computer.gpu_probe()
-        computer.dgpu_probe()
-        computer.igpu_probe()
-        computer.wifi_probe()
-        computer.storage_probe()
-        computer.usb_controller_probe()
-        computer.sdxc_controller_probe()
-        computer.ethernet_probe()
-        computer.smbios_probe()
-        computer.cpu_probe()
-        computer.bluetooth_probe()
-        computer.ambient_light_sensor_probe()
-        computer.sata_disk_probe()
-        computer.oclp_sys_patch_probe()
-        computer.check_rosetta()
+        computer.run_probes()
         return computer
 
+    def run_probes(self, probes: list = None, max_workers: int = 8) -> dict:
+        """
+        Run probes on a thread pool, each once the probes it depends on finished
+
+        Each probe only sets its own attributes, thus independent probes are free to overlap
+        Works against any ioreg backend, ie. ioreg.registry_backend(ioreg_dump.IORegistryDump(...))
+
+        Parameters:
+            probes (list):     Probes to run, plus their dependencies (default: all of PROBES)
+            max_workers (int): Number of probes run at once
+
+        Returns:
+            dict: Duration of each probe, in seconds
+        """
+
+        pending = []
+        queue = list(probes or self.PROBES)
+        while queue:
+            name = queue.pop(0)
+            if name not in pending:
+                pending.append(name)
+                queue.extend(self.PROBES[name])
+
+        timings = {}
+        finished = set()
+        running = {}
+        error = None
+        # Devices share bridges across probes, thus share resolved PCI paths for this run only
+        PCIDevice._pci_path_cache = {}
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while pending or running:
+                    if error is None:
+                        for name in [name for name in pending if all(dependency in finished for dependency in self.PROBES[name])]:
+                            pending.remove(name)
+                            running[executor.submit(self._timed_probe, name)] = name
+                    if not running:
+                        if error is None:
+                            raise ValueError(f"Circular probe dependencies: {', '.join(pending)}")
+                        break
+
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            timings[name] = future.result()
+                        except Exception as e:
+                            # Let running probes finish, but don't start new ones
+                            error = error or e
+                        finished.add(name)
+        finally:
+            PCIDevice._pci_path_cache = None
+
+        if error is not None:
+            raise error
+
+        logging.info("- Hardware probe timings: " + ", ".join(f"{name} ({timings[name]:.3f}s)" for name in self.PROBES if name in timings))
+        return timings
+
+    def _timed_probe(self, name: str) -> float:
+        start = time.perf_counter()
+        getattr(self, name)()
+        return time.perf_counter() - start
+
     def gpu_probe(self):
         # Chain together two iterators: one for class code 00000300, the other for class code 00800300
         devices = ioreg.ioiterator_to_list(
@@ -0,0 +1,273 @@
+# Classification of recorded hardware probes across a fleet of machines
+
+import os
+import copy
+import json
+import time
+import logging
+import plistlib
+import tempfile
+import traceback
+import concurrent.futures
+
+from pathlib import Path
+from typing import Optional
+
+from resources import constants, device_probe, ioreg, ioreg_dump, probe_record, utilities
+from resources.build import build
+from resources.sys_patch import sys_patch_detect
+from data import os_data
+
+
+# Probes served entirely by the IORegistry, thus runnable against ioreg dumps
+REGISTRY_PROBES = [
+    "gpu_probe",
+    "dgpu_probe",
+    "igpu_probe",
+    "wifi_probe",
+    "storage_probe",
+    "usb_controller_probe",
+    "sdxc_controller_probe",
+    "ethernet_probe",
+    "ambient_light_sensor_probe",
+]
+
+# Build folder of the current worker process, see _initialize_worker()
+_worker_path: Optional[Path] = None
+
+
+def load_computer(path: Path) -> tuple:
+    """
+    Load a recorded machine, supported formats:
+        - config.plist built on the machine (#Revision -> Hardware-Probe)
+        - probe_record plist, or a probe snapshot (see probe_snapshot.py)
+        - 'ioreg -a -l' dump, only covering REGISTRY_PROBES and the reported model
+
+    Returns:
+        tuple: (device_probe.Computer, source type)
+    """
+
+    with Path(path).open("rb") as file:
+        data = plistlib.load(file)
+
+    if isinstance(data, dict) and "#Revision" in data:
+        record = probe_record.decode(data["#Revision"].get("Hardware-Probe"))
+        if record is None:
+            raise ValueError("No Hardware-Probe record (built for an external machine, or by an older patcher)")
+        return probe_record.to_computer(record), "Config"
+    if isinstance(data, dict) and "Session" in data and "Computer" in data:
+        record = probe_record.decode(data["Computer"])
+        if record is None:
+            raise ValueError("Unsupported probe snapshot version")
+        return probe_record.to_computer(record), "Snapshot"
+    if isinstance(data, dict) and "Devices" in data:
+        record = probe_record.decode(data)
+        if record is None:
+            raise ValueError("Unsupported probe record version")
+        return probe_record.to_computer(record), "Record"
+    if isinstance(data, list) or (isinstance(data, dict) and "IOObjectClass" in data):
+        return _probe_registry(ioreg_dump.IORegistryDump(data)), "IORegistry"
+
+    raise ValueError("Unknown hardware record format")
+
+
+def _probe_registry(dump: ioreg_dump.IORegistryDump) -> device_probe.Computer:
+    computer = device_probe.Computer()
+    with ioreg.registry_backend(dump):
+        computer.run_probes(REGISTRY_PROBES)
+
+        entry = next(ioreg.ioiterator_to_list(ioreg.IOServiceGetMatchingServices(ioreg.kIOMasterPortDefault, ioreg.IOServiceMatching("IOPlatformExpertDevice".encode()), None)[1]), None)
+        if entry:
+            for key, attribute in [("model", "reported_model"), ("board-id", "reported_board_id")]:
+                value = ioreg.corefoundation_to_native(ioreg.IORegistryEntryCreateCFProperty(entry, key, ioreg.kCFAllocatorDefault, ioreg.kNilOptions))
+                if isinstance(value, bytes):
+                    setattr(computer, attribute, value.strip(b"\0").decode())
+
+        # Only present if the dump includes the 'options' entry
+        computer.real_model = utilities.get_nvram("oem-product", "4D1FDA02-38C7-4A6A-9CC6-4BCCA8B30102", decode=True) or computer.reported_model
+        computer.real_board_id = utilities.get_nvram("oem-board", "4D1FDA02-38C7-4A6A-9CC6-4BCCA8B30102", decode=True) or computer.reported_board_id
+    return computer
+
+
+def _initialize_worker(work_root: Path):
+    """
+    Worker setup, invoked once per process in the pool
+
+    Workers get their own build folder and drop the parent's log handlers
+    """
+
+    global _worker_path
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.WARNING)
+    utilities.disable_cls()
+
+    _worker_path = Path(work_root) / Path(str(os.getpid()))
+    _worker_path.mkdir(parents=True, exist_ok=True)
+
+
+def _classify_worker(path: Path, targets: list, global_constants: constants.Constants, features: bool) -> dict:
+    """
+    Classify a single recorded machine
+
+    Runs inside the process pool, thus all arguments must be picklable
+    """
+
+    result = {"Path": str(path)}
+    try:
+        computer, source = load_computer(path)
+        model = computer.real_model or computer.reported_model
+        if not model:
+            raise ValueError("No model recorded")
+        if computer.cpu is None:
+            # Not recorded (ie. ioreg dumps), assume no AVX2.0 support
+            computer.cpu = device_probe.CPU("", [], [])
+
+        machine_constants = copy.copy(global_constants)
+        machine_constants.computer = computer
+        machine_constants.custom_model = ""
+        machine_constants.host_is_hackintosh = computer.firmware_vendor not in [None, "Apple"]
+
+        result.update({
+            "Source":     source,
+            "Model":      model,
+            "Board ID":   computer.real_board_id or computer.reported_board_id,
+            "GPUs":       [f"{type(gpu).__name__} {gpu.arch.name}" for gpu in computer.gpus],
+            "Wireless":   f"{type(computer.wifi).__name__} {computer.wifi.chipset.name}" if computer.wifi else None,
+            "Root Patches": {},
+        })
+
+        for target in targets:
+            # Latest release of each OS
+            machine_constants.detected_os = target
+            machine_constants.detected_os_minor = 99
+            machine_constants.detected_os_build = ""
+            patches = sys_patch_detect.DetectRootPatch(model, machine_constants).detect_hardware_patch_set()
+            result["Root Patches"][os_data.os_data(target).name] = [patch for patch, required in patches.items() if required is True and not patch.startswith("Settings:")]
+
+        if features is True:
+            result["OpenCore Features"] = _opencore_features(model, machine_constants)
+    except Exception as e:
+        result["Error"] = f"{type(e).__name__}: {e}"
+        result["Traceback"] = traceback.format_exc()
+
+    return result
+
+
+def _opencore_features(model: str, global_constants: constants.Constants) -> dict:
+    """
+    Generate the machine's config.plist in memory, without writing the EFI
+    """
+
+    global_constants.current_path = _worker_path or Path(tempfile.mkdtemp())
+    global_constants.gui_mode = True
+    global_constants.detected_os = 0
+
+    config = build.build_opencore(model, global_constants).generate_config()
+    return {
+        "Kexts":          sorted(Path(kext["BundlePath"]).name for kext in config["Kernel"]["Add"] if "/" not in kext["BundlePath"]),
+        "ACPI":           sorted(table["Path"] for table in config["ACPI"]["Add"]),
+        "Drivers":        sorted(driver["Path"] for driver in config["UEFI"]["Drivers"]),
+        "Booter Patches": sorted(patch["Comment"] for patch in config["Booter"]["Patch"]),
+        "Kernel Patches": sorted(patch["Comment"] for patch in config["Kernel"]["Patch"]),
+        "SecureBootModel": config["Misc"]["Security"]["SecureBootModel"],
+    }
+
+
+class FleetReport:
+    """
+    Classifies recorded hardware probes of many machines in a process pool
+
+    Each machine is classified into its model, GPU architectures, wireless chipset,
+    root patches required per target OS and, optionally, the OpenCore
+    features its EFI would be built with (patcher default settings).
+    Runs headless on any host, as nothing is probed or written besides the report.
+
+    Usage:
+    >>> from resources.fleet_report import FleetReport
+    >>> report = FleetReport(self.constants, [os_data.os_data.ventura]).classify(Path("fleet"))
+    >>> FleetReport.write_report(report, Path("Fleet-Report.json"))
+    """
+
+    def __init__(self, global_constants: constants.Constants, targets: list, max_workers: int = None, features: bool = True):
+        """
+        Parameters:
+            targets (list):    OS kernel majors to detect root patches for (ie. os_data.os_data.ventura)
+            max_workers (int): Number of worker processes
+            features (bool):   Whether to generate each machine's config.plist for OpenCore features
+        """
+
+        self.constants: constants.Constants = global_constants
+        self.targets: list = [int(target) for target in targets]
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.features: bool = features
+
+
+    def classify(self, folder: Path) -> dict:
+        """
+        Classify every plist within folder (recursively)
+        """
+
+        start = time.perf_counter()
+        paths = sorted(path for path in Path(folder).rglob("*") if path.is_file() and path.suffix in [".plist", ".xml"])
+        if not paths:
+            raise FileNotFoundError(f"No hardware records found in {folder}")
+
+        worker_constants = copy.copy(self.constants)
+        # Threads are not picklable, and workers have no use for the payload unpacker
+        worker_constants.unpack_thread = None
+
+        logging.info(f"- Classifying {len(paths)} machines with {min(self.max_workers, len(paths))} workers")
+        with tempfile.TemporaryDirectory() as work_root:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(self.max_workers, len(paths)), initializer=_initialize_worker, initargs=(work_root,)) as executor:
+                results = list(executor.map(
+                    _classify_worker,
+                    paths,
+                    [self.targets] * len(paths),
+                    [worker_constants] * len(paths),
+                    [self.features] * len(paths),
+                    chunksize=max(1, len(paths) // (self.max_workers * 8)),
+                ))
+
+        report = self.aggregate(results)
+        report["Duration"] = round(time.perf_counter() - start, 6)
+        logging.info(f"- Classified {report['Machines']} machines in {report['Duration']:.2f}s, {report['Failed']} failed")
+        return report
+
+
+    def aggregate(self, results: list) -> dict:
+        classified = [result for result in results if "Error" not in result]
+        report = {
+            "Machines":          len(results),
+            "Failed":            len(results) - len(classified),
+            "Targets":           [os_data.os_data(target).name for target in self.targets],
+            "Models":            self._count(result["Model"] for result in classified),
+            "GPU Architectures": self._count(gpu for result in classified for gpu in set(result["GPUs"])),
+            "Wireless Chipsets": self._count(result["Wireless"] or "None" for result in classified),
+            "Root Patches": {
+                target: self._count(patch for result in classified for patch in result["Root Patches"][target])
+                for target in (os_data.os_data(target).name for target in self.targets)
+            },
+        }
+        if self.features is True:
+            report["OpenCore Features"] = {
+                category: self._count(item for result in classified for item in result["OpenCore Features"][category])
+                for category in ["Kexts", "ACPI", "Drivers", "Booter Patches", "Kernel Patches"]
+            }
+        report["Results"] = results
+        return report
+
+
+    @staticmethod
+    def write_report(report: dict, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(report, indent=4, default=str))
+
+
+    def _count(self, items) -> dict:
+        counts = {}
+        for item in items:
+            counts[item] = counts.get(item, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], str(item[0]))))
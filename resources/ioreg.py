@@ -1,14 +1,23 @@
 # PyObjc Handling for IOKit
 # Copyright (C) 2020-2022, Dhinak G
 
+import contextlib
 from typing import NewType, Union
-import objc
 
-from CoreFoundation import CFRelease, kCFAllocatorDefault  # type: ignore # pylint: disable=no-name-in-module
-from Foundation import NSBundle  # type: ignore # pylint: disable=no-name-in-module
-from PyObjCTools import Conversion
+try:
+    import objc
 
-IOKit_bundle = NSBundle.bundleWithIdentifier_("com.apple.framework.IOKit")
+    from CoreFoundation import CFRelease, kCFAllocatorDefault  # type: ignore # pylint: disable=no-name-in-module
+    from Foundation import NSBundle  # type: ignore # pylint: disable=no-name-in-module
+    from PyObjCTools import Conversion
+
+    IOKit_bundle = NSBundle.bundleWithIdentifier_("com.apple.framework.IOKit")
+except ImportError:
+    # Non-macOS host, only an offline backend (ie. ioreg_dump) can be used
+    objc = None
+    CFRelease = None
+    kCFAllocatorDefault = None
+    IOKit_bundle = None
 
 # pylint: disable=invalid-name
 io_name_t_ref_out = b"[128c]"  # io_name_t is char[128]
@@ -200,8 +209,14 @@ def IORegistryEntryFromPath(mainPort: mach_port_t, path: io_string_t) -> io_regi
     raise NotImplementedError
 
 
-objc.loadBundleFunctions(IOKit_bundle, globals(), functions)  # type: ignore # pylint: disable=no-member
-objc.loadBundleVariables(IOKit_bundle, globals(), variables)  # type: ignore # pylint: disable=no-member
+# Unbound stubs, used for anything a backend doesn't implement
+_unbound = {name: globals()[name] for name, _ in functions}
+
+if objc is not None:
+    objc.loadBundleFunctions(IOKit_bundle, globals(), functions)  # type: ignore # pylint: disable=no-member
+    objc.loadBundleVariables(IOKit_bundle, globals(), variables)  # type: ignore # pylint: disable=no-member
+else:
+    kIOMasterPortDefault = NULL
 
 
 def ioiterator_to_list(iterator: io_iterator_t):
@@ -240,3 +255,48 @@ def get_class_inheritance(io_object):
         CFRelease(cls)
         cls = IOObjectCopySuperclassForClass(cls)
     return classes
+
+
+# Module level names a registry backend may provide, besides the IOKit functions
+backend_helpers = ["kIOMasterPortDefault", "corefoundation_to_native", "native_to_corefoundation", "get_class_inheritance"]
+
+
+def use_backend(backend):
+    """
+    Route all IOKit calls of this module to backend (ie. ioreg_dump.IORegistryDump)
+
+    Functions the backend lacks raise NotImplementedError
+    Returns the previous bindings, to be passed to restore_backend()
+    """
+
+    names = [name for name, _ in functions] + backend_helpers
+    previous = {name: globals()[name] for name in names}
+    for name in names:
+        if hasattr(backend, name):
+            globals()[name] = getattr(backend, name)
+        elif name in _unbound:
+            globals()[name] = _unbound[name]
+    return previous
+
+
+def restore_backend(previous: dict):
+    globals().update(previous)
+
+
+@contextlib.contextmanager
+def registry_backend(backend):
+    """
+    Use backend for all IOKit calls within the context
+
+    Usage:
+    >>> from resources import ioreg, ioreg_dump, device_probe
+    >>> with ioreg.registry_backend(ioreg_dump.IORegistryDump.from_file("ioreg.plist")):
+    ...     computer = device_probe.Computer()
+    ...     computer.gpu_probe()
+    """
+
+    previous = use_backend(backend)
+    try:
+        yield backend
+    finally:
+        restore_backend(previous)
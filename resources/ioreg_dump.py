@@ -0,0 +1,446 @@
+# Offline IORegistry backend, serving IOKit calls from an 'ioreg -a -l' plist dump
+
+import plistlib
+import itertools
+
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from resources import ioreg
+
+
+# IOReturn.h
+kIOReturnSuccess  = 0           # pylint: disable=invalid-name
+kIOReturnNoDevice = 0xE00002C0  # pylint: disable=invalid-name
+kIOReturnNotFound = 0xE00002F0  # pylint: disable=invalid-name
+
+# Keys 'ioreg -a' adds to each entry, not part of the entry's properties
+ENTRY_KEYS = [
+    "IOObjectClass",
+    "IOObjectRetainCount",
+    "IORegistryEntryID",
+    "IORegistryEntryName",
+    "IORegistryEntryLocation",
+    "IORegistryEntryChildren",
+    "IOServiceBusyState",
+    "IOServiceBusyTime",
+    "IOServiceState",
+]
+
+# Superclass of each class the probes match against, as 'ioreg -a' only reports the final class
+# Extend through IORegistryDump(superclasses=...) for dumps using other drivers
+SUPERCLASSES = {
+    "IORegistryEntry":              None,
+    "IOService":                    "IORegistryEntry",
+    "IOPlatformExpertDevice":       "IOService",
+    "IOPlatformDevice":             "IOService",
+    "IOACPIPlatformDevice":         "IOPlatformDevice",
+    "IOPCIDevice":                  "IOService",
+    "IOPCIBridge":                  "IOService",
+    "IOPCI2PCIBridge":              "IOPCIBridge",
+    "AppleACPIPCI":                 "IOPCIBridge",
+    "IOPCIHostBridge":              "IOPCIBridge",
+    "IODTNVRAM":                    "IOService",
+    "IONVMeController":             "IOService",
+    "AppleNVMeController":          "IONVMeController",
+    "IONetworkInterface":           "IOService",
+    "IOEthernetInterface":          "IONetworkInterface",
+    "IO80211Interface":             "IOEthernetInterface",
+    "IO80211VirtualInterface":      "IO80211Interface",
+    "AirPort_BrcmNIC_Interface":    "IO80211Interface",
+    "AirPort_Brcm4360_Interface":   "IO80211Interface",
+    "AirPort_Brcm4331_Interface":   "IO80211Interface",
+    "AirPort_Athr5424ab_Interface": "IO80211Interface",
+}
+
+
+class IORegistryEntry:
+    """
+    Single node of the dumped registry, used as the io_object_t of the backend
+    """
+
+    __slots__ = ["name", "cls", "entry_id", "location", "properties", "parent", "children", "order"]
+
+    def __init__(self, name: str, cls: str, entry_id: int, location: Optional[str], properties: dict, parent: Optional["IORegistryEntry"], order: int):
+        self.name:       str                         = name
+        self.cls:        str                         = cls
+        self.entry_id:   int                         = entry_id
+        self.location:   Optional[str]               = location
+        self.properties: dict                        = properties
+        self.parent:     Optional[IORegistryEntry]   = parent
+        self.children:   list[IORegistryEntry]       = []
+        self.order:      int                         = order  # Position in a depth-first walk, matches are returned in this order
+
+
+    def __repr__(self):
+        return f"<IORegistryEntry {self.name} ({self.cls}, {self.entry_id:#x})>"
+
+
+    def ancestors(self):
+        parent = self.parent
+        while parent is not None:
+            yield parent
+            parent = parent.parent
+
+
+    def descendants(self):
+        pending = list(reversed(self.children))
+        while pending:
+            entry = pending.pop()
+            yield entry
+            pending.extend(reversed(entry.children))
+
+
+class IORegistryDump:
+    """
+    In-memory IORegistry plane, implementing the IOKit calls of resources/ioreg.py
+
+    Entries are indexed by class, name, registry entry ID and (lazily, per key)
+    property value, thus matching services doesn't walk the whole tree.
+    Handles returned are IORegistryEntry objects and Python iterators,
+    releasing them is a no-op.
+
+    Usage:
+    >>> from resources import ioreg, device_probe
+    >>> from resources.ioreg_dump import IORegistryDump
+    >>> dump = IORegistryDump.from_file("MacBookPro11,1.plist")  # ioreg -a -l > MacBookPro11,1.plist
+    >>> with ioreg.registry_backend(dump):
+    ...     computer = device_probe.Computer()
+    ...     computer.gpu_probe()
+    """
+
+    kIOMasterPortDefault = ioreg.NULL  # pylint: disable=invalid-name
+
+    def __init__(self, root: Union[dict, list], plane: str = "IOService", superclasses: dict = None):
+        """
+        Parameters:
+            root (dict, list):   Root entry of 'ioreg -a', or list of entries (ie. 'ioreg -a -r')
+            plane (str):         Registry plane the dump was taken from
+            superclasses (dict): Additional class -> superclass mappings
+        """
+
+        self.plane: str = plane
+        self.superclasses: dict = {**SUPERCLASSES, **(superclasses or {})}
+
+        self.by_class: dict[str, list] = {}
+        self.by_name:  dict[str, list] = {}
+        self.by_id:    dict[int, IORegistryEntry] = {}
+
+        self._by_property: dict[str, dict] = {}
+        self._conforming: dict[str, list] = {}
+        self._next_id = itertools.count(0x100000000)
+
+        if isinstance(root, list):
+            root = {"IORegistryEntryName": "Root", "IOObjectClass": "IORegistryEntry", "IORegistryEntryChildren": root}
+        self.entries: list[IORegistryEntry] = []
+        self.root: IORegistryEntry = self._load(root)
+
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], **kwargs):
+        with Path(path).open("rb") as file:
+            return cls(plistlib.load(file), **kwargs)
+
+
+    def _load(self, root: dict) -> IORegistryEntry:
+        # Iterative, as device trees can nest deeper than the recursion limit
+        root_entry = None
+        pending = [(root, None)]
+        while pending:
+            node, parent = pending.pop()
+            entry = IORegistryEntry(
+                name=node.get("IORegistryEntryName", ""),
+                cls=node.get("IOObjectClass", "IORegistryEntry"),
+                entry_id=node.get("IORegistryEntryID") or next(self._next_id),
+                location=node.get("IORegistryEntryLocation"),
+                properties={key: value for key, value in node.items() if key not in ENTRY_KEYS},
+                parent=parent,
+                order=len(self.entries),
+            )
+            self.entries.append(entry)
+            self.by_class.setdefault(entry.cls, []).append(entry)
+            self.by_id[entry.entry_id] = entry
+            for name in self._names(entry):
+                self.by_name.setdefault(name, []).append(entry)
+
+            if parent is None:
+                root_entry = entry
+            else:
+                parent.children.append(entry)
+            pending.extend((child, entry) for child in reversed(node.get("IORegistryEntryChildren", [])))
+        return root_entry
+
+
+    def _names(self, entry: IORegistryEntry) -> set:
+        # Names IONameMatch compares against: entry name, IOName, and the device tree 'name' and 'compatible' properties
+        names = {entry.name}
+        for key in ["IOName", "name", "compatible"]:
+            value = entry.properties.get(key)
+            if isinstance(value, bytes):
+                names.update(name.decode(errors="ignore") for name in value.split(b"\0") if name)
+            elif isinstance(value, str):
+                names.add(value)
+        return names
+
+
+    def conforms_to(self, entry: IORegistryEntry, cls: str) -> bool:
+        current = entry.cls
+        while current:
+            if current == cls:
+                return True
+            current = self.superclasses.get(current)
+        return False
+
+
+    def conforming_entries(self, cls: str) -> list:
+        """
+        Entries of cls or any of its known subclasses, in registry order
+        """
+
+        if cls not in self._conforming:
+            entries = []
+            for entry_class, class_entries in self.by_class.items():
+                if self.conforms_to(class_entries[0], cls):
+                    entries.extend(class_entries)
+            self._conforming[cls] = sorted(entries, key=lambda entry: entry.order)
+        return self._conforming[cls]
+
+
+    def property_entries(self, key: str, value: Any) -> list:
+        """
+        Entries whose property key equals value, in registry order
+        """
+
+        if key not in self._by_property:
+            table = {}
+            for entry in self.entries:
+                if key not in entry.properties:
+                    continue
+                try:
+                    table.setdefault(self._hashable(entry.properties[key]), []).append(entry)
+                except TypeError:
+                    continue
+            self._by_property[key] = table
+        try:
+            return self._by_property[key].get(self._hashable(value), [])
+        except TypeError:
+            return [entry for entry in self.entries if entry.properties.get(key) == value]
+
+
+    def _hashable(self, value: Any):
+        # Raises TypeError for dictionaries and other unhashable values
+        if isinstance(value, list):
+            return tuple(self._hashable(item) for item in value)
+        hash(value)
+        return value
+
+
+    def matches(self, entry: IORegistryEntry, matching: dict) -> bool:
+        """
+        Whether entry satisfies an IOKit matching dictionary
+
+        Supports IOProviderClass, IONameMatch, IORegistryEntryID, IOPropertyMatch
+        and IOParentMatch (matched against any ancestor), other keys are ignored
+        like drivers without a matchPropertyTable override do
+        """
+
+        if "IOProviderClass" in matching and not self.conforms_to(entry, matching["IOProviderClass"]):
+            return False
+        if "IORegistryEntryID" in matching and entry.entry_id != matching["IORegistryEntryID"]:
+            return False
+        if "IONameMatch" in matching:
+            names = matching["IONameMatch"]
+            names = names if isinstance(names, list) else [names]
+            if self._names(entry).isdisjoint(names):
+                return False
+        if "IOPropertyMatch" in matching:
+            tables = matching["IOPropertyMatch"]
+            tables = tables if isinstance(tables, list) else [tables]
+            if not any(all(key in entry.properties and entry.properties[key] == value for key, value in table.items()) for table in tables):
+                return False
+        if "IOParentMatch" in matching:
+            if not any(self.matches(parent, matching["IOParentMatch"]) for parent in entry.ancestors()):
+                return False
+        return True
+
+
+    def matching_entries(self, matching: dict) -> list:
+        """
+        All entries satisfying matching, narrowed down through the indexes first
+        """
+
+        candidates = None
+        if "IORegistryEntryID" in matching:
+            entry = self.by_id.get(matching["IORegistryEntryID"])
+            candidates = [entry] if entry else []
+        elif "IONameMatch" in matching:
+            names = matching["IONameMatch"]
+            names = names if isinstance(names, list) else [names]
+            candidates = sorted({entry for name in names for entry in self.by_name.get(name, [])}, key=lambda entry: entry.order)
+        elif "IOPropertyMatch" in matching:
+            tables = matching["IOPropertyMatch"]
+            tables = tables if isinstance(tables, list) else [tables]
+            if all(tables):
+                # Entries must match one of the tables, thus its first key narrows it down
+                candidates = sorted({entry for table in tables for entry in self.property_entries(*next(iter(table.items())))}, key=lambda entry: entry.order)
+
+        if candidates is None:
+            candidates = self.conforming_entries(matching["IOProviderClass"]) if "IOProviderClass" in matching else self.entries
+
+        return [entry for entry in candidates if self.matches(entry, matching)]
+
+
+    def resolve_path(self, path: str) -> Optional[IORegistryEntry]:
+        """
+        Resolve 'Plane:/name@location/...' paths, device tree paths are
+        resolved from the platform expert device when dumped from IOService
+        """
+
+        plane, _, path = path.partition(":")
+        if plane == self.plane:
+            entry = self.root
+        elif plane == "IODeviceTree" and self.conforming_entries("IOPlatformExpertDevice"):
+            entry = self.conforming_entries("IOPlatformExpertDevice")[0]
+        else:
+            return None
+
+        for component in (component for component in path.split("/") if component):
+            name, _, location = component.partition("@")
+            entry = next((child for child in entry.children if child.name == name and (not location or child.location == location)), None)
+            if entry is None:
+                return None
+        return entry
+
+
+    def entry_path(self, entry: IORegistryEntry) -> str:
+        components = [f"{item.name}@{item.location}" if item.location else item.name for item in reversed([entry, *entry.ancestors()])]
+        return f"{self.plane}:/" + "/".join(components[1:])
+
+
+    def _check_plane(self, plane: bytes) -> bool:
+        return plane is None or ioreg.io_name_t_to_str(plane) == self.plane
+
+
+    # IOKit functions, see resources/ioreg.py for signatures
+    # pylint: disable=invalid-name
+
+    def IORegistryEntryCreateCFProperties(self, entry: IORegistryEntry, properties, allocator, options) -> tuple:
+        return kIOReturnSuccess, dict(entry.properties)
+
+
+    def IORegistryEntryCreateCFProperty(self, entry: IORegistryEntry, key: str, allocator, options) -> Any:
+        return entry.properties.get(key) if entry else None
+
+
+    def IOServiceMatching(self, name: bytes) -> dict:
+        return {"IOProviderClass": ioreg.io_name_t_to_str(name)}
+
+
+    def IOServiceNameMatching(self, name: bytes) -> dict:
+        return {"IONameMatch": ioreg.io_name_t_to_str(name)}
+
+
+    def IORegistryEntryIDMatching(self, entryID: int) -> dict:
+        return {"IORegistryEntryID": entryID}
+
+
+    def IOServiceGetMatchingServices(self, masterPort, matching: dict, existing) -> tuple:
+        return kIOReturnSuccess, iter(self.matching_entries(matching))
+
+
+    def IOIteratorNext(self, iterator) -> Union[IORegistryEntry, int]:
+        return next(iterator, ioreg.NULL)
+
+
+    def IOObjectRelease(self, object) -> int:  # pylint: disable=redefined-builtin
+        return kIOReturnSuccess
+
+
+    def IORegistryEntryGetParentEntry(self, entry: IORegistryEntry, plane: bytes, parent) -> tuple:
+        if not self._check_plane(plane) or entry.parent is None:
+            return kIOReturnNoDevice, ioreg.NULL
+        return kIOReturnSuccess, entry.parent
+
+
+    def IORegistryEntryGetChildIterator(self, entry: IORegistryEntry, plane: bytes, iterator) -> tuple:
+        if not self._check_plane(plane):
+            return kIOReturnNotFound, iter([])
+        return kIOReturnSuccess, iter(list(entry.children))
+
+
+    def IORegistryEntryCreateIterator(self, entry: IORegistryEntry, plane: bytes, options: int, iterator) -> tuple:
+        if not self._check_plane(plane):
+            return kIOReturnNotFound, iter([])
+        if options & ioreg.kIORegistryIterateParents:
+            entries = list(entry.ancestors()) if options & ioreg.kIORegistryIterateRecursively else [entry.parent] if entry.parent else []
+        else:
+            entries = list(entry.descendants()) if options & ioreg.kIORegistryIterateRecursively else list(entry.children)
+        return kIOReturnSuccess, iter(entries)
+
+
+    def IORegistryCreateIterator(self, masterPort, plane: bytes, options: int, iterator) -> tuple:
+        return self.IORegistryEntryCreateIterator(self.root, plane, options, iterator)
+
+
+    def IORegistryEntryGetName(self, entry: IORegistryEntry, name) -> tuple:
+        return kIOReturnSuccess, entry.name.encode()
+
+
+    def IOObjectGetClass(self, object: IORegistryEntry, className) -> tuple:  # pylint: disable=redefined-builtin
+        return kIOReturnSuccess, object.cls.encode()
+
+
+    def IOObjectCopyClass(self, object: IORegistryEntry) -> str:  # pylint: disable=redefined-builtin
+        return object.cls
+
+
+    def IOObjectCopySuperclassForClass(self, classname: str) -> Optional[str]:
+        return self.superclasses.get(classname)
+
+
+    def IOObjectConformsTo(self, object: IORegistryEntry, className: bytes) -> int:  # pylint: disable=redefined-builtin
+        return int(self.conforms_to(object, ioreg.io_name_t_to_str(className)))
+
+
+    def IORegistryEntryGetLocationInPlane(self, entry: IORegistryEntry, plane: bytes, location) -> tuple:
+        if not self._check_plane(plane) or entry.location is None:
+            return kIOReturnNotFound, b""
+        return kIOReturnSuccess, entry.location.encode()
+
+
+    def IORegistryEntryGetRegistryEntryID(self, entry: IORegistryEntry, entryID) -> tuple:
+        return kIOReturnSuccess, entry.entry_id
+
+
+    def IORegistryEntryCopyPath(self, entry: IORegistryEntry, plane: bytes) -> Optional[str]:
+        return self.entry_path(entry) if self._check_plane(plane) else None
+
+
+    def IORegistryEntryGetPath(self, entry: IORegistryEntry, plane: bytes, path) -> tuple:
+        if not self._check_plane(plane):
+            return kIOReturnNotFound, b""
+        return kIOReturnSuccess, self.entry_path(entry).encode()
+
+
+    def IORegistryEntryFromPath(self, mainPort, path: bytes) -> Union[IORegistryEntry, int]:
+        return self.resolve_path(ioreg.io_name_t_to_str(path)) or ioreg.NULL
+
+    # pylint: enable=invalid-name
+
+
+    def corefoundation_to_native(self, collection):
+        # Values are already native
+        return collection
+
+
+    def native_to_corefoundation(self, native):
+        return native
+
+
+    def get_class_inheritance(self, io_object: IORegistryEntry) -> list:
+        classes = []
+        cls = io_object.cls
+        while cls:
+            classes.append(cls)
+            cls = self.superclasses.get(cls)
+        return classes
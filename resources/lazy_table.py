@@ -0,0 +1,154 @@
+# Lazily deserialized data tables, compiled from data/ at packaging time
+
+import sys
+import zlib
+import enum
+import marshal
+import importlib
+
+from pathlib import Path
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator, Optional
+
+
+# Bump whenever the compiled layout changes
+TABLE_VERSION = 1
+
+# Key marking an encoded enum member, see _encode()
+ENUM_KEY = "\0Enum"
+
+
+class LazyTable(Mapping):
+    """
+    Read-only dictionary, deserializing each entry on first access
+
+    Large tables in data/ (ie. smbios_data) are compiled by Build-Binary.command
+    into '<module>.table' next to their source, storing every entry marshalled on its own.
+    Loading the table only reads the keys, thus processes needing a single model's
+    record skip evaluating the full table at import.
+    Enum members are stored by reference, and resolved against the defining module.
+
+    If the compiled table is absent (ie. running from source) or was compiled from
+    a different source, the table is built from source on first access instead.
+
+    Usage:
+    >>> from resources.lazy_table import LazyTable
+    >>> smbios_dictionary = LazyTable(__file__, _smbios_dictionary)
+    >>> smbios_dictionary["MacBookPro11,1"]["Board ID"]
+    """
+
+    def __init__(self, source: str, builder: Callable[[], dict]):
+        """
+        Parameters:
+            source (str):       Path to the module defining the table (ie. __file__)
+            builder (Callable): Returns the full table, evaluated from source
+        """
+
+        self.source: Path = Path(source)
+        self.compiled_table: Path = self.source.with_suffix(".table")
+
+        self._builder: Callable[[], dict] = builder
+        self._entries: Optional[dict] = None
+        self._values: dict = {}
+        self._loaded: bool = False
+
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._values:
+            return self._values[key]
+
+        entries = self._load()
+        if entries is None:
+            return self._values[key]
+        self._values[key] = _decode(marshal.loads(entries[key]))
+        return self._values[key]
+
+
+    def __iter__(self) -> Iterator[str]:
+        entries = self._load()
+        return iter(self._values if entries is None else entries)
+
+
+    def __len__(self) -> int:
+        entries = self._load()
+        return len(self._values if entries is None else entries)
+
+
+    def __contains__(self, key: object) -> bool:
+        entries = self._load()
+        return key in (self._values if entries is None else entries)
+
+
+    def compile(self):
+        """
+        Write the compiled table, invoked at packaging time
+        """
+
+        table = {
+            "Version": TABLE_VERSION,
+            "Python":  list(sys.version_info[:2]),
+            "Source":  self._source_digest(),
+            "Entries": {key: marshal.dumps(_encode(value)) for key, value in self._builder().items()},
+        }
+        temporary_table = self.compiled_table.with_suffix(".table.partial")
+        temporary_table.write_bytes(marshal.dumps(table))
+        temporary_table.replace(self.compiled_table)
+
+
+    def _load(self) -> Optional[dict]:
+        """
+        Return the compiled entries, None once the table was built from source
+        """
+
+        if self._loaded is False:
+            self._loaded = True
+            self._entries = self._read_compiled()
+            if self._entries is None:
+                self._values = self._builder()
+        return self._entries
+
+
+    def _read_compiled(self) -> Optional[dict]:
+        if not self.compiled_table.exists():
+            return None
+        try:
+            table = marshal.loads(self.compiled_table.read_bytes())
+        except (EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(table, dict) or table.get("Version") != TABLE_VERSION or table.get("Python") != list(sys.version_info[:2]):
+            return None
+        # Frozen builds only ship bytecode, trust the table compiled alongside
+        if self.source.exists() and table.get("Source") != self._source_digest():
+            return None
+        return table["Entries"]
+
+
+    def _source_digest(self) -> int:
+        # Only guards against stale tables, hashlib's OpenSSL import would outweigh the lazy loading
+        return zlib.crc32(self.source.read_bytes())
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return {ENUM_KEY: [type(value).__module__, type(value).__qualname__, value.name]}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if value is None or type(value) in [str, int, float, bool, bytes]:
+        return value
+    raise TypeError(f"Unsupported value in data table: {value!r}")
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if ENUM_KEY in value:
+            module, qualname, name = value[ENUM_KEY]
+            cls = importlib.import_module(module)
+            for attribute in qualname.split("."):
+                cls = getattr(cls, attribute)
+            return cls[name]
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
@@ -10,13 +10,13 @@ from resources.gui import gui_main
 from resources import (
     constants,
     utilities,
-    device_probe,
     os_probe,
     defaults,
     arguments,
     reroute_payloads,
     commit_info,
-    logging_handler
+    logging_handler,
+    probe_snapshot
 )
 
 
@@ -53,7 +53,7 @@ class OpenCoreLegacyPatcher:
         self.constants.detected_os_version = os_data.detect_os_version()
 
         # Generate computer data
-        self.constants.computer = device_probe.Computer.probe()
+        self.constants.computer = probe_snapshot.ProbeSnapshot(self.constants.patcher_version).probe(reprobe="--reprobe" in sys.argv)
         self.computer = self.constants.computer
         self.constants.booted_oc_disk = utilities.find_disk_off_uuid(utilities.clean_device_path(self.computer.opencore_path))
         if self.constants.computer.firmware_vendor:
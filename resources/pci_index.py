@@ -0,0 +1,59 @@
+# Immutable device ID lookup tables, generated from data/pci_data.py
+
+import logging
+
+from types import MappingProxyType
+from typing import Any, ClassVar
+
+
+class PCIIndex:
+    """
+    Maps PCI device IDs to the family (arch, chipset or driver) they belong to
+
+    Built once per vendor from the ordered ID lists in pci_data, replacing
+    linear scans of each list with a single dictionary lookup.
+    IDs listed under multiple families resolve to the first family listed, matching
+    the former scans. Such overlaps are logged, and fail validation (see
+    validation.PatcherValidation) rather than the patcher's launch.
+
+    Usage:
+    >>> from resources.pci_index import PCIIndex
+    >>> index = PCIIndex("NVIDIA", [(pci_data.nvidia_ids.tesla_ids, NVIDIA.Archs.Tesla)])
+    >>> index.lookup(0x0A20, NVIDIA.Archs.Unknown)
+    """
+
+    # Every index built, for validation
+    indexes: ClassVar[list] = []
+
+    def __init__(self, name: str, families: list):
+        """
+        Parameters:
+            name (str):      Vendor name, used for error reporting
+            families (list): List of (device ID list, family) tuples
+        """
+
+        self.name: str = name
+
+        table = {}
+        overlaps = []
+        for device_ids, family in families:
+            for device_id in device_ids:
+                if device_id in table and table[device_id] != family:
+                    overlaps.append(f"{device_id:#06x} ({self._family_name(table[device_id])}, {self._family_name(family)})")
+                    continue
+                table[device_id] = family
+
+        self.table:    MappingProxyType = MappingProxyType(table)
+        self.overlaps: tuple = tuple(overlaps)
+
+        if self.overlaps:
+            logging.info(f"- {self.name} PCI IDs listed under multiple families, using the first: {', '.join(self.overlaps)}")
+        PCIIndex.indexes.append(self)
+
+
+    def lookup(self, device_id: int, default: Any = None) -> Any:
+        return self.table.get(device_id, default)
+
+
+    def _family_name(self, family: Any) -> str:
+        return getattr(family, "name", str(family))
@@ -0,0 +1,164 @@
+# Compact, versioned encoding of device_probe.Computer, as stored in config.plist's #Revision -> Hardware-Probe
+
+import enum
+import dataclasses
+
+from typing import Any, Optional
+
+
+# Bump whenever fields are renamed or removed, adding fields is backwards compatible
+RECORD_VERSION = 1
+
+# Scalar device_probe.Computer fields, stored under 'Computer'
+COMPUTER_FIELDS = [
+    "real_model",
+    "real_board_id",
+    "reported_model",
+    "reported_board_id",
+    "build_model",
+    "oclp_version",
+    "opencore_version",
+    "opencore_path",
+    "bluetooth_chipset",
+    "ambient_light_sensor",
+    "third_party_sata_ssd",
+    "secure_boot_model",
+    "secure_boot_policy",
+    "oclp_sys_version",
+    "oclp_sys_date",
+    "oclp_sys_url",
+    "firmware_vendor",
+    "rosetta_active",
+]
+
+# device_probe.CPU fields, stored under 'CPU'
+CPU_FIELDS = ["name", "flags", "leafs"]
+
+# Computer fields holding PCI devices, and whether they're lists
+DEVICE_ROLES = {
+    "gpus":            True,
+    "igpu":            False,
+    "dgpu":            False,
+    "wifi":            False,
+    "ethernet":        True,
+    "storage":         True,
+    "usb_controllers": True,
+    "sdxc_controller": True,
+}
+
+# device_probe.PCIDevice (and subclass) fields, stored per entry of 'Devices'
+# Enums (arch, chipset) are stored by member name
+DEVICE_FIELDS = [
+    "vendor_id",
+    "device_id",
+    "class_code",
+    "name",
+    "model",
+    "acpi_path",
+    "pci_path",
+    "disable_metal",
+    "force_compatible",
+    "arch",
+    "chipset",
+    "country_code",
+    "aspm",
+]
+
+
+def encode(computer) -> dict:
+    """
+    Flatten a device_probe.Computer into a plist-compatible record
+
+    Layout:
+        Version:  RECORD_VERSION
+        Computer: {COMPUTER_FIELDS}
+        CPU:      {CPU_FIELDS}
+        Devices:  [{Role, Class, DEVICE_FIELDS}], Role being the Computer field holding it
+
+    Unset and None values are omitted, as plists can't store them
+    """
+
+    record = {
+        "Version":  RECORD_VERSION,
+        "Computer": _fields(computer, COMPUTER_FIELDS),
+        "Devices":  [],
+    }
+    if getattr(computer, "cpu", None) is not None:
+        record["CPU"] = _fields(computer.cpu, CPU_FIELDS)
+
+    for role, is_list in DEVICE_ROLES.items():
+        devices = getattr(computer, role, None)
+        if devices is None:
+            continue
+        for device in (devices if is_list else [devices]):
+            record["Devices"].append({"Role": role, "Class": type(device).__name__, **_fields(device, DEVICE_FIELDS)})
+
+    return record
+
+
+def decode(value: Any) -> Optional[dict]:
+    """
+    Return the record stored in Hardware-Probe, None if absent, legacy (pickled) or newer than supported
+
+    Doesn't import device_probe, thus usable by standalone inventory tooling:
+    >>> from resources import probe_record
+    >>> record = probe_record.decode(plistlib.load(open("config.plist", "rb"))["#Revision"].get("Hardware-Probe"))
+    >>> [device["arch"] for device in record["Devices"] if device["Role"] == "gpus"]
+    """
+
+    if not isinstance(value, dict) or not isinstance(value.get("Version"), int) or value["Version"] > RECORD_VERSION:
+        return None
+    return {
+        "Version":  value["Version"],
+        "Computer": value.get("Computer", {}),
+        "CPU":      value.get("CPU"),
+        "Devices":  value.get("Devices", []),
+    }
+
+
+def to_computer(record: dict):
+    """
+    Rebuild the device_probe.Computer of a record, only instantiating classes defined in device_probe
+    """
+
+    from resources import device_probe  # pylint: disable=import-outside-toplevel
+
+    computer = device_probe.Computer(**{key: value for key, value in record["Computer"].items() if key in COMPUTER_FIELDS})
+    if record.get("CPU") is not None:
+        computer.cpu = device_probe.CPU(*(record["CPU"].get(key, []) for key in CPU_FIELDS))
+
+    for entry in record["Devices"]:
+        cls = getattr(device_probe, entry["Class"], None)
+        if not (isinstance(cls, type) and issubclass(cls, device_probe.PCIDevice)) or entry["Role"] not in DEVICE_ROLES:
+            raise ValueError(f"Unknown device in record: {entry['Class']} ({entry['Role']})")
+
+        values = {}
+        for item in dataclasses.fields(cls):
+            value = entry.get(item.name)
+            if value is not None and isinstance(item.type, type) and issubclass(item.type, enum.Enum):
+                value = item.type[value]
+            values[item.name] = value
+        device = cls(**{item.name: values[item.name] for item in dataclasses.fields(cls) if item.init and item.name in entry})
+        # Non-init fields (ie. GPU.arch) are detected on init, restore what was actually probed
+        for item in dataclasses.fields(cls):
+            if not item.init:
+                setattr(device, item.name, values[item.name])
+
+        if DEVICE_ROLES[entry["Role"]]:
+            getattr(computer, entry["Role"]).append(device)
+        else:
+            setattr(computer, entry["Role"], device)
+
+    return computer
+
+
+def _fields(instance, names: list) -> dict:
+    values = {}
+    for name in names:
+        value = getattr(instance, name, None)
+        if value is None:
+            continue
+        if isinstance(value, enum.Enum):
+            value = value.name
+        values[name] = value
+    return values
@@ -0,0 +1,154 @@
+# Persistent hardware probe, reused while the boot session is unchanged
+
+import os
+import stat
+import logging
+import platform
+import plistlib
+import tempfile
+import subprocess
+
+from pathlib import Path
+from typing import Optional
+
+from resources import device_probe, utilities, probe_record
+
+
+# Bump whenever the session key or probe_record's layout changes
+SNAPSHOT_VERSION = 2
+
+
+class ProbeSnapshot:
+    """
+    Stores the probed device_probe.Computer, reusing it while the boot session,
+    kernel, firmware and patcher version match
+
+    Hardware can't change without a reboot, thus launches after the first
+    (GUI, CLI and the auto-patch LaunchAgent) skip the IOKit walks and subprocesses.
+    The snapshot is a plist (see probe_record), thus never executes code when loaded.
+    Root keeps its snapshot in a root-owned folder, other users in their own caches,
+    and snapshots not owned by the current user, or writable by others, are ignored.
+
+    Usage:
+    >>> from resources.probe_snapshot import ProbeSnapshot
+    >>> computer = ProbeSnapshot(self.constants.patcher_version).probe(reprobe="--reprobe" in sys.argv)
+    """
+
+    def __init__(self, patcher_version: str):
+        self.patcher_version: str = patcher_version
+
+        # Root patching trusts the snapshot, thus root never reads one another user could write
+        self.file_name:       str = "com.sumingyd.opencore-legacy-patcher.probe.plist"
+        self.snapshot_folder: str = "/Library/Application Support/sumingyd" if os.geteuid() == 0 else str(Path.home() / "Library/Caches")
+        self.snapshot_plist:  str = f"{self.snapshot_folder}/{self.file_name}"
+
+
+    def probe(self, reprobe: bool = False) -> device_probe.Computer:
+        """
+        Return the computer from the snapshot if valid, otherwise probe and store it
+
+        Parameters:
+            reprobe (bool): Ignore any existing snapshot
+        """
+
+        session = self.session()
+
+        if reprobe is False and session is not None:
+            computer = self.load(session)
+            if computer is not None:
+                logging.info("- Using hardware probe from current boot session")
+                # Root patching updates this within a boot session, cheap enough to always redo
+                computer.oclp_sys_patch_probe()
+                return computer
+
+        computer = device_probe.Computer.probe()
+        if session is not None:
+            self.save(session, computer)
+        return computer
+
+
+    def session(self) -> Optional[dict]:
+        """
+        Values which invalidate the snapshot when changed, None if the boot session is unknown
+        """
+
+        boot_session = subprocess.run(["sysctl", "-n", "kern.bootsessionuuid"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+        if not boot_session:
+            return None
+
+        uname = platform.uname()
+        return {
+            "Boot Session":    boot_session,
+            "Kernel":          f"{uname.release} - {uname.version}",
+            "Firmware":        f"{utilities.get_firmware_vendor(decode=True)} - {utilities.get_rom('version', decode=True)}",
+            # Rosetta reports a different board ID and state, see Computer.smbios_probe()
+            "Translated":      bool(subprocess.run("sysctl -in sysctl.proc_translated".split(), stdout=subprocess.PIPE).stdout.decode().strip()),
+            "Patcher Version": self.patcher_version,
+        }
+
+
+    def load(self, session: dict) -> Optional[device_probe.Computer]:
+        if not Path(self.snapshot_plist).exists():
+            return None
+
+        try:
+            if self._is_trusted(os.lstat(self.snapshot_folder)) is False:
+                logging.info(f"- Ignoring hardware probe snapshot, {self.snapshot_folder} is writable by other users")
+                return None
+            # Refuse links, and check the opened file itself rather than its path
+            with os.fdopen(os.open(self.snapshot_plist, os.O_RDONLY | os.O_NOFOLLOW), "rb") as file:
+                if self._is_trusted(os.fstat(file.fileno())) is False:
+                    logging.info("- Ignoring hardware probe snapshot not owned by the current user")
+                    return None
+                snapshot = plistlib.load(file)
+            if snapshot.get("Version") != SNAPSHOT_VERSION or snapshot.get("Session") != session:
+                return None
+            record = probe_record.decode(snapshot["Computer"])
+            if record is None:
+                return None
+            computer = probe_record.to_computer(record)
+        except Exception as e:
+            logging.info(f"- Ignoring invalid hardware probe snapshot: {e}")
+            return None
+
+        return computer
+
+
+    def save(self, session: dict, computer: device_probe.Computer):
+        snapshot = {
+            "Version":  SNAPSHOT_VERSION,
+            "Session":  session,
+            "Computer": probe_record.encode(computer),
+        }
+
+        try:
+            Path(self.snapshot_folder).mkdir(mode=0o755, parents=True, exist_ok=True)
+            if self._is_trusted(os.lstat(self.snapshot_folder)) is False:
+                logging.info(f"- Not writing hardware probe snapshot, {self.snapshot_folder} is writable by other users")
+                return
+            # mkstemp() creates the file exclusively, never following a planted link
+            descriptor, temporary_plist = tempfile.mkstemp(prefix=f".{self.file_name}.", suffix=".partial", dir=self.snapshot_folder)
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    os.fchmod(file.fileno(), 0o644)
+                    plistlib.dump(snapshot, file, sort_keys=False)
+                os.replace(temporary_plist, self.snapshot_plist)
+            except BaseException:
+                os.unlink(temporary_plist)
+                raise
+        except (OSError, TypeError, OverflowError) as e:
+            logging.info(f"- Unable to write hardware probe snapshot: {e}")
+
+
+    def _is_trusted(self, entry_stat: os.stat_result) -> bool:
+        """
+        Whether a snapshot file or folder may only have been written by the current user (or root)
+        """
+
+        if stat.S_ISLNK(entry_stat.st_mode):
+            return False
+        if entry_stat.st_uid not in [0, os.geteuid()]:
+            return False
+        if entry_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+        return True
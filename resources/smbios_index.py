@@ -0,0 +1,90 @@
+# Reverse lookup tables over data/smbios_data.py
+
+from types import MappingProxyType
+from typing import ClassVar, Optional
+
+from data import smbios_data
+
+
+class SMBIOSIndex:
+    """
+    Maps board IDs back to models, and models to board IDs
+
+    Replaces linear scans of smbios_data (ie. generate_smbios.find_model_off_board())
+    with dictionary lookups, the reverse index being built once on first use.
+    Duplicate board IDs resolve to the first model listed, matching the former scans.
+
+    Usage:
+    >>> from resources.smbios_index import SMBIOSIndex
+    >>> SMBIOSIndex.shared().model_for_board("Mac-189A3D4F975D5FFC")
+    """
+
+    _shared: ClassVar[Optional["SMBIOSIndex"]] = None
+
+    def __init__(self, smbios_dictionary: dict):
+        """
+        Parameters:
+            smbios_dictionary (dict): smbios_data.smbios_dictionary, or a table of the same layout
+        """
+
+        self.smbios_dictionary: dict = smbios_dictionary
+
+        # The reverse index reads every record, thus is only built for callers needing it,
+        # keeping model lookups (ie. building) to that model's record
+        self._board_to_model: Optional[MappingProxyType] = None
+
+
+    @classmethod
+    def shared(cls) -> "SMBIOSIndex":
+        """
+        Index over smbios_data, created on first use and shared by all callers
+        """
+
+        if cls._shared is None:
+            cls._shared = cls(smbios_data.smbios_dictionary)
+        return cls._shared
+
+
+    def model_for_board(self, board: str) -> Optional[str]:
+        """
+        Find model based off Board ID (or T2/Apple Silicon Target Type) provided, None if unknown
+        """
+
+        # Strip extra data from Target Types (ap, uppercase)
+        if not (board.startswith("Mac-") or board.startswith("VMM-")):
+            if board.lower().endswith("ap"):
+                board = board[:-2]
+            board = board.lower()
+        return self.board_to_model.get(board)
+
+
+    def board_for_model(self, model: str) -> Optional[str]:
+        if model not in self.smbios_dictionary:
+            return None
+        return self.smbios_dictionary[model].get("Board ID")
+
+
+    @property
+    def board_to_model(self) -> MappingProxyType:
+        """
+        Model for each Board ID and SecureBootModel, built on first use
+        """
+
+        if self._board_to_model is None:
+            board_to_model = {}
+            for model, entry in self.smbios_dictionary.items():
+                for board in [entry.get("Board ID"), entry.get("SecureBootModel")]:
+                    if board is not None and board not in board_to_model:
+                        board_to_model[board] = self._canonical_model(model)
+            self._board_to_model = MappingProxyType(board_to_model)
+        return self._board_to_model
+
+
+    def _canonical_model(self, model: str) -> str:
+        if model.endswith("_v2") or model.endswith("_v3") or model.endswith("_v4"):
+            # smbios_data has duplicate SMBIOS to handle multiple board IDs
+            model = model[:-3]
+        if model == "MacPro4,1":
+            # 4,1 and 5,1 have the same board ID, best to return the newer ID
+            model = "MacPro5,1"
+        return model
@@ -32,6 +32,7 @@
 # This is because Apple removed on-disk binaries (ref: https://github.com/sumingyd/OpenCore-Legacy-Patcher/issues/998)
 #   'sudo ditto /Library/Developer/KDKs/<KDK Version>/System /System/Volumes/Update/mnt1/System'
 
+import copy
 import plistlib
 import shutil
 import subprocess
@@ -40,23 +41,38 @@ from datetime import datetime
 import logging
 
 from resources import constants, utilities, kdk_handler
-from resources.sys_patch import sys_patch_detect, sys_patch_auto, sys_patch_helpers
+from resources.sys_patch import sys_patch_detect, sys_patch_auto, sys_patch_helpers, sys_patch_plan, sys_patch_worker, sys_patch_copy
 
 from data import os_data
 
 
+# Files installed by the last patch, written alongside OpenCore-Legacy-Patcher.plist
+MANIFEST_FILE_NAME = "OpenCore-Legacy-Patcher-Manifest.plist"
+# Files of a KDK's Extensions, cached within the KDK
+KDK_MANIFEST_FILE_NAME = "OpenCore-Legacy-Patcher-KDK-Manifest.plist"
+MANIFEST_VERSION = 1
+
+
 class PatchSysVolume:
     def __init__(self, model: str, global_constants: constants.Constants, hardware_details: list = None):
         self.model = model
         self.constants: constants.Constants = global_constants
         self.computer = self.constants.computer
         self.root_mount_path = None
+        # File operations are queued and applied in batches by a single privileged worker
+        self.file_operations = sys_patch_worker.FileOperationWorker()
+        self.queued_file_operations = []
+        # Files installed by the last patch, see _load_manifest()
+        self.previous_manifest = {}
+        self.manifest = {}
+        self.kernel_extensions_changed = True
         self.root_supports_snapshot = utilities.check_if_root_is_apfs_snapshot()
         self.constants.root_patcher_succeeded = False # Reset Variable each time we start
         self.constants.needs_to_open_preferences = False
         self.patch_set_dictionary = {}
         self.needs_kmutil_exemptions = False # For '/Library/Extensions' rebuilds
         self.kdk_path = None
+        self.kdk_merged = False # Whether merging the KDK changed the root volume
 
         # GUI will detect hardware patches before starting PatchSysVolume()
         # However the TUI will not, so allow for data to be passed in manually avoiding multiple calls
@@ -68,6 +84,7 @@ class PatchSysVolume:
         self.skip_root_kmutil_requirement = self.hardware_details["Settings: Supports Auxiliary Cache"]
 
     def __del__(self):
+        self.file_operations.stop()
         # Ensures that each time we're patching, we're using a clean repository
         if Path(self.constants.payload_local_binaries_root_path).exists():
             shutil.rmtree(self.constants.payload_local_binaries_root_path)
@@ -122,7 +139,7 @@ class PatchSysVolume:
         return False
 
 
-    def _merge_kdk_with_root(self, save_hid_cs=False):
+    def _merge_kdk_with_root(self, plan, save_hid_cs=False):
         if self.skip_root_kmutil_requirement is True:
             return
         if self.constants.detected_os < os_data.os_data.ventura:
@@ -169,55 +186,82 @@ class PatchSysVolume:
                 raise Exception("KDK was not installed, but should have been: {kdk_obj.error_msg}")
 
         kdk_path = Path(kdk_obj.kdk_installed_path) if kdk_obj.kdk_installed_path != "" else None
-
-        oclp_plist = Path("/System/Library/CoreServices/OpenCore-Legacy-Patcher.plist")
-        if (Path(self.mount_location) / Path("System/Library/Extensions/System.kext/PlugIns/Libkern.kext/Libkern")).exists() and oclp_plist.exists():
-            # KDK was already merged, check if the KDK used is the same as the one we're using
-            # If not, we'll rsync over with the new KDK
-            try:
-                oclp_plist_data = plistlib.load(open(oclp_plist, "rb"))
-                if "Kernel Debug Kit Used" in oclp_plist_data:
-                    if oclp_plist_data["Kernel Debug Kit Used"] == str(kdk_path):
-                        logging.info("- Matching KDK determined to already be merged, skipping")
-                        return
-            except:
-                pass
-
         if kdk_path is None:
             logging.info(f"- Unable to find Kernel Debug Kit")
             raise Exception("Unable to find Kernel Debug Kit")
         self.kdk_path = kdk_path
         logging.info(f"- Found KDK at: {kdk_path}")
 
+        # Files replaced or removed by the patch sets are left as is, rather than merged then overwritten
+        extensions_path = "/System/Library/Extensions"
+        exclude = [
+            operation.destination[len(extensions_path) + 1:]
+            for operation in plan.operations(kinds=[sys_patch_plan.OperationKind.REMOVE, sys_patch_plan.OperationKind.INSTALL_ROOT])
+            if operation.destination.startswith(extensions_path + "/")
+        ]
+
         # Due to some IOHIDFamily oddities, we need to ensure their CodeSignature is retained
         cs_path = Path(self.mount_location) / Path("System/Library/Extensions/IOHIDFamily.kext/Contents/PlugIns/IOHIDEventDriver.kext/Contents/_CodeSignature")
         if save_hid_cs is True and cs_path.exists():
-            logging.info("- Backing up IOHIDEventDriver CodeSignature")
-            # Note it's a folder, not a file
-            utilities.elevated(["cp", "-r", cs_path, f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            logging.info("- Retaining IOHIDEventDriver CodeSignature")
+            exclude.append("IOHIDFamily.kext/Contents/PlugIns/IOHIDEventDriver.kext/Contents/_CodeSignature")
 
+        # Only merge '/System/Library/Extensions'
+        # 'Kernels' and 'KernelSupport' is wasted space for root patching (we don't care above dev kernels)
+        # Only entries missing or different on root are copied, thus an interrupted merge resumes on the next run
         logging.info(f"- Merging KDK with Root Volume: {kdk_path.name}")
-        utilities.elevated(
-            # Only merge '/System/Library/Extensions'
-            # 'Kernels' and 'KernelSupport' is wasted space for root patching (we don't care above dev kernels)
-            ["rsync", "-r", "-i", "-a", f"{kdk_path}/System/Library/Extensions/", f"{self.mount_location}/System/Library/Extensions"],
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        merge = sys_patch_worker.FileOperation(
+            sys_patch_worker.FileOperationKind.SYNC,
+            f"{self.mount_location}{extensions_path}",
+            f"{kdk_path}{extensions_path}",
+            check=False,  # Verified through Libkern below, as with rsync
+            manifest=self._kdk_manifest(kdk_path),
+            exclude=exclude,
         )
+        self.queued_file_operations.append(merge)
+        self.kdk_merged = any(result.changed for result in self._flush_file_operations() if result.operation is merge)
+
         # During reversing, we found that kmutil uses this path to determine whether the KDK was successfully merged
         # Best to verify now before we cause any damage
         if not (Path(self.mount_location) / Path("System/Library/Extensions/System.kext/PlugIns/Libkern.kext/Libkern")).exists():
             logging.info("- Failed to merge KDK with Root Volume")
             raise Exception("Failed to merge KDK with Root Volume")
-        logging.info("- Successfully merged KDK with Root Volume")
+        if self.kdk_merged is True:
+            logging.info("- Successfully merged KDK with Root Volume")
+        else:
+            logging.info("- KDK determined to already be merged, skipping")
 
-        # Restore IOHIDEventDriver CodeSignature
-        if save_hid_cs is True and Path(f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak").exists():
-            logging.info("- Restoring IOHIDEventDriver CodeSignature")
-            if not cs_path.exists():
-                logging.info("  - CodeSignature folder missing, creating")
-                utilities.elevated(["mkdir", "-p", cs_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            utilities.elevated(["cp", "-r", f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak", cs_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            utilities.elevated(["rm", "-rf", f"{self.constants.payload_path}/IOHIDEventDriver_CodeSignature.bak"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    def _kdk_manifest(self, kdk_path: Path):
+        """
+        Manifest of the KDK's Extensions, see sys_patch_copy.tree_manifest()
+
+        Cached within the KDK keyed by its build, and trusted as is, as kdk_handler
+        already validates KDK contents. Thus the KDK is only walked once.
+        """
+
+        kdk_build = plistlib.load((kdk_path / "System/Library/CoreServices/SystemVersion.plist").open("rb"))["ProductBuildVersion"]
+
+        cache_path = kdk_path / KDK_MANIFEST_FILE_NAME
+        if cache_path.exists():
+            try:
+                with cache_path.open("rb") as cache_file:
+                    cache = plistlib.load(cache_file)
+                if cache.get("Version") == MANIFEST_VERSION and cache.get("Build") == kdk_build:
+                    return cache["Files"]
+            except Exception:
+                pass
+
+        logging.info("- Indexing KDK, this is only done once per KDK")
+        manifest = sys_patch_copy.tree_manifest(kdk_path / "System/Library/Extensions")
+
+        source_path_file = f"{self.constants.payload_path}/{KDK_MANIFEST_FILE_NAME}"
+        with Path(source_path_file).open("wb") as cache_file:
+            plistlib.dump({"Version": MANIFEST_VERSION, "Build": kdk_build, "Files": manifest}, cache_file, sort_keys=False)
+        if cache_path.exists():
+            utilities.elevated(["rm", cache_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        # Cache is only an optimization, failing to write it is not fatal
+        utilities.elevated(["cp", source_path_file, kdk_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return manifest
 
 
     def _unpatch_root_vol(self):
@@ -233,12 +277,14 @@ class PatchSysVolume:
                 self._clean_skylight_plugins()
                 self._delete_nonmetal_enforcement()
                 self._clean_auxiliary_kc()
+                self.file_operations.stop()
                 self.constants.root_patcher_succeeded = True
                 logging.info("- Unpatching complete")
                 logging.info("\nPlease reboot the machine for patches to take effect")
 
     def _rebuild_snapshot(self):
         if self._rebuild_kernel_collection() is True:
+            self._write_manifest()
             self.update_preboot_kernel_cache()
             self._rebuild_dyld_shared_cache()
             if self._create_new_apfs_snapshot() is True:
@@ -251,6 +297,10 @@ class PatchSysVolume:
                     input("\nPress [ENTER] to continue")
 
     def _rebuild_kernel_collection(self):
+        if self.previous_manifest and self.kernel_extensions_changed is False and self.kdk_merged is False:
+            logging.info("- No kernel extensions changed since last patch, skipping Kernel Cache rebuild")
+            return True
+
         logging.info("- Rebuilding Kernel Cache (This may take some time)")
         if self.constants.detected_os > os_data.os_data.catalina:
             # Base Arguments
@@ -338,6 +388,8 @@ class PatchSysVolume:
 
             for file in ["KextPolicy", "KextPolicy-shm", "KextPolicy-wal"]:
                 self._remove_file("/private/var/db/SystemPolicyConfiguration/", file)
+            self._flush_file_operations()
+            self.file_operations.stop()
         else:
             # Install RSRHelper utility to handle desynced KCs
             sys_patch_helpers.SysPatchHelpers(self.constants).install_rsr_repair_binary()
@@ -418,6 +470,7 @@ class PatchSysVolume:
                         if not file.endswith(".kext"):
                             continue
                         self._remove_file("/Library/Extensions", file)
+            self._flush_file_operations()
 
         # Handle situations where users migrated from older OSes with a lot of garbage in /L*/E*
         # ex. Nvidia Web Drivers, NetUSB, dosdude1's patches, etc.
@@ -451,6 +504,39 @@ class PatchSysVolume:
                 utilities.process_status(utilities.elevated(["rm", destination_path_file], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
             utilities.process_status(utilities.elevated(["cp", f"{self.constants.payload_path}/{file_name}", destination_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
 
+    def _load_manifest(self):
+        """
+        Load the files installed by the last patch, keyed by install destination
+
+        Written alongside OpenCore-Legacy-Patcher.plist once the kernel cache was rebuilt,
+        thus a missing or outdated manifest (ie. after an OS update) only results in a full reinstall
+        """
+
+        manifest_path = Path(f"{self.mount_location}/System/Library/CoreServices/{MANIFEST_FILE_NAME}")
+        if self.constants.differential_root_patching is False or not manifest_path.exists():
+            return {}
+        try:
+            with manifest_path.open("rb") as manifest_file:
+                manifest = plistlib.load(manifest_file)
+        except Exception:
+            return {}
+        if manifest.get("Version") != MANIFEST_VERSION:
+            return {}
+        logging.info("- Found manifest of last patch, only reinstalling changed files")
+        return manifest.get("Files", {})
+
+    def _write_manifest(self):
+        destination_path = f"{self.mount_location}/System/Library/CoreServices"
+        source_path_file = f"{self.constants.payload_path}/{MANIFEST_FILE_NAME}"
+        destination_path_file = f"{destination_path}/{MANIFEST_FILE_NAME}"
+
+        with Path(source_path_file).open("wb") as manifest_file:
+            plistlib.dump({"Version": MANIFEST_VERSION, "Files": self.manifest}, manifest_file, sort_keys=True)
+        logging.info("- Writing patch manifest to Root Volume")
+        if Path(destination_path_file).exists():
+            utilities.process_status(utilities.elevated(["rm", destination_path_file], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+        utilities.process_status(utilities.elevated(["cp", source_path_file, destination_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+
     def _add_auxkc_support(self, install_file, source_folder_path, install_patch_directory, destination_folder_path):
         # In macOS Ventura, KDKs are required to build new Boot and System KCs
         # However for some patch sets, we're able to use the Auxiliary KCs with '/Library/Extensions'
@@ -526,62 +612,100 @@ class PatchSysVolume:
         self._rebuild_snapshot()
 
     def _execute_patchset(self, required_patches):
+        try:
+            self._apply_patchset(required_patches)
+        finally:
+            self.queued_file_operations = []
+            self.file_operations.stop()
+
+    def _apply_patchset(self, required_patches):
+        # Spinning disks slow down with concurrent copies
+        self.file_operations.copy_threads = sys_patch_copy.copy_threads_for_disk(self.mount_location or "/")
+        self.previous_manifest = self._load_manifest()
+        self.manifest = {}
+        self.kernel_extensions_changed = False
+
         source_files_path = str(self.constants.payload_local_binaries_root_path)
-        self._preflight_checks(required_patches, source_files_path)
-        for patch in required_patches:
-            logging.info("- Installing Patchset: " + patch)
-            if "Remove" in required_patches[patch]:
-                for remove_patch_directory in required_patches[patch]["Remove"]:
-                    logging.info("- Remove Files at: " + remove_patch_directory)
-                    for remove_patch_file in required_patches[patch]["Remove"][remove_patch_directory]:
-                        destination_folder_path = str(self.mount_location) + remove_patch_directory
-                        self._remove_file(destination_folder_path, remove_patch_file)
-
-
-            for method_install in ["Install", "Install Non-Root"]:
-                if method_install in required_patches[patch]:
-                    for install_patch_directory in list(required_patches[patch][method_install]):
-                        logging.info(f"- Handling Installs in: {install_patch_directory}")
-                        for install_file in list(required_patches[patch][method_install][install_patch_directory]):
-                            source_folder_path = source_files_path + "/" + required_patches[patch][method_install][install_patch_directory][install_file] + install_patch_directory
-                            if method_install == "Install":
-                                destination_folder_path = str(self.mount_location) + install_patch_directory
-                            else:
-                                if install_patch_directory == "/Library/Extensions":
-                                    self.needs_kmutil_exemptions = True
-                                    self._check_kexts_needs_authentication(install_file)
-                                destination_folder_path = str(self.mount_location_data) + install_patch_directory
-
-                            updated_destination_folder_path = self._add_auxkc_support(install_file, source_folder_path, install_patch_directory, destination_folder_path)
-
-                            if destination_folder_path != updated_destination_folder_path:
-                                # Update required_patches to reflect the new destination folder path
-                                if updated_destination_folder_path not in required_patches[patch][method_install]:
-                                    required_patches[patch][method_install].update({updated_destination_folder_path: {}})
-                                required_patches[patch][method_install][updated_destination_folder_path].update({install_file: required_patches[patch][method_install][install_patch_directory][install_file]})
-                                required_patches[patch][method_install][install_patch_directory].pop(install_file)
-
-                                destination_folder_path = updated_destination_folder_path
-
-                            self._install_new_file(source_folder_path, destination_folder_path, install_file)
-
-            if "Processes" in required_patches[patch]:
-                for process in required_patches[patch]["Processes"]:
-                    # Some processes need sudo, however we cannot directly call sudo in some scenarios
-                    # Instead, call elevated funtion if string's boolean is True
-                    if required_patches[patch]["Processes"][process] is True:
-                        logging.info(f"- Running Process as Root:\n{process}")
-                        utilities.process_status(utilities.elevated(process.split(" "), stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-                    else:
-                        logging.info(f"- Running Process:\n{process}")
-                        utilities.process_status(subprocess.run(process, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True))
+        plan = sys_patch_plan.SysPatchPlan(required_patches)
+        self._preflight_checks(required_patches, source_files_path, plan)
+
+        # Installs moved to the data volume for AuxKC, see _add_auxkc_support()
+        relocated_installs = {}
+
+        current_patch = None
+        current_directory = None
+        for operation in plan.operations():
+            if operation.patch != current_patch:
+                # Apply each patch set as a single batch
+                self._flush_file_operations()
+                current_patch = operation.patch
+                current_directory = None
+                logging.info("- Installing Patchset: " + operation.patch)
+
+            if operation.kind == sys_patch_plan.OperationKind.REMOVE:
+                if operation.directory != current_directory:
+                    current_directory = operation.directory
+                    logging.info("- Remove Files at: " + operation.directory)
+                self._remove_file(str(self.mount_location) + operation.directory, operation.name)
+
+            elif operation.kind in [sys_patch_plan.OperationKind.INSTALL_ROOT, sys_patch_plan.OperationKind.INSTALL_DATA]:
+                if operation.directory != current_directory:
+                    current_directory = operation.directory
+                    logging.info(f"- Handling Installs in: {operation.directory}")
+                source_folder_path = operation.source_folder(source_files_path)
+                if operation.kind == sys_patch_plan.OperationKind.INSTALL_ROOT:
+                    destination_folder_path = str(self.mount_location) + operation.directory
+                else:
+                    if operation.directory == "/Library/Extensions":
+                        self.needs_kmutil_exemptions = True
+                        self._check_kexts_needs_authentication(operation.name)
+                    destination_folder_path = str(self.mount_location_data) + operation.directory
+
+                updated_destination_folder_path = self._add_auxkc_support(operation.name, source_folder_path, operation.directory, destination_folder_path)
+                if destination_folder_path != updated_destination_folder_path:
+                    relocated_installs[(operation.kind.value, operation.directory, operation.name)] = updated_destination_folder_path
+                    destination_folder_path = updated_destination_folder_path
+
+                self._install_new_file(source_folder_path, destination_folder_path, operation.name)
+
+            elif operation.kind == sys_patch_plan.OperationKind.PROCESS:
+                # Some processes need sudo, however we cannot directly call sudo in some scenarios
+                # Instead, call elevated funtion if string's boolean is True
+                self._flush_file_operations()
+                if operation.as_root is True:
+                    logging.info(f"- Running Process as Root:\n{operation.name}")
+                    utilities.process_status(utilities.elevated(operation.name.split(" "), stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+                else:
+                    logging.info(f"- Running Process:\n{operation.name}")
+                    utilities.process_status(subprocess.run(operation.name, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True))
+        self._flush_file_operations()
+
         if any(x in required_patches for x in ["AMD Legacy GCN", "AMD Legacy Polaris", "AMD Legacy Vega"]):
             sys_patch_helpers.SysPatchHelpers(self.constants).disable_window_server_caching()
         if any(x in required_patches for x in ["Intel Ivy Bridge", "Intel Haswell"]):
             sys_patch_helpers.SysPatchHelpers(self.constants).remove_news_widgets()
-        self._write_patchset(required_patches)
+        self._write_patchset(self._relocate_installs(required_patches, relocated_installs))
+
+    def _relocate_installs(self, required_patches, relocated_installs):
+        """
+        Reflect installs moved to the data volume in the patchset written to the root volume
+
+        Patch set entries are shared with the compiled SystemPatchDictionary, thus only copies are edited
+        """
+
+        if not relocated_installs:
+            return required_patches
+
+        required_patches = copy.deepcopy(required_patches)
+        for (method_install, install_patch_directory, install_file), updated_destination_folder_path in relocated_installs.items():
+            for patch in required_patches:
+                installs = required_patches[patch].get(method_install, {})
+                if install_file not in installs.get(install_patch_directory, {}):
+                    continue
+                installs.setdefault(updated_destination_folder_path, {})[install_file] = installs[install_patch_directory].pop(install_file)
+        return required_patches
 
-    def _preflight_checks(self, required_patches, source_files_path):
+    def _preflight_checks(self, required_patches, source_files_path, plan):
         logging.info("- Running Preflight Checks before patching")
 
         # Make sure old SkyLight plugins aren't being used
@@ -595,27 +719,24 @@ class PatchSysVolume:
         if "Intel Sandy Bridge" in required_patches:
             sys_patch_helpers.SysPatchHelpers(self.constants).snb_board_id_patch(source_files_path)
 
-        for patch in required_patches:
-            # Check if all files are present
-            for method_type in ["Install", "Install Non-Root"]:
-                if method_type in required_patches[patch]:
-                    for install_patch_directory in required_patches[patch][method_type]:
-                        for install_file in required_patches[patch][method_type][install_patch_directory]:
-                            source_file = source_files_path + "/" + required_patches[patch][method_type][install_patch_directory][install_file] + install_patch_directory + "/" + install_file
-                            if not Path(source_file).exists():
-                                raise Exception(f"Failed to find {source_file}")
+        # Check if all files are present
+        for operation in plan.installs():
+            source_file = operation.source_file(source_files_path)
+            if not Path(source_file).exists():
+                raise Exception(f"Failed to find {source_file}")
 
         # Ensure KDK is properly installed
         should_save_cs = False
         if "Legacy USB 1.1" in required_patches:
             should_save_cs = True
-        self._merge_kdk_with_root(save_hid_cs=should_save_cs)
+        self._merge_kdk_with_root(plan, save_hid_cs=should_save_cs)
 
         logging.info("- Finished Preflight, starting patching")
 
     def _install_new_file(self, source_folder, destination_folder, file_name):
         # .frameworks are merged
         # .kexts and .apps are deleted and replaced
+        # Both are set to 755 root:wheel while copying
         file_name_str = str(file_name)
 
         if not Path(destination_folder).exists():
@@ -623,47 +744,52 @@ class PatchSysVolume:
             return
 
         if file_name_str.endswith(".framework"):
-            # merge with rsync
+            # merge, rsync's result was never checked
             logging.info(f"  - Installing: {file_name}")
-            utilities.elevated(["rsync", "-r", "-i", "-a", f"{source_folder}/{file_name}", f"{destination_folder}/"], stdout=subprocess.PIPE)
-            self._fix_permissions(destination_folder + "/" + file_name)
-        elif Path(source_folder + "/" + file_name_str).is_dir():
-            # Applicable for .kext, .app, .plugin, .bundle, all of which are directories
-            if Path(destination_folder + "/" + file_name).exists():
-                logging.info(f"  - Found existing {file_name}, overwriting...")
-                utilities.process_status(utilities.elevated(["rm", "-R", f"{destination_folder}/{file_name}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-            else:
-                logging.info(f"  - Installing: {file_name}")
-            utilities.process_status(utilities.elevated(["cp", "-R", f"{source_folder}/{file_name}", destination_folder], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-            self._fix_permissions(destination_folder + "/" + file_name)
+            self._queue_file_operation(sys_patch_worker.FileOperationKind.MERGE, f"{destination_folder}/{file_name}", f"{source_folder}/{file_name}", check=False, differential=True)
         else:
-            # Assume it's an individual file, replace as normal
+            # Applicable for .kext, .app, .plugin, .bundle, as well as individual files
             if Path(destination_folder + "/" + file_name).exists():
                 logging.info(f"  - Found existing {file_name}, overwriting...")
-                utilities.process_status(utilities.elevated(["rm", f"{destination_folder}/{file_name}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
             else:
                 logging.info(f"  - Installing: {file_name}")
-            utilities.process_status(utilities.elevated(["cp", f"{source_folder}/{file_name}", destination_folder], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-            self._fix_permissions(destination_folder + "/" + file_name)
+            self._queue_file_operation(sys_patch_worker.FileOperationKind.COPY, f"{destination_folder}/{file_name}", f"{source_folder}/{file_name}", differential=True)
 
     def _remove_file(self, destination_folder, file_name):
         if Path(destination_folder + "/" + file_name).exists():
             logging.info(f"  - Removing: {file_name}")
-            if Path(destination_folder + "/" + file_name).is_dir():
-                utilities.process_status(utilities.elevated(["rm", "-R", f"{destination_folder}/{file_name}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-            else:
-                utilities.process_status(utilities.elevated(["rm", f"{destination_folder}/{file_name}"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-
-
-    def _fix_permissions(self, destination_file):
-        chmod_args = ["chmod", "-Rf", "755", destination_file]
-        chown_args = ["chown", "-Rf", "root:wheel", destination_file]
-        if not Path(destination_file).is_dir():
-            # Strip recursive arguments
-            chmod_args.pop(1)
-            chown_args.pop(1)
-        utilities.process_status(utilities.elevated(chmod_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
-        utilities.process_status(utilities.elevated(chown_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+            self._queue_file_operation(sys_patch_worker.FileOperationKind.REMOVE, f"{destination_folder}/{file_name}")
+
+
+    def _queue_file_operation(self, kind: sys_patch_worker.FileOperationKind, path: str, source: str = None, check: bool = True, differential: bool = False):
+        # Differential copies only rewrite files differing from the last patch's manifest
+        manifest = self.previous_manifest.get(path) if differential is True else None
+        self.queued_file_operations.append(sys_patch_worker.FileOperation(kind, path, source, check, manifest))
+
+
+    def _flush_file_operations(self):
+        """
+        Apply queued file operations, raising if any required operation failed
+
+        Returns the FileOperationResults of the applied operations
+        """
+
+        operations, self.queued_file_operations = self.queued_file_operations, []
+        results = self.file_operations.run(operations)
+        for result in results:
+            if result.changed is True and ".kext" in result.operation.path:
+                self.kernel_extensions_changed = True
+            if result.success is True and result.operation.kind in [sys_patch_worker.FileOperationKind.COPY, sys_patch_worker.FileOperationKind.MERGE]:
+                self.manifest[result.operation.path] = result.manifest
+
+        failed = [result for result in results if result.success is False and result.operation.check is True]
+        if not failed:
+            return results
+
+        for result in failed:
+            logging.info(f"- {result.operation.kind.value} failed for {result.operation.path}: {result.error}")
+        logging.info("Please report the issue on the Discord server")
+        raise Exception("File operation result: \n" + "\n".join(f"{result.operation.kind.value} {result.operation.path}: {result.error}" for result in failed))
 
 
     def _check_files(self):
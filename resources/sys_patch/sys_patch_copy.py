@@ -0,0 +1,508 @@
+# Parallel copy engine for root patch installs, run within sys_patch_worker
+
+import os
+import sys
+import stat
+import ctypes
+import shutil
+import hashlib
+import plistlib
+import subprocess
+import concurrent.futures
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+# Threads per target disk type, copies on spinning disks are seek bound
+SOLID_STATE_COPY_THREADS = 8
+ROTATIONAL_COPY_THREADS  = 2
+
+# Block size for file copies
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+# copyfile(3) flags, extended attributes include resource forks
+COPYFILE_ACL   = 1 << 0
+COPYFILE_XATTR = 1 << 2
+
+_libsystem = None
+
+
+def copy_threads_for_disk(path: str) -> int:
+    """
+    Copy concurrency suited for the disk backing path, SOLID_STATE_COPY_THREADS if unknown
+    """
+
+    if sys.platform != "darwin":
+        return SOLID_STATE_COPY_THREADS
+    try:
+        disk_info = plistlib.loads(subprocess.run(["diskutil", "info", "-plist", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout)
+    except Exception:
+        return SOLID_STATE_COPY_THREADS
+    if disk_info.get("SolidState", True) is False:
+        return ROTATIONAL_COPY_THREADS
+    return SOLID_STATE_COPY_THREADS
+
+
+def copy_metadata(source, destination):
+    """
+    Copy extended attributes and ACLs, as macOS' 'cp -R' does, through copyfile(3)
+
+    source and destination are both file descriptors or both paths.
+    No-op on other platforms, which lack resource forks and copyfile(3).
+    """
+
+    global _libsystem
+
+    if sys.platform != "darwin":
+        return
+    if _libsystem is None:
+        _libsystem = ctypes.CDLL("/usr/lib/libSystem.B.dylib", use_errno=True)
+        _libsystem.fcopyfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_uint32]
+        _libsystem.copyfile.argtypes  = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_uint32]
+
+    if isinstance(source, int):
+        result = _libsystem.fcopyfile(source, destination, None, COPYFILE_ACL | COPYFILE_XATTR)
+    else:
+        result = _libsystem.copyfile(os.fsencode(source), os.fsencode(destination), None, COPYFILE_ACL | COPYFILE_XATTR)
+    if result != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error), str(destination))
+
+
+def tree_manifest(root: Path) -> dict:
+    """
+    Record every entry below root, keyed by relative path in walk order
+
+    Folders record their Mode, links their Target, and files their Mode, Size and Modified (ns).
+    Contents are not read, see CopyEngine.sync() for how files are compared.
+    """
+
+    manifest = {}
+    for folder, folders, files in os.walk(root):
+        for name in sorted(folders) + sorted(files):
+            path = Path(folder) / name
+            relative = str(path.relative_to(root))
+            entry_stat = path.lstat()
+            if stat.S_ISLNK(entry_stat.st_mode):
+                manifest[relative] = {"Type": "Link", "Target": os.readlink(path)}
+            elif stat.S_ISDIR(entry_stat.st_mode):
+                manifest[relative] = {"Type": "Folder", "Mode": stat.S_IMODE(entry_stat.st_mode)}
+            else:
+                manifest[relative] = {"Type": "File", "Mode": stat.S_IMODE(entry_stat.st_mode), "Size": entry_stat.st_size, "Modified": entry_stat.st_mtime_ns}
+    return manifest
+
+
+def _same_contents(path: Path, other_path: Path) -> bool:
+    with open(path, "rb") as file, open(other_path, "rb") as other_file:
+        while True:
+            block = file.read(COPY_BLOCK_SIZE)
+            if block != other_file.read(COPY_BLOCK_SIZE):
+                return False
+            if not block:
+                return True
+
+
+@dataclass
+class CopyResult:
+    """
+    Outcome of a queued copy
+
+    'manifest' maps each copied file, relative to the copy's destination, to its
+    record (Size, Modified, Hash), see CopyEngine.copy()
+    """
+
+    errors:   list = field(default_factory=list)
+    changed:  bool = False
+    manifest: dict = field(default_factory=dict)
+
+
+class CopyEngine:
+    """
+    Copies file trees with a thread pool, applying metadata, mode and ownership in the same pass
+
+    Replaces 'cp -R' and 'rsync -r -a' followed by recursive chmod and chown.
+    Folders and links are created in order, while file contents are copied
+    concurrently through os.copy_file_range() or os.sendfile() where the
+    platform allows it. Copies queued back to back share the pool, thus many
+    small kexts install concurrently as well. Call wait() for their results.
+    On macOS, copies and merges keep extended attributes (thus resource forks)
+    and ACLs like 'cp -R' did, see copy_metadata().
+
+    Given the manifest recorded by a previous copy, copies are differential:
+    files whose size and modification time still match their record, and whose
+    source hashes the same, are left untouched, and only the rest is rewritten.
+
+    sync() instead merges a whole tree described by tree_manifest() (ie. a KDK),
+    only writing entries missing or different in the destination.
+
+    Usage:
+    >>> from resources.sys_patch.sys_patch_copy import CopyEngine
+    >>> with CopyEngine(max_workers=2, owner=(0, 0)) as engine:
+    >>>     engine.copy(Path("10.13.6/System/Library/Extensions/GeForce.kext"), Path("/System/Library/Extensions/GeForce.kext"))
+    >>>     errors = engine.wait()
+    """
+
+    def __init__(self, max_workers: int = SOLID_STATE_COPY_THREADS, owner: Optional[tuple] = (0, 0), mode: int = 0o755):
+        """
+        Parameters:
+            max_workers (int): Concurrent file copies
+            owner (tuple):     uid and gid for copied files, None to keep the caller's
+            mode (int):        Mode for copied files and folders
+        """
+
+        self.max_workers: int = max_workers
+        self.owner: Optional[tuple] = owner
+        self.mode: int = mode
+
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pending:   dict = {}  # key -> file copy futures
+        self._results:   dict = {}  # key -> CopyResult
+        self._manifests: dict = {}  # key -> (destination, previous manifest)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+    def copy(self, source: Path, destination: Path, key=None, manifest: dict = None):
+        """
+        Replace destination with a copy of source, mirroring 'rm -R' + 'cp -R'
+
+        Parameters:
+            key:             Identifies the copy in wait()'s results, destination if None
+            manifest (dict): CopyResult.manifest of the copy last made to destination, if any
+        """
+
+        key = self._queue(key, destination, manifest)
+        try:
+            if manifest is None:
+                self._remove(key, destination)
+            self._copy_entry(key, source, destination, merge=False)
+        except OSError as e:
+            self._results[key].errors.append(self._format_error(e))
+
+
+    def merge(self, source: Path, destination: Path, key=None, manifest: dict = None):
+        """
+        Merge source into destination, mirroring 'rsync -r -a'
+
+        Entries only present in destination are kept, though still get mode and ownership applied
+        """
+
+        key = self._queue(key, destination, manifest)
+        try:
+            self._copy_entry(key, source, destination, merge=True)
+        except OSError as e:
+            self._results[key].errors.append(self._format_error(e))
+
+
+    def sync(self, source: Path, destination: Path, manifest: dict, key=None, exclude: list = None):
+        """
+        Merge source into destination, mirroring 'rsync -r -a' without its scan of source
+
+        Source entries are taken from manifest (see tree_manifest()), files matching in
+        size and modification time are skipped. Contents are only compared for files
+        matching in size alone. An interrupted sync thus resumes where it stopped,
+        as partially written files fail both checks.
+
+        Parameters:
+            manifest (dict): tree_manifest() of source
+            exclude (list):  Paths relative to destination to leave untouched, along with their contents
+        """
+
+        key = self._queue(key, destination, None)
+        exclude = set(exclude or [])
+        try:
+            for relative, record in manifest.items():
+                if self._excluded(relative, exclude):
+                    continue
+                target = destination / relative
+                if record["Type"] == "Link":
+                    if target.is_symlink() and os.readlink(target) == record["Target"]:
+                        continue
+                    self._remove(key, target)
+                    os.symlink(record["Target"], target)
+                    self._results[key].changed = True
+                elif record["Type"] == "Folder":
+                    if target.is_symlink() or (target.exists() and not target.is_dir()):
+                        self._remove(key, target)
+                    if not target.is_dir():
+                        target.mkdir()
+                        self._results[key].changed = True
+                    self._sync_attributes(target, record["Mode"])
+                else:
+                    self._pending[key].append(self._submit(self._sync_file, key, source / relative, target, record))
+        except OSError as e:
+            self._results[key].errors.append(self._format_error(e))
+
+
+    def wait(self) -> dict:
+        """
+        Wait for queued copies, returning key to CopyResult
+        """
+
+        results = self._results
+        for key, futures in self._pending.items():
+            for future in futures:
+                try:
+                    future.result()
+                except OSError as e:
+                    results[key].errors.append(self._format_error(e))
+        self._pending = {}
+        self._results = {}
+        self._manifests = {}
+        return results
+
+
+    def set_permissions(self, path: Path) -> list:
+        """
+        Mirrors 'chmod -Rf' and 'chown -Rf', returning errors
+
+        Like chmod/chown -R, links themselves are left as is
+        """
+
+        paths = [path]
+        if path.is_dir() and not path.is_symlink():
+            for root, folders, files in os.walk(path):
+                paths += [Path(root) / entry for entry in folders + files]
+
+        errors = []
+        for entry in paths:
+            if entry.is_symlink():
+                continue
+            try:
+                self._apply_attributes(entry)
+            except OSError as e:
+                errors.append(f"{entry}: {e.strerror}")
+        return errors
+
+
+    def _queue(self, key, destination: Path, manifest: Optional[dict]):
+        key = destination if key is None else key
+        self._pending.setdefault(key, [])
+        self._results[key] = CopyResult()
+        self._manifests[key] = (destination, manifest or {})
+        return key
+
+
+    def _copy_entry(self, key, source: Path, destination: Path, merge: bool):
+        if source.is_symlink():
+            if destination.is_symlink() and os.readlink(destination) == os.readlink(source):
+                return
+            self._remove(key, destination)
+            os.symlink(os.readlink(source), destination)
+            self._results[key].changed = True
+            return
+
+        if not source.is_dir():
+            if destination.is_dir() and not destination.is_symlink():
+                self._remove(key, destination)
+            self._pending[key].append(self._submit(self._copy_file, key, source, destination, merge))
+            return
+
+        if destination.is_symlink() or (destination.exists() and not destination.is_dir()):
+            self._remove(key, destination)
+        if not destination.is_dir():
+            destination.mkdir()
+            self._results[key].changed = True
+        copy_metadata(source, destination)
+        self._apply_attributes(destination)
+
+        source_entries = set()
+        for entry in source.iterdir():
+            source_entries.add(entry.name)
+            self._copy_entry(key, entry, destination / entry.name, merge)
+
+        if merge is True:
+            # Previously covered by the recursive chmod/chown following rsync
+            for entry in destination.iterdir():
+                if entry.name not in source_entries:
+                    errors = self.set_permissions(entry)
+                    if errors:
+                        raise PermissionError(", ".join(errors))
+            shutil.copystat(source, destination)
+            self._apply_attributes(destination)
+        else:
+            # Differential copies keep the destination, drop what 'rm -R' would have
+            for entry in destination.iterdir():
+                if entry.name not in source_entries:
+                    self._remove(key, entry)
+
+
+    def _excluded(self, relative: str, exclude: set) -> bool:
+        if not exclude:
+            return False
+        parts = relative.split("/")
+        return any("/".join(parts[:index]) in exclude for index in range(1, len(parts) + 1))
+
+
+    def _sync_file(self, key, source: Path, destination: Path, record: dict):
+        try:
+            destination_stat = destination.lstat()
+        except FileNotFoundError:
+            destination_stat = None
+
+        if destination_stat is not None and stat.S_ISREG(destination_stat.st_mode) and destination_stat.st_size == record["Size"]:
+            if destination_stat.st_mtime_ns != record["Modified"]:
+                if _same_contents(source, destination) is False:
+                    destination_stat = None
+                else:
+                    # Same contents, only restore the time rsync would have kept
+                    os.utime(destination, ns=(destination_stat.st_atime_ns, record["Modified"]))
+            if destination_stat is not None:
+                self._sync_attributes(destination, record["Mode"])
+                return
+
+        if destination.is_dir() and not destination.is_symlink():
+            shutil.rmtree(destination)
+        elif destination.exists() or destination.is_symlink():
+            destination.unlink()
+        with open(source, "rb") as source_file:
+            destination_descriptor = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, record["Mode"])
+            with open(destination_descriptor, "wb") as destination_file:
+                self._copy_contents(source_file, destination_file, record["Size"])
+                self._apply_attributes(destination_descriptor, record["Mode"])
+                # Set last, an interrupted copy must not pass for a complete one
+                os.utime(destination_descriptor, ns=(record["Modified"], record["Modified"]))
+        self._results[key].changed = True
+
+
+    def _sync_attributes(self, path: Path, mode: int):
+        path_stat = path.lstat()
+        if stat.S_IMODE(path_stat.st_mode) == mode and (self.owner is None or (path_stat.st_uid, path_stat.st_gid) == self.owner):
+            return
+        self._apply_attributes(path, mode)
+
+
+    def _remove(self, key, path: Path):
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        elif path.exists() or path.is_symlink():
+            path.unlink()
+        else:
+            return
+        self._results[key].changed = True
+
+
+    def _format_error(self, error: OSError) -> str:
+        if error.filename and error.strerror:
+            return f"{error.filename}: {error.strerror}"
+        return str(error)
+
+
+    def _submit(self, function, *args) -> concurrent.futures.Future:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor.submit(function, *args)
+
+
+    def _copy_file(self, key, source: Path, destination: Path, preserve_times: bool):
+        root, previous_manifest = self._manifests[key]
+        relative = str(destination.relative_to(root)) if destination != root else "."
+
+        with open(source, "rb") as source_file:
+            source_size = os.fstat(source_file.fileno()).st_size
+
+            # Only read the source when the destination still matches the last copy, files to copy are hashed while copying
+            record = previous_manifest.get(relative)
+            if record is not None and record["Size"] == source_size and self._matches_record(destination, record):
+                source_hash = hashlib.sha256()
+                while block := source_file.read(COPY_BLOCK_SIZE):
+                    source_hash.update(block)
+                if source_hash.hexdigest() == record["Hash"]:
+                    # Unchanged since the last copy, still reassert mode and ownership
+                    self._apply_attributes(destination)
+                    self._results[key].manifest[relative] = record
+                    return
+                source_file.seek(0)
+
+            # Unlink rather than truncate, like rsync, so binaries mapped by running processes stay intact
+            if destination.exists() or destination.is_symlink():
+                destination.unlink()
+            source_hash = hashlib.sha256()
+            destination_descriptor = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, self.mode)
+            with open(destination_descriptor, "wb") as destination_file:
+                self._copy_contents(source_file, destination_file, source_size, source_hash)
+                copy_metadata(source_file.fileno(), destination_descriptor)
+                self._apply_attributes(destination_descriptor)
+                if preserve_times is True:
+                    source_stat = os.fstat(source_file.fileno())
+                    os.utime(destination_descriptor, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+                destination_stat = os.fstat(destination_descriptor)
+
+        self._results[key].manifest[relative] = {"Size": destination_stat.st_size, "Modified": destination_stat.st_mtime_ns, "Hash": source_hash.hexdigest()}
+        self._results[key].changed = True
+
+
+    def _matches_record(self, destination: Path, record: dict) -> bool:
+        if destination.is_symlink():
+            return False
+        try:
+            destination_stat = destination.stat()
+        except FileNotFoundError:
+            return False
+        return (destination_stat.st_size, destination_stat.st_mtime_ns) == (record["Size"], record["Modified"])
+
+
+    def _copy_contents(self, source_file, destination_file, size: int, file_hash=None):
+        """
+        Copy size bytes, updating file_hash (hashlib object) in the same pass if given
+
+        Hashing needs the contents in userspace, thus skips the in-kernel copies
+        """
+
+        if file_hash is not None:
+            while block := source_file.read(COPY_BLOCK_SIZE):
+                file_hash.update(block)
+                destination_file.write(block)
+            # Flush before callers set times or record the size
+            destination_file.flush()
+            return
+
+        source_descriptor = source_file.fileno()
+        destination_descriptor = destination_file.fileno()
+
+        # In-kernel copies, macOS only supports sendfile() to sockets
+        if hasattr(os, "copy_file_range") or sys.platform == "linux":
+            offset = 0
+            try:
+                while offset < size:
+                    if hasattr(os, "copy_file_range"):
+                        copied = os.copy_file_range(source_descriptor, destination_descriptor, min(COPY_BLOCK_SIZE, size - offset))
+                    else:
+                        copied = os.sendfile(destination_descriptor, source_descriptor, offset, min(COPY_BLOCK_SIZE, size - offset))
+                    if copied == 0:
+                        break
+                    offset += copied
+                return
+            except OSError:
+                # ie. cross-filesystem copies on older kernels, restart with a plain copy
+                if offset != 0:
+                    source_file.seek(0)
+                    destination_file.seek(0)
+                    destination_file.truncate()
+
+        shutil.copyfileobj(source_file, destination_file, COPY_BLOCK_SIZE)
+        destination_file.flush()
+
+
+    def _apply_attributes(self, path, mode: int = None):
+        """
+        Set mode (default self.mode) and ownership, path being a Path or file descriptor
+        """
+
+        os.chmod(path, self.mode if mode is None else mode)
+        if self.owner is not None:
+            os.chown(path, *self.owner)
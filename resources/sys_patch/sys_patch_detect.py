@@ -3,6 +3,7 @@
 # Used when supplying data to sys_patch.py
 # Copyright (C) 2020-2022, Dhinak G, Mykola Grymalyuk
 
+import copy
 import plistlib
 import logging
 import py_sip_xnu
@@ -16,11 +17,11 @@ from resources import (
     network_handler,
     kdk_handler
 )
+from resources.sys_patch import sys_patch_plan
 from data import (
     model_array,
     os_data,
     sip_data,
-    sys_patch_dict,
     smbios_data,
     cpu_data
 )
@@ -83,6 +84,9 @@ class DetectRootPatch:
         self.missing_nv_web_opengl  = False
         self.missing_nv_compat      = False
 
+        # Whether the booted host is the machine being detected (see detect_hardware_patch_set())
+        self.inspect_host = True
+
 
     def _detect_gpus(self):
         """
@@ -243,6 +247,9 @@ class DetectRootPatch:
         if self.constants.detected_os <= os_data.os_data.monterey:
             # Always assume Root KC requirement on Monterey and older
             self.requires_root_kc = True
+        elif self.inspect_host is False:
+            # KDK and network availability are properties of the host, not the hardware
+            return
         else:
             if self.requires_root_kc is True:
                 self.missing_kdk = not self._check_kdk()
@@ -322,7 +329,7 @@ class DetectRootPatch:
 
         # If GFX0 is missing, assume machine was demuxed
         # -wegnoegpu would also trigger this, so ensure arg is not present
-        if not "-wegnoegpu" in (utilities.get_nvram("boot-args", decode=True) or ""):
+        if self.inspect_host is False or not "-wegnoegpu" in (utilities.get_nvram("boot-args", decode=True) or ""):
             igpu = self.constants.computer.igpu
             dgpu = self._check_dgpu_status()
             if igpu and not dgpu:
@@ -514,6 +521,51 @@ class DetectRootPatch:
 
         self.has_network = network_handler.NetworkUtilities().verify_network_connection()
 
+        self._detect_hardware()
+
+        self.root_patch_dict = {
+            **self._hardware_patch_dict(),
+            "Settings: Kernel Debug Kit missing":          self.missing_kdk if self.constants.detected_os >= os_data.os_data.ventura.value else False,
+            "Validation: Patching Possible":               self.verify_patch_allowed(),
+            "Validation: Unpatching Possible":             self._verify_unpatch_allowed(),
+            f"Validation: SIP is enabled (Required: {self._check_sip()[2]} or higher)":  self.sip_enabled,
+            f"Validation: Currently Booted SIP: ({hex(py_sip_xnu.SipXnu().get_sip_status().value)})":         self.sip_enabled,
+            "Validation: SecureBootModel is enabled":      self.sbm_enabled,
+            f"Validation: {'AMFI' if self.constants.host_is_hackintosh is True or self._get_amfi_level_needed() > 2 else 'Library Validation'} is enabled":                 self.amfi_enabled if self.amfi_must_disable is True else False,
+            "Validation: FileVault is enabled":            self.fv_enabled,
+            "Validation: System is dosdude1 patched":      self.dosdude_patched,
+            "Validation: WhateverGreen.kext missing":      self.missing_whatever_green if self.nvidia_web is True else False,
+            "Validation: Force OpenGL property missing":   self.missing_nv_web_opengl  if self.nvidia_web is True else False,
+            "Validation: Force compat property missing":   self.missing_nv_compat      if self.nvidia_web is True else False,
+            "Validation: nvda_drv(_vrl) variable missing": self.missing_nv_web_nvram   if self.nvidia_web is True else False,
+            "Validation: Network Connection Required":     (not self.has_network) if (self.requires_root_kc and self.missing_kdk and self.constants.detected_os >= os_data.os_data.ventura.value) else False,
+        }
+
+        return self.root_patch_dict
+
+
+    def detect_hardware_patch_set(self):
+        """
+        Query patch sets required by the hardware alone
+
+        The booted host isn't inspected (SIP, KDKs, loaded kexts, NVRAM, network),
+        thus usable for recorded probes of other machines, see fleet_report.py
+        Targets self.constants.detected_os
+
+        Returns:
+            dict: Dictionary of patch sets, without validation entries
+        """
+
+        self.inspect_host = False
+        self._detect_hardware()
+        return self._hardware_patch_dict()
+
+
+    def _detect_hardware(self):
+        """
+        Set flags for all patches applicable to self.computer
+        """
+
         if self._check_uhci_ohci() is True:
             self.legacy_uhci_ohci = True
             self.requires_root_kc = True
@@ -522,7 +574,7 @@ class DetectRootPatch:
             if self.constants.detected_os > os_data.os_data.catalina:
                 self.brightness_legacy = True
 
-        if self.model in ["iMac7,1", "iMac8,1"] or (self.model in model_array.LegacyAudio and utilities.check_kext_loaded("AppleALC", self.constants.detected_os) is False):
+        if self.model in ["iMac7,1", "iMac8,1"] or (self.model in model_array.LegacyAudio and (self.inspect_host is False or utilities.check_kext_loaded("AppleALC", self.constants.detected_os) is False)):
             # Special hack for systems with botched GOPs
             # TL;DR: No Boot Screen breaks Lilu, therefore breaking audio
             if self.constants.detected_os > os_data.os_data.catalina:
@@ -554,7 +606,9 @@ class DetectRootPatch:
 
         self._detect_gpus()
 
-        self.root_patch_dict = {
+
+    def _hardware_patch_dict(self):
+        return {
             "Graphics: Nvidia Tesla":                      self.nvidia_tesla,
             "Graphics: Nvidia Kepler":                     self.kepler_gpu,
             "Graphics: Nvidia Web Drivers":                self.nvidia_web,
@@ -577,24 +631,8 @@ class DetectRootPatch:
             "Miscellaneous: Legacy USB 1.1":               self.legacy_uhci_ohci,
             "Settings: Requires AMFI exemption":           self.amfi_must_disable,
             "Settings: Supports Auxiliary Cache":          not self.requires_root_kc,
-            "Settings: Kernel Debug Kit missing":          self.missing_kdk if self.constants.detected_os >= os_data.os_data.ventura.value else False,
-            "Validation: Patching Possible":               self.verify_patch_allowed(),
-            "Validation: Unpatching Possible":             self._verify_unpatch_allowed(),
-            f"Validation: SIP is enabled (Required: {self._check_sip()[2]} or higher)":  self.sip_enabled,
-            f"Validation: Currently Booted SIP: ({hex(py_sip_xnu.SipXnu().get_sip_status().value)})":         self.sip_enabled,
-            "Validation: SecureBootModel is enabled":      self.sbm_enabled,
-            f"Validation: {'AMFI' if self.constants.host_is_hackintosh is True or self._get_amfi_level_needed() > 2 else 'Library Validation'} is enabled":                 self.amfi_enabled if self.amfi_must_disable is True else False,
-            "Validation: FileVault is enabled":            self.fv_enabled,
-            "Validation: System is dosdude1 patched":      self.dosdude_patched,
-            "Validation: WhateverGreen.kext missing":      self.missing_whatever_green if self.nvidia_web is True else False,
-            "Validation: Force OpenGL property missing":   self.missing_nv_web_opengl  if self.nvidia_web is True else False,
-            "Validation: Force compat property missing":   self.missing_nv_compat      if self.nvidia_web is True else False,
-            "Validation: nvda_drv(_vrl) variable missing": self.missing_nv_web_nvram   if self.nvidia_web is True else False,
-            "Validation: Network Connection Required":     (not self.has_network) if (self.requires_root_kc and self.missing_kdk and self.constants.detected_os >= os_data.os_data.ventura.value) else False,
         }
 
-        return self.root_patch_dict
-
 
     def _get_amfi_level_needed(self):
         """
@@ -738,7 +776,8 @@ class DetectRootPatch:
             dict: Dictionary of patches to be applied from sys_patch_dict.py
         """
 
-        all_hardware_patchset: dict = sys_patch_dict.SystemPatchDictionary(self.constants.detected_os, self.constants.detected_os_minor, self.constants.legacy_accel_support)
+        plan:                  sys_patch_plan.SysPatchPlan = sys_patch_plan.SysPatchPlan.for_os(self.constants.detected_os, self.constants.detected_os_minor, self.constants.legacy_accel_support)
+        all_hardware_patchset: dict = plan.dictionary  # Shared with the plan, copy entries before editing
         required_patches:      dict = {}
 
         utilities.cls()
@@ -824,6 +863,7 @@ class DetectRootPatch:
             if self.constants.allow_ts2_accel is False or self.constants.detected_os not in self.constants.legacy_accel_support:
                 # TeraScale 2 MacBooks with faulty GPUs are highly prone to crashing with AMDRadeonX3000 attached
                 # Additionally, AMDRadeonX3000 requires IOAccelerator downgrade which is not installed without 'Non-Metal IOAccelerator Common'
+                required_patches["AMD TeraScale 2"] = copy.deepcopy(required_patches["AMD TeraScale 2"])
                 del(required_patches["AMD TeraScale 2"]["Install"]["/System/Library/Extensions"]["AMDRadeonX3000.kext"])
 
         if hardware_details["Graphics: AMD Legacy GCN"] is True or hardware_details["Graphics: AMD Legacy Polaris"] is True:
@@ -868,16 +908,12 @@ class DetectRootPatch:
             required_patches.update({"Legacy USB 1.1": all_hardware_patchset["Miscellaneous"]["Legacy USB 1.1"]})
 
         if required_patches:
-            host_os_float = float(f"{self.constants.detected_os}.{self.constants.detected_os_minor}")
-
             # Prioritize Monterey GVA patches
             if "Catalina GVA" in required_patches and "Monterey GVA" in required_patches:
                 del(required_patches["Catalina GVA"])
 
             for patch_name in list(required_patches):
-                patch_os_min_float = float(f'{required_patches[patch_name]["OS Support"]["Minimum OS Support"]["OS Major"]}.{required_patches[patch_name]["OS Support"]["Minimum OS Support"]["OS Minor"]}')
-                patch_os_max_float = float(f'{required_patches[patch_name]["OS Support"]["Maximum OS Support"]["OS Major"]}.{required_patches[patch_name]["OS Support"]["Maximum OS Support"]["OS Minor"]}')
-                if (host_os_float < patch_os_min_float or host_os_float > patch_os_max_float):
+                if not plan.patch_sets[patch_name].supports(self.constants.detected_os, self.constants.detected_os_minor):
                     del(required_patches[patch_name])
                 else:
                     if required_patches[patch_name]["Display Name"]:
@@ -0,0 +1,186 @@
+# Flattened root patch operations, compiled from data/sys_patch_dict.py
+
+import enum
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+
+from data import sys_patch_dict, os_data
+
+
+# Compiled SystemPatchDictionary per (os_major, os_minor, non_metal_os_support)
+_compiled_plans: dict = {}
+
+
+class OperationKind(enum.Enum):
+    # Values match sys_patch_dict's keys
+    REMOVE       = "Remove"
+    INSTALL_ROOT = "Install"
+    INSTALL_DATA = "Install Non-Root"
+    PROCESS      = "Processes"
+
+
+@dataclass(frozen=True)
+class PatchOperation:
+    """
+    Single step of a root patch
+
+    Paths are relative, as the payload and volume mount points are only known when patching:
+        source:    Folder within PatcherSupportPkg's Universal-Binaries, ie. '10.15.7/System/Library/Extensions'
+        directory: Folder on the root or data volume, ie. '/System/Library/Extensions'
+    For processes, 'name' holds the command and 'as_root' whether it requires root
+    """
+
+    kind:      OperationKind
+    patch:     str
+    directory: str = ""
+    name:      str = ""
+    source:    str = ""
+    as_root:   bool = False
+
+    @property
+    def destination(self) -> str:
+        return f"{self.directory}/{self.name}"
+
+
+    def source_folder(self, payload_root: Path) -> str:
+        return f"{payload_root}/{self.source}"
+
+
+    def source_file(self, payload_root: Path) -> str:
+        return f"{payload_root}/{self.source}/{self.name}"
+
+
+@dataclass(frozen=True)
+class PatchSet:
+    name:         str
+    subject:      str
+    display_name: str
+    minimum_os:   tuple
+    maximum_os:   tuple
+    operations:   tuple
+
+    def supports(self, os_major: int, os_minor: int) -> bool:
+        """
+        Whether the patch set applies to the OS, Maximum OS Minor of 99 covering all minors
+        """
+
+        return self.minimum_os <= (os_major, os_minor) <= self.maximum_os
+
+
+class SysPatchPlan:
+    """
+    Flat, ordered list of file operations for a set of root patches
+
+    Each patch set compiles to its removals, root volume installs, data volume
+    installs and processes, in the order sys_patch has always applied them.
+    operations() then flattens the requested patch sets, dropping repeats of an
+    operation whose destination wasn't touched in between (ie. AppleGVACore
+    shared by several GVA patch sets).
+
+    Usage:
+    >>> from resources.sys_patch.sys_patch_plan import SysPatchPlan
+    >>> plan = SysPatchPlan.for_os(self.constants.detected_os, self.constants.detected_os_minor, self.constants.legacy_accel_support)
+    >>> for operation in SysPatchPlan(required_patches).operations(): ...
+    """
+
+    def __init__(self, patchset: dict, subjects: dict = None):
+        """
+        Parameters:
+            patchset (dict): Patch set name to sys_patch_dict entry, ie. generate_patchset()'s result
+            subjects (dict): Patch set name to subject (ie. 'Graphics'), if known
+        """
+
+        self.patchset: dict = patchset
+        self.dictionary: Optional[dict] = None  # Nested SystemPatchDictionary, only set by for_os()
+        self.patch_sets: dict = {
+            name: self._compile_patch_set(name, (subjects or {}).get(name, ""), entry)
+            for name, entry in patchset.items()
+        }
+
+
+    @classmethod
+    def for_os(cls, os_major: int, os_minor: int, non_metal_os_support: list) -> "SysPatchPlan":
+        """
+        Compile SystemPatchDictionary for the OS, memoized as the dictionary only depends on its arguments
+
+        The plan's patchset entries are shared, copy before editing them
+        """
+
+        key = (int(os_major), int(os_minor), tuple(non_metal_os_support))
+        if key not in _compiled_plans:
+            dictionary = sys_patch_dict.SystemPatchDictionary(os_major, os_minor, non_metal_os_support)
+            patchset = {}
+            subjects = {}
+            for subject in dictionary:
+                for name, entry in dictionary[subject].items():
+                    if name in patchset:
+                        raise ValueError(f"Patch set listed under multiple subjects: {name}")
+                    patchset[name] = entry
+                    subjects[name] = subject
+            plan = cls(patchset, subjects)
+            plan.dictionary = dictionary
+            _compiled_plans[key] = plan
+        return _compiled_plans[key]
+
+
+    def operations(self, names: list = None, kinds: list = None) -> list:
+        """
+        Flattened operations of the patch sets (all if None), in order
+
+        Parameters:
+            names (list): Patch set names to include
+            kinds (list): OperationKinds to include
+        """
+
+        operations = []
+        last_operation = {}
+        for name in (self.patch_sets if names is None else names):
+            for operation in self.patch_sets[name].operations:
+                if kinds is not None and operation.kind not in kinds:
+                    continue
+                key = (operation.kind if operation.kind in [OperationKind.INSTALL_DATA, OperationKind.PROCESS] else OperationKind.INSTALL_ROOT, operation.destination)
+                previous: Optional[PatchOperation] = last_operation.get(key)
+                if previous is not None and (previous.kind, previous.source, previous.as_root) == (operation.kind, operation.source, operation.as_root):
+                    continue
+                last_operation[key] = operation
+                operations.append(operation)
+        return operations
+
+
+    def installs(self, names: list = None) -> list:
+        return self.operations(names, [OperationKind.INSTALL_ROOT, OperationKind.INSTALL_DATA])
+
+
+    def supported(self, os_major: int, os_minor: int) -> list:
+        """
+        Names of patch sets applying to the OS
+        """
+
+        return [name for name, patch_set in self.patch_sets.items() if patch_set.supports(os_major, os_minor)]
+
+
+    def _compile_patch_set(self, name: str, subject: str, entry: dict) -> PatchSet:
+        operations = []
+        for directory, files in entry.get(OperationKind.REMOVE.value, {}).items():
+            for file in files:
+                operations.append(PatchOperation(OperationKind.REMOVE, name, directory, file))
+        for kind in [OperationKind.INSTALL_ROOT, OperationKind.INSTALL_DATA]:
+            for directory, files in entry.get(kind.value, {}).items():
+                for file, version in files.items():
+                    operations.append(PatchOperation(kind, name, directory, file, f"{version}{directory}"))
+        for process, as_root in entry.get(OperationKind.PROCESS.value, {}).items():
+            operations.append(PatchOperation(OperationKind.PROCESS, name, name=process, as_root=as_root))
+
+        os_support = entry.get("OS Support", {})
+        minimum = os_support.get("Minimum OS Support", {})
+        maximum = os_support.get("Maximum OS Support", {})
+        return PatchSet(
+            name=name,
+            subject=subject,
+            display_name=entry.get("Display Name", ""),
+            minimum_os=(minimum.get("OS Major", 0), minimum.get("OS Minor", 0)),
+            maximum_os=(maximum.get("OS Major", os_data.os_data.max_os), maximum.get("OS Minor", 99)),
+            operations=tuple(operations),
+        )
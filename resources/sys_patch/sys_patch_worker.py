@@ -0,0 +1,292 @@
+# Long-lived privileged worker applying batches of root patch file operations
+
+import sys
+import json
+import enum
+import shutil
+import logging
+import argparse
+import subprocess
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Optional
+
+from resources.sys_patch import sys_patch_copy
+
+
+# Argument launching the worker from the frozen application, see OpenCore-Patcher-GUI.command
+WORKER_ARGUMENT = "--sys_patch_worker"
+
+
+class FileOperationKind(enum.Enum):
+    REMOVE         = "Remove"          # rm -Rf
+    COPY           = "Copy"            # rm -R + cp -R, replacing the destination, with Permissions applied
+    MERGE          = "Merge"           # rsync -r -a, used for frameworks, with Permissions applied
+    SYNC           = "Sync"            # rsync -r -a, keeping the source's modes, used for KDKs
+    PERMISSIONS    = "Permissions"     # chmod -Rf 755 + chown -Rf root:wheel
+    MAKE_DIRECTORY = "Make Directory"  # mkdir -p
+
+
+@dataclass
+class FileOperation:
+    """
+    Single file operation
+
+    'path' is the full destination (ie. '/System/Library/Extensions/GeForce.kext'),
+    'source' the full file to copy or merge from.
+    Failed operations only abort patching if 'check' is set.
+    Copies and merges given the 'manifest' of the last copy to 'path' only rewrite differing files.
+    Syncs require the source's sys_patch_copy.tree_manifest() as 'manifest', and skip 'exclude'd paths.
+    """
+
+    kind:     FileOperationKind
+    path:     str
+    source:   Optional[str] = None
+    check:    bool = True
+    manifest: Optional[dict] = None
+    exclude:  Optional[list] = None
+
+
+@dataclass
+class FileOperationResult:
+    """
+    'changed' is set if the operation modified the destination,
+    'manifest' holds the files written by copies and merges, see sys_patch_copy.CopyResult
+    """
+
+    operation: FileOperation
+    success:   bool
+    error:     str = ""
+    changed:   bool = False
+    manifest:  Optional[dict] = None
+
+
+class FileOperationWorker:
+    """
+    Runs root patch file operations in a single long-lived privileged process
+
+    Replaces one sudo subprocess per rm, cp, chmod and chown with one worker
+    receiving batches over a pipe, applying them with native syscalls and
+    reporting each operation's result.
+
+    With a scratch root, the worker runs unprivileged and refuses destinations
+    outside of the scratch folder, allowing its file operations to be exercised
+    on any host (see validation.PatcherValidation). Ownership changes are skipped
+    in this mode. Root patching itself always runs the privileged worker.
+
+    Usage:
+    >>> from resources.sys_patch.sys_patch_worker import FileOperationWorker, FileOperation, FileOperationKind
+    >>> with FileOperationWorker() as worker:
+    >>>     worker.run([FileOperation(FileOperationKind.REMOVE, "/System/Library/Extensions/GeForce.kext")])
+    """
+
+    def __init__(self, scratch_root: Path = None, copy_threads: int = None):
+        """
+        Parameters:
+            scratch_root (Path): Run unprivileged, confined to this folder
+            copy_threads (int):  Concurrent file copies, see sys_patch_copy.copy_threads_for_disk()
+        """
+
+        self.scratch_root: Optional[Path] = Path(scratch_root) if scratch_root else None
+        self.copy_threads: Optional[int] = copy_threads
+        self.process: Optional[subprocess.Popen] = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+    def start(self):
+        if self.process is not None:
+            return
+
+        args = self._worker_command()
+        # When running from source, 'resources' resolves from the repository root
+        kwargs = {"stdin": subprocess.PIPE, "stdout": subprocess.PIPE, "cwd": Path(__file__).parent.parent.parent}
+        if self.copy_threads is not None:
+            args += ["--copy_threads", str(self.copy_threads)]
+        if self.scratch_root is not None:
+            args += ["--scratch", str(self.scratch_root)]
+            self.process = subprocess.Popen(args, **kwargs)
+        else:
+            # Keep the worker's own imports minimal, utilities pulls in the full patcher
+            from resources import utilities  # pylint: disable=import-outside-toplevel
+            self.process = utilities.elevated_popen(args, **kwargs)
+
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+    def run(self, operations: list) -> list:
+        """
+        Apply a batch of FileOperations in order, returning a FileOperationResult per operation
+        """
+
+        if not operations:
+            return []
+        self.start()
+
+        request = {"Batch": [{"Kind": operation.kind.value, "Path": operation.path, "Source": operation.source, "Manifest": operation.manifest, "Exclude": operation.exclude} for operation in operations]}
+        try:
+            self.process.stdin.write(json.dumps(request).encode() + b"\n")
+            self.process.stdin.flush()
+            response = self.process.stdout.readline()
+        except OSError as e:
+            raise Exception(f"Root patch worker exited unexpectedly: {e}")
+        if not response:
+            raise Exception(f"Root patch worker exited unexpectedly with code {self.process.poll()}")
+
+        results = json.loads(response)["Results"]
+        return [
+            FileOperationResult(operation, result["Success"], result["Error"], result["Changed"], result.get("Manifest"))
+            for operation, result in zip(operations, results)
+        ]
+
+
+    def _worker_command(self) -> list:
+        if getattr(sys, "frozen", False):
+            return [sys.executable, WORKER_ARGUMENT]
+        return [sys.executable, "-m", "resources.sys_patch.sys_patch_worker", WORKER_ARGUMENT]
+
+
+class _FileOperationServer:
+    """
+    Worker side, reads one JSON request per line from stdin and answers on stdout
+    """
+
+    def __init__(self, scratch_root: Path = None, copy_threads: int = None):
+        self.scratch_root: Optional[Path] = Path(scratch_root).resolve() if scratch_root else None
+        self.engine: sys_patch_copy.CopyEngine = sys_patch_copy.CopyEngine(
+            max_workers=copy_threads or sys_patch_copy.SOLID_STATE_COPY_THREADS,
+            # Ownership changes require root
+            owner=None if self.scratch_root else (0, 0),
+        )
+
+
+    def serve(self, requests, responses):
+        with self.engine:
+            for line in requests:
+                if not line.strip():
+                    continue
+                batch = [
+                    (FileOperationKind(entry["Kind"]), entry["Path"], entry["Source"], entry["Manifest"], entry["Exclude"])
+                    for entry in json.loads(line)["Batch"]
+                ]
+                responses.write(json.dumps({"Results": self._apply_batch(batch)}).encode() + b"\n")
+                responses.flush()
+
+
+    def _apply_batch(self, batch: list) -> list:
+        """
+        Apply operations in order, consecutive copies and merges running concurrently
+        """
+
+        results = [None] * len(batch)
+        queued_copies = {}
+        for index, (kind, path, source, manifest, exclude) in enumerate(batch):
+            is_copy = kind in [FileOperationKind.COPY, FileOperationKind.MERGE, FileOperationKind.SYNC]
+            if is_copy is False or self._overlaps(path, queued_copies):
+                self._wait_for_copies(queued_copies, results)
+            if is_copy is False:
+                results[index] = self._apply(kind, path)
+                continue
+            try:
+                self._queue_copy(index, kind, path, source, manifest, exclude)
+                queued_copies[index] = path
+            except Exception as e:
+                results[index] = {"Success": False, "Error": f"{type(e).__name__}: {e}", "Changed": False}
+
+        self._wait_for_copies(queued_copies, results)
+        return results
+
+
+    def _overlaps(self, path: str, queued_copies: dict) -> bool:
+        # Copies into the same tree must not race each other
+        for queued_path in queued_copies.values():
+            if path == queued_path or path.startswith(queued_path + "/") or queued_path.startswith(path + "/"):
+                return True
+        return False
+
+
+    def _queue_copy(self, index: int, kind: FileOperationKind, path: str, source: str, manifest: Optional[dict], exclude: Optional[list]):
+        path = self._confine(path)
+        if kind == FileOperationKind.COPY:
+            self.engine.copy(Path(source), path, key=index, manifest=manifest)
+        elif kind == FileOperationKind.MERGE:
+            self.engine.merge(Path(source), path, key=index, manifest=manifest)
+        else:
+            self.engine.sync(Path(source), path, manifest, key=index, exclude=exclude)
+
+
+    def _wait_for_copies(self, queued_copies: dict, results: list):
+        if not queued_copies:
+            return
+        for index, result in self.engine.wait().items():
+            results[index] = {"Success": not result.errors, "Error": ", ".join(result.errors), "Changed": result.changed, "Manifest": result.manifest}
+        queued_copies.clear()
+
+
+    def _apply(self, kind: FileOperationKind, path: str) -> dict:
+        changed = False
+        try:
+            path = self._confine(path)
+            if kind == FileOperationKind.REMOVE:
+                changed = path.exists() or path.is_symlink()
+                self._remove(path)
+            elif kind == FileOperationKind.PERMISSIONS:
+                errors = self.engine.set_permissions(path)
+                if errors:
+                    raise PermissionError(", ".join(errors))
+            elif kind == FileOperationKind.MAKE_DIRECTORY:
+                changed = not path.is_dir()
+                path.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            return {"Success": False, "Error": f"{type(e).__name__}: {e}", "Changed": changed}
+        return {"Success": True, "Error": "", "Changed": changed}
+
+
+    def _confine(self, path: str) -> Path:
+        path = Path(path)
+        if self.scratch_root is None:
+            return path
+        # Resolve the parent only, the destination itself may be a link to be replaced
+        resolved = path.parent.resolve() / path.name
+        if self.scratch_root not in resolved.parents:
+            raise PermissionError(f"{path} is outside of the scratch root")
+        return resolved
+
+
+    def _remove(self, path: Path):
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        elif path.exists() or path.is_symlink():
+            path.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Root patch file operation worker")
+    parser.add_argument(WORKER_ARGUMENT, action="store_true", required=False)
+    parser.add_argument("--scratch", type=str, required=False)
+    parser.add_argument("--copy_threads", type=int, required=False)
+    args, _ = parser.parse_known_args()
+
+    logging.disable(logging.CRITICAL)
+    _FileOperationServer(args.scratch, args.copy_threads).serve(sys.stdin.buffer, sys.stdout.buffer)
+
+
+if __name__ == "__main__":
+    main()
@@ -480,6 +480,14 @@ def elevated(*args, **kwargs) -> subprocess.CompletedProcess:
         return subprocess.run(["sudo"] + [args[0][0]] + args[0][1:], **kwargs)
 
 
+def elevated_popen(*args, **kwargs) -> subprocess.Popen:
+    # Long-lived variant of elevated(), ie. for sys_patch_worker
+    if os.getuid() == 0 or check_cli_args() is not None:
+        return subprocess.Popen(*args, **kwargs)
+    else:
+        return subprocess.Popen(["sudo"] + [args[0][0]] + args[0][1:], **kwargs)
+
+
 def check_cli_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--build", help="Build OpenCore", action="store_true", required=False)
@@ -498,6 +506,9 @@ def check_cli_args():
     parser.add_argument("--moderate_smbios", help="Moderate SMBIOS Patching", action="store_true", required=False)
     parser.add_argument("--disable_tb", help="Disable Thunderbolt on 2013-2014 MacBook Pros", action="store_true", required=False)
     parser.add_argument("--force_surplus", help="Force SurPlus in all newer OSes", action="store_true", required=False)
+    parser.add_argument("--config_only", help="Only generate config.plist, skipping EFI files", action="store_true", required=False)
+    parser.add_argument("--efi_archive", help="Write the built EFI straight into a zip", action="store_true", required=False)
+    parser.add_argument("--reprobe", help="Ignore the cached hardware probe of this boot session", action="store_true", required=False)
 
     # Building args requiring value values (ie. --model iMac12,2)
     parser.add_argument("--model", action="store", help="Set custom model", required=False)
@@ -1,11 +1,12 @@
 import logging
+import tempfile
 import subprocess
 from pathlib import Path
 
-from resources.sys_patch import sys_patch_helpers
-from resources.build import build
-from resources import constants
-from data import example_data, model_array, sys_patch_dict, os_data
+from resources.sys_patch import sys_patch_helpers, sys_patch_plan, sys_patch_worker
+from resources.build import engine
+from resources import constants, pci_index
+from data import example_data, model_array, os_data
 
 
 class PatcherValidation:
@@ -50,6 +51,7 @@ class PatcherValidation:
             example_data.MacBookPro.MacBookPro141_SSD_Upgrade,
         ]
 
+        self._validate_pci_indexes()
         self._validate_configs()
         self._validate_sys_patch()
 
@@ -57,40 +59,31 @@ class PatcherValidation:
     def _build_prebuilt(self):
         """
         Generate a build for each predefined model
-        Then validate against ocvalidate
+        Then validate against OpenCore's config schema and ocvalidate
         """
 
-        for model in model_array.SupportedSMBIOS:
-            logging.info(f"Validating predefined model: {model}")
-            self.constants.custom_model = model
-            build.build_opencore(self.constants.custom_model, self.constants).build_opencore()
-            result = subprocess.run([self.constants.ocvalidate_path, f"{self.constants.opencore_release_folder}/EFI/OC/config.plist"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            if result.returncode != 0:
-                logging.info("Error on build!")
-                logging.info(result.stdout.decode())
-                raise Exception(f"Validation failed for predefined model: {model}")
-            else:
-                logging.info(f"Validation succeeded for predefined model: {model}")
+        self._build_jobs([engine.BuildJob(model) for model in model_array.SupportedSMBIOS], "predefined model")
 
 
     def _build_dumps(self):
         """
         Generate a build for each predefined model
-        Then validate against ocvalidate
+        Then validate against OpenCore's config schema and ocvalidate
         """
 
-        for model in self.valid_dumps:
-            self.constants.computer = model
-            self.constants.custom_model = ""
-            logging.info(f"Validating dumped model: {self.constants.computer.real_model}")
-            build.build_opencore(self.constants.computer.real_model, self.constants).build_opencore()
-            result = subprocess.run([self.constants.ocvalidate_path, f"{self.constants.opencore_release_folder}/EFI/OC/config.plist"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            if result.returncode != 0:
-                logging.info("Error on build!")
-                logging.info(result.stdout.decode())
-                raise Exception(f"Validation failed for predefined model: {self.constants.computer.real_model}")
-            else:
-                logging.info(f"Validation succeeded for predefined model: {self.constants.computer.real_model}")
+        self._build_jobs([engine.BuildJob(model.real_model, computer=model, external=False) for model in self.valid_dumps], "dumped model")
+
+
+    def _build_jobs(self, jobs: list, job_type: str):
+        """
+        Build and validate jobs in parallel, raising once all builds have finished
+        """
+
+        report = engine.BuildEngine(self.constants, validator=engine.validate_build).build(jobs)
+        if report.failures:
+            for result in report.failures:
+                logging.info(f"Validation failed for {job_type}: {result.job.model}")
+            raise Exception(f"Validation failed for {job_type}s: {', '.join(result.job.model for result in report.failures)}")
 
 
     def _validate_root_patch_files(self, major_kernel, minor_kernel):
@@ -98,23 +91,14 @@ class PatcherValidation:
         Validate that all files in the patchset are present in the payload
         """
 
-        patchset = sys_patch_dict.SystemPatchDictionary(major_kernel, minor_kernel, self.constants.legacy_accel_support)
-        host_os_float = float(f"{major_kernel}.{minor_kernel}")
-
-        for patch_subject in patchset:
-            for patch_core in patchset[patch_subject]:
-                patch_os_min_float = float(f'{patchset[patch_subject][patch_core]["OS Support"]["Minimum OS Support"]["OS Major"]}.{patchset[patch_subject][patch_core]["OS Support"]["Minimum OS Support"]["OS Minor"]}')
-                patch_os_max_float = float(f'{patchset[patch_subject][patch_core]["OS Support"]["Maximum OS Support"]["OS Major"]}.{patchset[patch_subject][patch_core]["OS Support"]["Maximum OS Support"]["OS Minor"]}')
-                if (host_os_float < patch_os_min_float or host_os_float > patch_os_max_float):
-                    continue
-                for install_type in ["Install", "Install Non-Root"]:
-                    if install_type in patchset[patch_subject][patch_core]:
-                        for install_directory in patchset[patch_subject][patch_core][install_type]:
-                            for install_file in patchset[patch_subject][patch_core][install_type][install_directory]:
-                                source_file = str(self.constants.payload_local_binaries_root_path) + "/" + patchset[patch_subject][patch_core][install_type][install_directory][install_file] + install_directory + "/" + install_file
-                                if not Path(source_file).exists():
-                                    logging.info(f"File not found: {source_file}")
-                                    raise Exception(f"Failed to find {source_file}")
+        plan = sys_patch_plan.SysPatchPlan.for_os(major_kernel, minor_kernel, self.constants.legacy_accel_support)
+        patchset = plan.dictionary
+
+        for operation in plan.installs(plan.supported(major_kernel, minor_kernel)):
+            source_file = operation.source_file(self.constants.payload_local_binaries_root_path)
+            if not Path(source_file).exists():
+                logging.info(f"File not found: {source_file}")
+                raise Exception(f"Failed to find {source_file}")
 
         logging.info(f"- Validating against Darwin {major_kernel}.{minor_kernel}")
         if not sys_patch_helpers.SysPatchHelpers(self.constants).generate_patchset_plist(patchset, f"OpenCore-Legacy-Patcher-{major_kernel}.{minor_kernel}.plist", None):
@@ -124,11 +108,69 @@ class PatcherValidation:
         Path(self.constants.payload_path / f"OpenCore-Legacy-Patcher-{major_kernel}.{minor_kernel}.plist").unlink()
 
 
+    def _validate_file_operations(self):
+        """
+        Validates the root patch file operation worker, confined to a scratch folder
+
+        Runs on any host, as the worker needs no privileges in this mode
+        """
+
+        logging.info("Validating root patch file operations")
+        with tempfile.TemporaryDirectory() as scratch:
+            scratch = Path(scratch)
+            payload = scratch / "Payload"
+            volume  = scratch / "Volume"
+
+            (payload / "Test.kext/Contents/MacOS").mkdir(parents=True)
+            (payload / "Test.kext/Contents/MacOS/Test").write_bytes(b"Test")
+            (payload / "Test.framework/Versions/A").mkdir(parents=True)
+            (payload / "Test.framework/Versions/A/Test").write_bytes(b"Test")
+            (payload / "Test.framework/Versions/Current").symlink_to("A")
+
+            (volume / "Extensions/Stale.kext").mkdir(parents=True)
+            (volume / "Extensions/Test.kext/Contents").mkdir(parents=True)
+            (volume / "Extensions/Test.kext/Contents/Stale").write_bytes(b"Stale")
+            (volume / "Frameworks/Test.framework/Versions/A").mkdir(parents=True)
+            (volume / "Frameworks/Test.framework/Versions/A/Existing").write_bytes(b"Existing")
+
+            operations = [
+                (sys_patch_worker.FileOperation(sys_patch_worker.FileOperationKind.REMOVE, f"{volume}/Extensions/Stale.kext"),                                  True),
+                (sys_patch_worker.FileOperation(sys_patch_worker.FileOperationKind.COPY,   f"{volume}/Extensions/Test.kext", f"{payload}/Test.kext"),           True),
+                (sys_patch_worker.FileOperation(sys_patch_worker.FileOperationKind.MERGE,  f"{volume}/Frameworks/Test.framework", f"{payload}/Test.framework"), True),
+                # Destinations outside of the scratch folder must be refused
+                (sys_patch_worker.FileOperation(sys_patch_worker.FileOperationKind.REMOVE, f"{scratch.parent}/{scratch.name}-Outside"),                          False),
+                (sys_patch_worker.FileOperation(sys_patch_worker.FileOperationKind.COPY,   f"{volume}/../../{scratch.name}-Outside", f"{payload}/Test.kext"),  False),
+            ]
+            with sys_patch_worker.FileOperationWorker(scratch) as worker:
+                results = worker.run([operation for operation, _ in operations])
+
+            for result, (_, expected) in zip(results, operations):
+                if result.success != expected:
+                    raise Exception(f"{result.operation.kind.value} of {result.operation.path} {'failed' if expected else 'succeeded'} unexpectedly: {result.error}")
+
+            expected_files = {
+                volume / "Extensions/Test.kext/Contents/MacOS/Test":      b"Test",
+                volume / "Frameworks/Test.framework/Versions/A/Test":     b"Test",
+                volume / "Frameworks/Test.framework/Versions/A/Existing": b"Existing",
+            }
+            for path, contents in expected_files.items():
+                if not path.is_file() or path.read_bytes() != contents:
+                    raise Exception(f"File operations failed to produce {path}")
+            if (volume / "Extensions/Stale.kext").exists() or (volume / "Extensions/Test.kext/Contents/Stale").exists():
+                raise Exception("File operations failed to remove stale files")
+            if not (volume / "Frameworks/Test.framework/Versions/Current").is_symlink():
+                raise Exception("File operations failed to copy links")
+            if Path(f"{scratch.parent}/{scratch.name}-Outside").exists():
+                raise Exception("File operations escaped the scratch folder")
+
+
     def _validate_sys_patch(self):
         """
         Validates sys_patch modules
         """
 
+        self._validate_file_operations()
+
         if Path(self.constants.payload_local_binaries_root_path_zip).exists():
             logging.info("Validating Root Patch File integrity")
             if not Path(self.constants.payload_local_binaries_root_path).exists():
@@ -160,6 +202,22 @@ class PatcherValidation:
             logging.info("- Skipping Root Patch File integrity validation")
 
 
+    def _validate_pci_indexes(self):
+        """
+        Validates pci_data's ID lists don't list an ID under multiple families
+
+        device_probe builds its indexes on import (through the build engine),
+        only logging overlaps, thus users aren't kept from launching the patcher
+        """
+
+        logging.info("Validating PCI ID indexes")
+        overlapping = [index for index in pci_index.PCIIndex.indexes if index.overlaps]
+        if overlapping:
+            for index in overlapping:
+                logging.info(f"{index.name} PCI IDs listed under multiple families: {', '.join(index.overlaps)}")
+            raise Exception(f"PCI IDs listed under multiple families for: {', '.join(index.name for index in overlapping)}")
+
+
     def _validate_configs(self):
         """
         Validates build modules